@@ -3,7 +3,7 @@ import requests
 username = 'your_username'
 password = 'your_password'
 base_url = 'http://127.0.0.1:8000/api/'
-url = f'{base_url}courses/'
+url = f'{base_url}courses/?count=false'
 available_courses = []
 all_courses = []
 
@@ -18,14 +18,16 @@ while url is not None:
 
 print(f"Available courses: {','.join(available_courses)}")
 
-for course in all_courses:
-    course_id = course['id']
-    course_title = course['title']
-    r = requests.post(
-        f'{base_url}courses/{course_id}/enroll/',
-        auth=(username, password),
-    )
-    if r.status_code == 200:
-        print(f'Successfully enrolled in {course_title}')
-    else:
-        print(f'Failed to enroll in {course_title}: {r.status_code} {r.text}')
+# одна запись на все курсы вместо POST на каждый
+r = requests.post(
+    f'{base_url}enrollments/bulk/',
+    json={'courses': [course['id'] for course in all_courses]},
+    auth=(username, password),
+)
+if r.status_code == 200:
+    titles = {course['id']: course['title'] for course in all_courses}
+    for result in r.json()['results']:
+        status = 'Successfully enrolled in' if result['created'] else 'Already enrolled in'
+        print(f"{status} {titles[result['course']]}")
+else:
+    print(f'Failed to enroll: {r.status_code} {r.text}')
@@ -0,0 +1,99 @@
+'''
+Бенчмарки горячих путей educa.
+
+Запуск из каталога с manage.py:
+
+    python -m benchmarks.popular_courses
+    python -m benchmarks.popular_courses --settings educa.settings_postgres
+
+Сквозной набор по представлениям — benchmarks.views: данные строит
+benchmarks.generator, результат — JSON, который можно сохранить (--output)
+и передать следующему прогону как --baseline.
+
+Каждый сценарий создаёт отдельную тестовую базу через Django test runner,
+поэтому рабочая база не затрагивается. Для PostgreSQL достаточно передать
+модуль настроек с соответствующим DATABASES.
+'''
+import argparse
+import os
+import time
+from contextlib import contextmanager
+
+
+def parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--settings', default='educa.settings')
+    parser.add_argument('--repeat', type=int, default=5)
+    return parser
+
+
+def setup(settings_module):
+    os.environ['DJANGO_SETTINGS_MODULE'] = settings_module
+    import django
+
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        # DEBUG выключен, как у test runner: иначе работает debug_toolbar
+        with override_settings(DEBUG=False, CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 1_000_000},
+        }}):
+            yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(func, repeat=5, before=None):
+    # before() — подготовка перед каждым повтором (сброс кеша и т. п.), в замер не входит
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        queries = len(ctx.captured_queries)
+    timings.sort()
+    return {
+        'best_ms': round(timings[0] * 1000, 3),
+        'median_ms': round(timings[len(timings) // 2] * 1000, 3),
+        'queries': queries,
+    }
+
+
+def compare(results, baseline, threshold=0.1):
+    '''
+    Сравнивает сценарии {name: measure(...)} с прошлым прогоном. Регрессия —
+    best_ms хуже больше чем на threshold или запросов стало больше.
+    '''
+    report = {}
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        change = current['best_ms'] / previous['best_ms'] - 1 if previous['best_ms'] else 0.0
+        report[name] = {
+            'best_ms': previous['best_ms'],
+            'queries': previous['queries'],
+            'time_change': f'{change:+.1%}',
+            'query_change': current['queries'] - previous['queries'],
+        }
+        if change > threshold or current['queries'] > previous['queries']:
+            regressions.append(name)
+    return report, regressions
@@ -0,0 +1,56 @@
+'''
+/api/courses/: полный CourseSerializer с вложенными модулями против
+облегчённого CourseListSerializer — размер ответа и время сериализации.
+'''
+import json
+
+from . import measure, parser, setup, test_database
+
+
+def populate(courses, modules):
+    from courses.models import Course, Module, Subject
+    from django.contrib.auth.models import User
+
+    owner = User.objects.create_user(username='bench_owner')
+    subject = Subject.objects.create(title='Subject', slug='subject')
+    created = Course.objects.bulk_create(
+        Course(owner=owner, subject=subject, title=f'Course {c}', slug=f'course-{c}', overview='Overview ' * 40)
+        for c in range(courses)
+    )
+    Module.objects.bulk_create(
+        Module(course=course, title=f'Module {m}', description='Description ' * 20, order=m)
+        for course in created
+        for m in range(modules)
+    )
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--courses', type=int, default=10000)
+    args.add_argument('--modules', type=int, default=5)
+    options = args.parse_args()
+    setup(options.settings)
+
+    from courses.api.serializers import CourseListSerializer, CourseSerializer
+    from courses.models import Course
+    from rest_framework.renderers import JSONRenderer
+
+    def render(serializer_class, queryset):
+        return JSONRenderer().render(serializer_class(queryset.all(), many=True).data)
+
+    full = Course.objects.select_related('subject', 'owner').prefetch_related('modules')
+    slim = Course.objects.only(*CourseListSerializer.Meta.fields)
+
+    with test_database() as connection:
+        populate(options.courses, options.modules)
+        results = {
+            'vendor': connection.vendor,
+            'courses': options.courses,
+            'full': dict(measure(lambda: render(CourseSerializer, full), options.repeat), bytes=len(render(CourseSerializer, full))),
+            'slim': dict(measure(lambda: render(CourseListSerializer, slim), options.repeat), bytes=len(render(CourseListSerializer, slim))),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
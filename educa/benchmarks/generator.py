@@ -0,0 +1,100 @@
+'''
+Детерминированный синтетический каталог для бенчмарков: предметы, курсы,
+модули, материалы всех четырёх типов вперемешку и записи студентов.
+Одинаковые параметры и seed дают одинаковые данные, поэтому прогоны на
+разных ревизиях сравнимы. Строки грузятся через CatalogImporter, так что
+счётчики, OrderSequence и поисковый индекс готовы сразу.
+'''
+import random
+from dataclasses import dataclass
+
+WORDS = (
+    'python django query index cache module course lesson student teacher '
+    'variable function class object list dict loop generator iterator stream'
+).split()
+ITEM_TYPES = ('text', 'video', 'image', 'file')
+VIDEO_URL = 'https://www.youtube.com/watch?v=bgC-ocnTTto'
+SAMPLE_IMAGE = 'bench/sample.png'
+SAMPLE_FILE = 'bench/sample.txt'
+OWNER = 'bench_owner'
+
+
+@dataclass
+class Scale:
+    subjects: int = 5
+    courses: int = 20  # на предмет
+    modules: int = 10  # на курс
+    contents: int = 10  # на модуль
+    students: int = 200
+    enrollments: int = 5  # курсов на студента
+    seed: int = 1
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+def _words(rnd, count):
+    return ' '.join(rnd.choice(WORDS) for _ in range(count))
+
+
+def catalog_rows(scale):
+    rnd = random.Random(scale.seed)
+    course_ids = []
+    for s in range(scale.subjects):
+        yield {'kind': 'subject', 'id': s, 'title': f'Subject {s}', 'slug': f'subject-{s}'}
+    for s in range(scale.subjects):
+        for c in range(scale.courses):
+            course_id = len(course_ids)
+            course_ids.append(course_id)
+            yield {
+                'kind': 'course', 'id': course_id, 'subject': s, 'owner': OWNER,
+                'title': _words(rnd, 3).capitalize(), 'slug': f'course-{course_id}', 'overview': _words(rnd, 40),
+            }
+    module_id = content_id = 0
+    for course_id in course_ids:
+        for m in range(scale.modules):
+            module_id += 1
+            yield {
+                'kind': 'module', 'id': module_id, 'course': course_id, 'order': m,
+                'title': _words(rnd, 3).capitalize(), 'description': _words(rnd, 15),
+            }
+            for i in range(scale.contents):
+                content_id += 1
+                item_type = rnd.choice(ITEM_TYPES)
+                row = {
+                    'kind': 'content', 'id': content_id, 'module': module_id, 'order': i, 'item_type': item_type,
+                    'title': _words(rnd, 4).capitalize(), 'owner': OWNER,
+                }
+                if item_type == 'text':
+                    row['content'] = _words(rnd, 120)
+                elif item_type == 'video':
+                    row['url'] = VIDEO_URL
+                else:
+                    row['file'] = SAMPLE_IMAGE if item_type == 'image' else SAMPLE_FILE
+                yield row
+    for student in range(scale.students):
+        for course_id in rnd.sample(course_ids, min(scale.enrollments, len(course_ids))):
+            yield {'kind': 'enrollment', 'course': course_id, 'user': f'bench_student_{student}'}
+
+
+def write_sample_files():
+    # все Image/File ссылаются на два общих файла: диск не растёт с масштабом
+    from io import BytesIO
+
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGB', (64, 48), (200, 120, 40)).save(buffer, 'PNG')
+    for name, data in ((SAMPLE_IMAGE, buffer.getvalue()), (SAMPLE_FILE, b'sample\n' * 100)):
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(data))
+
+
+def generate(scale):
+    '''Заполняет текущую базу; возвращает статистику CatalogImporter.'''
+    from courses.importer import CatalogImporter
+
+    write_sample_files()
+    return CatalogImporter().run(catalog_rows(scale))
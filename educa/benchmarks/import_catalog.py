@@ -0,0 +1,59 @@
+'''
+manage.py import_catalog: скорость загрузки синтетической выгрузки
+(по умолчанию 100 курсов x 10 модулей x 100 материалов = 100 000 Content).
+'''
+import json
+import time
+from io import StringIO
+
+from . import parser, setup, test_database
+
+
+def dump(courses, modules, items):
+    lines = [{'kind': 'subject', 'id': 1, 'title': 'Subject', 'slug': 'subject'}]
+    module_id = content_id = 0
+    for c in range(courses):
+        lines.append({
+            'kind': 'course', 'id': c, 'subject': 1, 'owner': 'bench_owner',
+            'title': f'Course {c}', 'slug': f'course-{c}', 'overview': 'Overview',
+        })
+    for c in range(courses):
+        for m in range(modules):
+            module_id += 1
+            lines.append({'kind': 'module', 'id': module_id, 'course': c, 'title': f'Module {m}', 'description': '', 'order': m})
+            for i in range(items):
+                content_id += 1
+                lines.append({
+                    'kind': 'content', 'id': content_id, 'module': module_id, 'order': i,
+                    'item_type': 'text', 'title': f'Text {i}', 'owner': 'bench_owner', 'content': 'Paragraph. ' * 20,
+                })
+    return ''.join(json.dumps(line) + '\n' for line in lines), content_id
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--courses', type=int, default=100)
+    args.add_argument('--modules', type=int, default=10)
+    args.add_argument('--items', type=int, default=100)
+    args.add_argument('--batch-size', type=int, default=1000)
+    options = args.parse_args()
+    setup(options.settings)
+
+    from courses.importer import CatalogImporter, read_rows
+
+    data, contents = dump(options.courses, options.modules, options.items)
+    with test_database() as connection:
+        start = time.perf_counter()
+        CatalogImporter(batch_size=options.batch_size).run(read_rows(StringIO(data)))
+        elapsed = time.perf_counter() - start
+        results = {
+            'vendor': connection.vendor,
+            'contents': contents,
+            'seconds': round(elapsed, 3),
+            'contents_per_minute': round(contents / elapsed * 60),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
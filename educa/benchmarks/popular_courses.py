@@ -0,0 +1,63 @@
+'''
+SubjectSerializer.popular_courses: запрос на каждый предмет против одного
+оконного запроса (ROW_NUMBER() OVER (PARTITION BY subject_id ...)).
+'''
+import json
+
+from . import measure, parser, setup, test_database
+
+
+def populate(subjects, courses, students):
+    from courses.models import Course, Subject
+    from django.contrib.auth.models import User
+
+    owner = User.objects.create_user(username='bench_owner')
+    users = User.objects.bulk_create(User(username=f'bench_student_{i}') for i in range(students))
+    through = Course.students.through
+    for s in range(subjects):
+        subject = Subject.objects.create(title=f'Subject {s}', slug=f'subject-{s}')
+        created = Course.objects.bulk_create(
+            Course(owner=owner, subject=subject, title=f'Course {s}.{c}', slug=f'course-{s}-{c}', overview='')
+            for c in range(courses)
+        )
+        through.objects.bulk_create(
+            through(course_id=course.id, user_id=user.id)
+            for index, course in enumerate(created)
+            for user in users[:index % (students + 1)]
+        )
+
+
+def per_subject(subject_ids):
+    from courses.models import Course
+    from django.db.models import Count
+
+    for subject_id in subject_ids:
+        list(Course.objects.filter(subject_id=subject_id).annotate(
+            total_students=Count('students')
+        ).order_by('-total_students')[:3])
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--subjects', type=int, default=50)
+    args.add_argument('--courses', type=int, default=20)
+    args.add_argument('--students', type=int, default=50)
+    options = args.parse_args()
+    setup(options.settings)
+
+    from courses.catalog import popular_courses
+    from courses.models import Subject
+
+    with test_database() as connection:
+        populate(options.subjects, options.courses, options.students)
+        subject_ids = list(Subject.objects.values_list('id', flat=True))
+        results = {
+            'vendor': connection.vendor,
+            'per_subject': measure(lambda: per_subject(subject_ids), options.repeat),
+            'windowed': measure(lambda: popular_courses(subject_ids), options.repeat),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+'''
+/api/search/: задержка запроса по индексу против icontains-перебора на
+синтетическом каталоге (по умолчанию 200 курсов x 10 модулей x 50 текстов).
+'''
+import json
+import random
+
+from . import measure, parser, setup, test_database
+
+WORDS = (
+    'python django query index cache module course lesson student teacher '
+    'variable function class object list dict loop generator iterator stream'
+).split()
+
+
+def text(rnd, length):
+    return ' '.join(rnd.choice(WORDS) for _ in range(length))
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--courses', type=int, default=200)
+    args.add_argument('--modules', type=int, default=10)
+    args.add_argument('--items', type=int, default=50)
+    options = args.parse_args()
+    setup(options.settings)
+
+    from courses import search
+    from courses.importer import CatalogImporter
+
+    rnd = random.Random(1)
+    rows = [{'kind': 'subject', 'id': 1, 'title': 'Subject', 'slug': 'subject'}]
+    module_id = content_id = 0
+    for c in range(options.courses):
+        rows.append({
+            'kind': 'course', 'id': c, 'subject': 1, 'owner': 'bench_owner',
+            'title': text(rnd, 3), 'slug': f'course-{c}', 'overview': text(rnd, 30),
+        })
+        for m in range(options.modules):
+            module_id += 1
+            rows.append({'kind': 'module', 'id': module_id, 'course': c, 'title': text(rnd, 3), 'description': text(rnd, 20)})
+            for i in range(options.items):
+                content_id += 1
+                rows.append({
+                    'kind': 'content', 'id': content_id, 'module': module_id, 'item_type': 'text',
+                    'title': text(rnd, 4), 'owner': 'bench_owner', 'content': text(rnd, 80) + f' marker{content_id}',
+                })
+
+    with test_database() as connection:
+        CatalogImporter().run(rows)
+        rare = f'marker{content_id // 2}'
+        results = {'vendor': connection.vendor, 'documents': search.SearchDocument.objects.count()}
+        for name, query in (('rare_word', rare), ('common_words', 'python generator'), ('prefix', 'iter')):
+            words = search.query_words(query)
+            results[name] = {
+                'index': measure(lambda: search.search(query), options.repeat),
+                'icontains': measure(lambda: search._fallback(words, 0, 10, None), options.repeat),
+            }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+'''
+DRF-сериализаторы courses.api против CompiledSerializer: дерево
+/api/courses/{id}/contents/ и страница /api/courses/.
+'''
+import json
+
+from . import measure, parser, setup, test_database
+
+
+def populate(modules, contents, courses):
+    from courses.models import Content, Course, Module, Subject, Text
+    from django.contrib.auth.models import User
+
+    owner = User.objects.create_user(username='bench_owner')
+    subject = Subject.objects.create(title='Subject', slug='subject')
+    course = Course.objects.create(owner=owner, subject=subject, title='Course', slug='course', overview='Overview')
+    Course.objects.bulk_create(
+        Course(owner=owner, subject=subject, title=f'Course {c}', slug=f'course-{c}', overview='Overview')
+        for c in range(courses)
+    )
+    for m in range(modules):
+        module = Module.objects.create(course=course, title=f'Module {m}', order=m)
+        texts = Text.objects.bulk_create(
+            Text(owner=owner, title=f'Text {m}.{c}', content='Lorem ipsum ' * 50) for c in range(contents)
+        )
+        for text in texts:
+            # заполняем кеш отрисовки, как это делает post_save
+            text.cached_render()
+        Content.objects.bulk_create(
+            Content(module=module, item=text, order=index) for index, text in enumerate(texts)
+        )
+    return course
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--modules', type=int, default=20)
+    args.add_argument('--contents', type=int, default=20)
+    args.add_argument('--courses', type=int, default=1000)
+    options = args.parse_args()
+    setup(options.settings)
+
+    from courses.api.compiled import compiled
+    from courses.api.serializers import CourseListSerializer, CourseWithContentsSerializer
+    from courses.loading import contents_prefetch
+    from courses.models import Course
+
+    with test_database() as connection:
+        course = populate(options.modules, options.contents, options.courses)
+        course = Course.objects.prefetch_related(contents_prefetch('modules__contents')).get(pk=course.pk)
+        instances = list(Course.objects.all())
+        rows = list(Course.objects.values(*CourseListSerializer.Meta.fields))
+        results = {
+            'vendor': connection.vendor,
+            'contents_drf': measure(lambda: CourseWithContentsSerializer(course).data, options.repeat),
+            'contents_compiled': measure(lambda: compiled(CourseWithContentsSerializer).to_representation(course), options.repeat),
+            'list_drf': measure(lambda: CourseListSerializer(instances, many=True).data, options.repeat),
+            'list_compiled_rows': measure(lambda: compiled(CourseListSerializer).serialize_rows(rows), options.repeat),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+'''
+Типичная сессия студента: обход всех модулей курса и повторный обход.
+Повторные заходы без валидаторов сравниваются с If-None-Match (ответы 304).
+'''
+import json
+
+from . import measure, parser, setup, test_database
+
+
+def populate(modules, items):
+    from courses.models import Content, Course, Module, Subject, Text
+    from django.contrib.auth.models import User
+
+    owner = User.objects.create_user(username='bench_owner')
+    student = User.objects.create_user(username='bench_student')
+    subject = Subject.objects.create(title='Subject', slug='subject')
+    course = Course.objects.create(owner=owner, subject=subject, title='Course', slug='course', overview='Overview')
+    course.students.add(student)
+    for m in range(modules):
+        module = Module.objects.create(course=course, title=f'Module {m}')
+        for i in range(items):
+            text = Text.objects.create(owner=owner, title=f'Text {m}.{i}', content='Paragraph. ' * 200)
+            Content.objects.create(module=module, item=text)
+    return student, course
+
+
+def main():
+    args = parser(__doc__)
+    args.add_argument('--modules', type=int, default=10)
+    args.add_argument('--items', type=int, default=10)
+    options = args.parse_args()
+    setup(options.settings)
+
+    from django.test import Client
+    from django.urls import reverse
+
+    with test_database() as connection:
+        student, course = populate(options.modules, options.items)
+        client = Client()
+        client.force_login(student)
+        urls = [
+            reverse('students:student_course_detail_module', args=[course.id, module_id])
+            for module_id in course.modules.values_list('id', flat=True)
+        ]
+        etags = {}
+        sizes = {}
+
+        def visit():
+            for url in urls:
+                response = client.get(url)
+                etags[url] = response['ETag']
+                sizes[url] = len(response.content)
+
+        def revisit():
+            for url in urls:
+                assert client.get(url, HTTP_IF_NONE_MATCH=etags[url]).status_code == 304
+
+        visit()
+        results = {
+            'vendor': connection.vendor,
+            'pages': len(urls),
+            'bytes': sum(sizes.values()),
+            'full_visit': measure(visit, options.repeat),
+            'conditional_revisit': measure(revisit, options.repeat),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+'''
+Горячие представления educa на синтетическом каталоге (benchmarks.generator):
+время и число запросов с холодным и тёплым кешем. Результат — JSON;
+--output сохраняет его, --baseline сравнивает с сохранённым прогоном и
+завершает процесс с кодом 1, если какой-то сценарий стал хуже.
+
+    python -m benchmarks.views --output before.json
+    python -m benchmarks.views --baseline before.json
+'''
+import base64
+import json
+import sys
+import tempfile
+
+from . import compare, measure, parser, setup, test_database
+from .generator import OWNER, Scale, generate
+
+
+def scenarios(student, course, module):
+    '''name -> (метод, url, клиент: student/owner/basic/None, подготовка)'''
+    from django.core.cache import cache
+    from django.urls import reverse
+
+    def unenroll():
+        course.students.remove(student)
+
+    views = {
+        'course_list': ('get', reverse('courses:course_list'), None),
+        'api_subject_list': ('get', reverse('api:subject-list'), None),
+        'api_course_list': ('get', reverse('api:course-list'), None),
+        'api_course_contents': ('get', reverse('api:course-contents', args=[course.pk]), 'basic'),
+        'student_course_detail': (
+            'get', reverse('students:student_course_detail_module', args=[course.pk, module.pk]), 'student',
+        ),
+        'module_content_list': ('get', reverse('courses:module_content_list', args=[module.pk]), 'owner'),
+        # async-версии через тот же WSGI-клиент: стоимость запроса, не конкурентность
+        'async_subject_list': ('get', reverse('api:async-subject-list'), None),
+        'async_course_list': ('get', reverse('api:async-course-list'), None),
+        'async_course_contents': ('get', reverse('api:async-course-contents', args=[course.pk]), 'basic'),
+    }
+    result = {}
+    for name, (method, url, client) in views.items():
+        result[f'{name}:cold'] = (method, url, client, cache.clear)
+        result[f'{name}:warm'] = (method, url, client, None)
+    # каждый повтор — новая запись: связь снимается до замера
+    result['api_course_enroll'] = ('post', reverse('api:course-enroll', args=[course.pk]), 'basic', unenroll)
+    return result
+
+
+def main():
+    args = parser(__doc__)
+    defaults = Scale()
+    for field, value in defaults.as_dict().items():
+        args.add_argument(f'--{field}', type=int, default=value)
+    args.add_argument('--output', help='куда записать JSON результата')
+    args.add_argument('--baseline', help='JSON прошлого прогона для сравнения')
+    args.add_argument('--threshold', type=float, default=0.1, help='допустимое ухудшение best_ms (доля)')
+    options = args.parse_args()
+    setup(options.settings)
+
+    from courses.models import Course
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.test.utils import override_settings
+
+    scale = Scale(**{field: getattr(options, field) for field in defaults.as_dict()})
+    with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media), test_database() as connection:
+        stats = generate(scale)
+        owner = User.objects.get(username=OWNER)
+        student = User.objects.get(username='bench_student_0')
+        student.set_password('bench')
+        student.save()
+        course = Course.objects.filter(students=student).order_by('pk').first()
+        module = course.modules.order_by('order').first()
+
+        credentials = base64.b64encode(b'bench_student_0:bench').decode()
+        clients = {None: Client(), 'basic': Client(HTTP_AUTHORIZATION=f'Basic {credentials}')}
+        clients['student'] = Client()
+        clients['student'].force_login(student)
+        clients['owner'] = Client()
+        clients['owner'].force_login(owner)
+
+        results = {}
+        for name, (method, url, client, before) in scenarios(student, course, module).items():
+            request = getattr(clients[client], method)
+            if before is not None:
+                before()
+            response = request(url)
+            if response.status_code != 200:
+                raise SystemExit(f'{name}: {url} answered {response.status_code}')
+            results[name] = measure(lambda: request(url), options.repeat, before)
+
+        output = {
+            'vendor': connection.vendor,
+            'scale': scale.as_dict(),
+            'rows': dict(stats),
+            'scenarios': results,
+        }
+    regressions = []
+    if options.baseline:
+        with open(options.baseline) as file:
+            baseline = json.load(file)
+        output['baseline'], regressions = compare(results, baseline['scenarios'], options.threshold)
+        output['regressions'] = regressions
+    text = json.dumps(output, indent=2)
+    if options.output:
+        with open(options.output, 'w') as file:
+            file.write(text + '\n')
+    print(text)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+from functools import wraps
+
+from django.db.models import Exists, OuterRef
+from django.http import HttpResponse
+from django.views.decorators.http import require_safe
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .. import catalog, enrollment
+from ..catalog import apopular_courses
+from ..conditional import etag_matches, make_etag
+from ..models import Course, Subject
+from ..snapshots import aget_course_snapshot
+from ..versions import aget_versions
+from .authentication import CachedBasicAuthentication
+from .compiled import compiled
+from .pagination import CourseKeysetPagination, SubjectKeysetPagination
+from .serializers import CourseListSerializer, CourseSerializer, SubjectSerializer
+
+# Async-версии горячих чтений API для ASGI: те же ответы, что у
+# SubjectViewSet.list и CourseViewSet.list/retrieve/contents (только JSON),
+# но без потока на запрос. Версии и снимки читаются async-API кеша, база —
+# async ORM (acount, aget, aiterator).
+
+
+def json_response(data, etag=None):
+    response = HttpResponse(JSONRenderer().render(data), content_type='application/json')
+    if etag is not None:
+        response['ETag'] = etag
+    return response
+
+
+def async_api(view):
+    # ошибки DRF в виде, как их отдаёт APIView
+    @require_safe
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            response = json_response(detail)
+            response.status_code = exc.status_code
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                response['WWW-Authenticate'] = 'Basic realm="api"'
+            return response
+    return wrapper
+
+
+async def catalog_etag(request, name):
+    # как ConditionalReadMixin: поколения каталога и записей
+    versions = await aget_versions([catalog.GENERATION_KEY, enrollment.GENERATION_KEY])
+    return make_etag(name, request.get_full_path(), *versions.values())
+
+
+@async_api
+async def subject_list(request):
+    etag = await catalog_etag(request, 'subject-list')
+    if etag_matches(request, etag):
+        return HttpResponse(status=304, headers={'ETag': etag})
+    paginator = SubjectKeysetPagination()
+    subjects = await paginator.apaginate_queryset(Subject.objects.all(), Request(request))
+    top = await apopular_courses([subject.id for subject in subjects])
+    for subject in subjects:
+        subject.top_courses = top[subject.id]
+    data = compiled(SubjectSerializer).serialize_many(subjects)
+    return json_response(paginator.get_paginated_data(data), etag)
+
+
+@async_api
+async def course_list(request):
+    etag = await catalog_etag(request, 'course-list')
+    if etag_matches(request, etag):
+        return HttpResponse(status=304, headers={'ETag': etag})
+    paginator = CourseKeysetPagination()
+    rows = await paginator.apaginate_queryset(Course.objects.values(*CourseListSerializer.Meta.fields), Request(request))
+    data = compiled(CourseListSerializer).serialize_rows(rows)
+    return json_response(paginator.get_paginated_data(data), etag)
+
+
+@async_api
+async def course_detail(request, pk):
+    etag = await catalog_etag(request, 'course-detail')
+    if etag_matches(request, etag):
+        return HttpResponse(status=304, headers={'ETag': etag})
+    queryset = Course.objects.select_related('subject', 'owner').prefetch_related('modules')
+    try:
+        course = await queryset.aget(pk=pk)
+    except Course.DoesNotExist:
+        raise exceptions.NotFound()
+    return json_response(compiled(CourseSerializer).to_representation(course), etag)
+
+
+@async_api
+async def course_contents(request, pk):
+    auth = await CachedBasicAuthentication().aauthenticate(request)
+    if auth is None:
+        raise exceptions.NotAuthenticated()
+    user = auth[0]
+    queryset = Course.objects.annotate(
+        is_enrolled=Exists(Course.students.through.objects.filter(course=OuterRef('pk'), user_id=user.pk))
+    )
+    try:
+        course = await queryset.aget(pk=pk)
+    except Course.DoesNotExist:
+        raise exceptions.NotFound()
+    if not course.is_enrolled:
+        raise exceptions.PermissionDenied()
+    snapshot = await aget_course_snapshot(course)
+    if etag_matches(request, snapshot['etag']):
+        return HttpResponse(status=304, headers={'ETag': snapshot['etag']})
+    return json_response(snapshot['data'], snapshot['etag'])
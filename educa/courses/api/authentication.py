@@ -0,0 +1,134 @@
+import base64
+import binascii
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.crypto import salted_hmac
+from rest_framework import exceptions
+from rest_framework.authentication import BasicAuthentication, get_authorization_header
+
+
+class CredentialCache:
+    '''
+    LRU + TTL кеш проверенных пар логин/пароль в памяти процесса.
+
+    Хранится только HMAC от логина и пароля (ключ из SECRET_KEY) и хеш пароля
+    пользователя на момент проверки: запись перестаёт подходить, как только
+    пароль сменился.
+    '''
+
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _limits(self):
+        max_size = self.max_size if self.max_size is not None else getattr(settings, 'CREDENTIAL_CACHE_SIZE', 1024)
+        ttl = self.ttl if self.ttl is not None else getattr(settings, 'CREDENTIAL_CACHE_TTL', 300)
+        return max_size, ttl
+
+    @staticmethod
+    def digest(username, password):
+        return salted_hmac('courses.api.CredentialCache', f'{username}\0{password}', algorithm='sha256').hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key, user_id, password_hash):
+        max_size, ttl = self._limits()
+        with self._lock:
+            self._entries[key] = (user_id, password_hash, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_user(self, user_id):
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+credential_cache = CredentialCache()
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    # повторная проверка тех же учётных данных — один запрос по pk вместо хешера паролей
+    cache = credential_cache
+
+    def authenticate_credentials(self, userid, password, request=None):
+        key = self.cache.digest(userid, password)
+        entry = self.cache.get(key)
+        if entry is not None:
+            user_id, password_hash = entry
+            user = get_user_model()._default_manager.filter(pk=user_id).first()
+            if self.still_valid(user, password_hash):
+                return (user, None)
+            self.cache.discard(key)
+        user, auth = super().authenticate_credentials(userid, password, request)
+        self.cache.set(key, user.pk, user.password)
+        return (user, auth)
+
+    async def aauthenticate(self, request):
+        # для async-представлений: попадание в кеш — один запрос через async ORM,
+        # проверка пароля хешером — в пуле потоков
+        credentials = self.parse_header(request)
+        if credentials is None:
+            return None
+        userid, password = credentials
+        key = self.cache.digest(userid, password)
+        entry = self.cache.get(key)
+        if entry is not None:
+            user_id, password_hash = entry
+            user = await get_user_model()._default_manager.filter(pk=user_id).afirst()
+            if self.still_valid(user, password_hash):
+                return (user, None)
+            self.cache.discard(key)
+        user, auth = await sync_to_async(BasicAuthentication.authenticate_credentials)(self, userid, password, request)
+        self.cache.set(key, user.pk, user.password)
+        return (user, auth)
+
+    @staticmethod
+    def still_valid(user, password_hash):
+        return user is not None and user.is_active and user.password == password_hash
+
+    @staticmethod
+    def parse_header(request):
+        # разбор как в BasicAuthentication.authenticate
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != b'basic':
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid basic header.')
+        try:
+            try:
+                decoded = base64.b64decode(auth[1]).decode('utf-8')
+            except UnicodeDecodeError:
+                decoded = base64.b64decode(auth[1]).decode('latin-1')
+            userid, password = decoded.split(':', 1)
+        except (TypeError, ValueError, UnicodeDecodeError, binascii.Error):
+            raise exceptions.AuthenticationFailed('Invalid basic header. Credentials not correctly base64 encoded.')
+        return userid, password
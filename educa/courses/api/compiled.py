@@ -0,0 +1,154 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+from rest_framework.relations import PKOnlyObject
+from rest_framework.response import Response
+
+# Поля, у которых to_representation не меняет значение, прочитанное из модели
+PASSTHROUGH_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+
+_plans = {}
+
+
+class CompiledSerializer:
+    '''
+    Read-only аналог сериализатора DRF для горячих путей.
+
+    План (имя поля -> функция извлечения) строится один раз на класс по полям
+    самого сериализатора, дальше объект превращается в dict обычным доступом
+    к атрибутам. Результат совпадает с serializer.data. Контекст (request)
+    сериализатору не передаётся, поэтому подходят только поля, которым он не
+    нужен.
+    '''
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        serializer = serializer_class(context={})
+        self.plan = [(name, self._compile(serializer, field)) for name, field in self._fields(serializer)]
+        self.row_plan = None
+
+    def to_representation(self, instance):
+        return {name: extract(instance) for name, extract in self.plan}
+
+    def serialize_many(self, instances):
+        to_representation = self.to_representation
+        return [to_representation(instance) for instance in instances]
+
+    def serialize_rows(self, rows):
+        # строки .values(): ключи совпадают с source полей, FK уже содержат pk
+        if self.row_plan is None:
+            serializer = self.serializer_class(context={})
+            self.row_plan = [(name, self._compile_row(field)) for name, field in self._fields(serializer)]
+        plan = self.row_plan
+        return [{name: extract(row) for name, extract in plan} for row in rows]
+
+    @staticmethod
+    def _fields(serializer):
+        return [(name, field) for name, field in serializer.fields.items() if not field.write_only]
+
+    def _compile(self, serializer, field):
+        if isinstance(field, serializers.ListSerializer):
+            return self._compile_many(field)
+        if isinstance(field, serializers.BaseSerializer):
+            return self._compile_nested(field)
+        if isinstance(field, serializers.SerializerMethodField):
+            return getattr(serializer, field.method_name)
+        model_field = self._model_field(serializer, field)
+        if model_field is not None:
+            if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None and model_field.many_to_one:
+                return self._attribute(model_field.attname, None)
+            if not model_field.is_relation:
+                to_representation = None if isinstance(field, PASSTHROUGH_FIELDS) else field.to_representation
+                return self._attribute(field.source, to_representation)
+        return self._generic(field)
+
+    def _compile_row(self, field):
+        if isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField)):
+            raise TypeError(f'Field {field.field_name!r} cannot be serialized from values() rows')
+        source = field.source
+        if isinstance(field, (serializers.PrimaryKeyRelatedField, *PASSTHROUGH_FIELDS)):
+            return lambda row: row[source]
+        to_representation = field.to_representation
+
+        def extract(row):
+            value = row[source]
+            return None if value is None else to_representation(value)
+        return extract
+
+    def _compile_many(self, field):
+        child = compiled(type(field.child))
+        source = field.source
+
+        def extract(instance):
+            value = getattr(instance, source)
+            if isinstance(value, models.manager.BaseManager):
+                value = value.all()
+            return child.serialize_many(value)
+        return extract
+
+    def _compile_nested(self, field):
+        child = compiled(type(field))
+        source = field.source
+
+        def extract(instance):
+            value = getattr(instance, source)
+            return None if value is None else child.to_representation(value)
+        return extract
+
+    @staticmethod
+    def _model_field(serializer, field):
+        model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+        if model is None or len(field.source_attrs) != 1:
+            return None
+        try:
+            return model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+
+    @staticmethod
+    def _attribute(attname, to_representation):
+        if to_representation is None:
+            return lambda instance: getattr(instance, attname)
+
+        def extract(instance):
+            value = getattr(instance, attname)
+            return None if value is None else to_representation(value)
+        return extract
+
+    @staticmethod
+    def _generic(field):
+        # медленный путь — ровно то, что делает Serializer.to_representation
+        def extract(instance):
+            attribute = field.get_attribute(instance)
+            check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            return None if check_for_none is None else field.to_representation(attribute)
+        return extract
+
+
+def compiled(serializer_class):
+    plan = _plans.get(serializer_class)
+    if plan is None:
+        plan = _plans[serializer_class] = CompiledSerializer(serializer_class)
+    return plan
+
+
+class CompiledReadMixin:
+    # list/retrieve для ReadOnlyModelViewSet через CompiledSerializer
+    def serialize(self, data, many=False):
+        plan = compiled(self.get_serializer_class())
+        if not many:
+            return plan.to_representation(data)
+        data = list(data)
+        if data and isinstance(data[0], dict):
+            return plan.serialize_rows(data)
+        return plan.serialize_many(data)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.serialize(page, many=True))
+        return Response(self.serialize(queryset, many=True))
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.serialize(self.get_object()))
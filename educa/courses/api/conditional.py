@@ -0,0 +1,39 @@
+from rest_framework.response import Response
+
+from ..conditional import etag_matches, make_etag
+
+
+class ConditionalReadMixin:
+    '''
+    ETag для list/retrieve. Валидатор собирается из get_etag_parts (версии
+    данных в кеше), поэтому 304 отдаётся до запросов к базе и сериализации.
+    '''
+    etag = None
+
+    def get_etag_parts(self):
+        return None
+
+    def get_etag(self, request):
+        parts = self.get_etag_parts()
+        # браузерное API зависит от пользователя и формы, его не кешируем
+        if parts is None or request.accepted_renderer.format != 'json':
+            return None
+        return make_etag(self.basename, self.action, request.get_full_path(), *parts)
+
+    def not_modified(self, request):
+        self.etag = self.get_etag(request)
+        if self.etag is not None and etag_matches(request, self.etag):
+            return Response(status=304, headers={'ETag': self.etag})
+        return None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.etag is not None and response.status_code == 200:
+            response['ETag'] = self.etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.not_modified(request) or super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.not_modified(request) or super().retrieve(request, *args, **kwargs)
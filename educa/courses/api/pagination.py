@@ -1,7 +1,185 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import or_
 
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
-class StandardPagination(PageNumberPagination):
+
+class KeysetPagination(BasePagination):
+    # Страница продолжается с ключа последней строки (WHERE (a, b) > (...)),
+    # а не с OFFSET: глубокие страницы стоят как первая, а вставки между
+    # запросами не сдвигают и не дублируют строки. Только вперёд по next.
+    ordering = ('id',)
     page_size = 10
     page_size_query_param = 'page_size'
-    max_page_size = 50
\ No newline at end of file
+    max_page_size = 50
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    @property
+    def cursor_fields(self):
+        return self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.start(queryset, request)
+        self.count = queryset.count() if self.include_count(request) else None
+        return self.set_page(list(self.page_queryset(queryset)))
+
+    async def apaginate_queryset(self, queryset, request):
+        # то же для async-представлений: acount и асинхронная итерация
+        queryset = self.start(queryset, request)
+        self.count = await queryset.acount() if self.include_count(request) else None
+        return self.set_page([row async for row in self.page_queryset(queryset)])
+
+    def start(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        return queryset.order_by(*self.ordering)
+
+    def page_queryset(self, queryset):
+        position = self.decode_cursor(self.request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+        self.next_position = self.get_position(results[-1]) if self.has_next else None
+        return results
+
+    def get_paginated_data(self, data):
+        return {
+            'count': self.count,
+            'next': self.get_next_link(),
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'nullable': True},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def include_count(self, request):
+        return request.query_params.get(self.count_query_param, 'true').lower() not in ('false', '0', 'no')
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_position(self, instance):
+        if isinstance(instance, dict):
+            return [instance[name.lstrip('-')] for name in self.ordering]
+        return [getattr(instance, name.lstrip('-')) for name in self.ordering]
+
+    def keyset_filter(self, position):
+        # (a > x) OR (a = x AND b > y) OR ... с учётом направления каждого поля
+        conditions = []
+        for index, name in enumerate(self.ordering):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            equal = {other.lstrip('-'): value for other, value in zip(self.ordering[:index], position)}
+            conditions.append(Q(**equal, **{f'{field}__{lookup}': position[index]}))
+        return reduce(or_, conditions)
+
+    def encode_cursor(self, position):
+        payload = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in position])
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if not isinstance(values, list) or len(values) != len(self.cursor_fields):
+                raise ValueError
+            return self.parse_position(values, model)
+        except (TypeError, ValueError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def parse_position(self, values, model):
+        return [
+            model._meta.get_field(name.lstrip('-')).to_python(value)
+            for name, value in zip(self.ordering, values)
+        ]
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Pass false to skip the total count.',
+                'schema': {'type': 'boolean'},
+            },
+        ]
+
+
+class CourseKeysetPagination(KeysetPagination):
+    ordering = ('-created', 'id')
+
+
+class SubjectKeysetPagination(KeysetPagination):
+    ordering = ('title', 'id')
+
+
+class SearchPagination(KeysetPagination):
+    # Курсор — позиция в окне кандидатов courses.search.search и граница окна
+    # (ceiling): все страницы ранжируют одно и то же окно. Общего числа
+    # совпадений нет; truncated — ранжированы не все совпадения, а новейшие
+    cursor_fields = ('offset', 'ceiling')
+
+    def paginate_search(self, search, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        offset, ceiling = self.decode_cursor(request, None) or (0, None)
+        results = search(offset=offset, limit=self.page_size + 1, ceiling=ceiling)
+        self.truncated = results.truncated
+        self.has_next = len(results) > self.page_size
+        self.next_position = [offset + self.page_size, results.ceiling] if self.has_next else None
+        return results[:self.page_size]
+
+    def parse_position(self, values, model):
+        offset, ceiling = values
+        offset = int(offset)
+        if offset < 0:
+            raise ValueError(offset)
+        return offset, None if ceiling is None else int(ceiling)
+
+    def get_paginated_data(self, data):
+        return {**super().get_paginated_data(data), 'truncated': self.truncated}
@@ -1,6 +1,12 @@
 from rest_framework.permissions import BasePermission
 
+from ..enrollment import enrolled_course_ids
+
 
 class IsEnrolled(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.students.filter(id=request.user.id).exists()
+        # CourseViewSet аннотирует is_enrolled в том же запросе, что и get_object
+        enrolled = getattr(obj, 'is_enrolled', None)
+        if enrolled is not None:
+            return enrolled
+        return obj.pk in enrolled_course_ids(request.user)
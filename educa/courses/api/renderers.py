@@ -0,0 +1,24 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class ExportRenderer(BaseRenderer):
+    # Тело выгрузки — StreamingHttpResponse, рендерер нужен для выбора формата
+    # по Accept; сам он выводит только ответы об ошибках (одной строкой JSON).
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode() + b'\n'
+
+
+class NDJSONRenderer(ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
@@ -1,8 +1,10 @@
 import logging
 
+from django.contrib.auth.models import User
 from rest_framework import serializers
-from django.db.models import Count
-from ..models import Content, Course, Module, Subject
+
+from ..catalog import popular_courses
+from ..models import Content, Course, Module, SearchDocument, Subject
 
 logger = logging.getLogger(__name__)
 
@@ -11,11 +13,12 @@ class SubjectSerializer(serializers.ModelSerializer):
     popular_courses = serializers.SerializerMethodField()
 
     def get_popular_courses(self, obj):
-        courses = obj.courses.annotate(
-            total_students=Count('students')
-        ).order_by('-total_students')[:3]
+        # SubjectViewSet заранее считает топ для всей страницы одним запросом
+        courses = getattr(obj, 'top_courses', None)
+        if courses is None:
+            courses = popular_courses([obj.id])[obj.id]
         return [
-            f'{c.title} ({c.total_students})' for c in courses
+            f'{title} ({total_students})' for title, total_students in courses
         ]
 
     class Meta:
@@ -52,11 +55,36 @@ class CourseSerializer(serializers.ModelSerializer):
         ]
 
 
+class CourseListSerializer(serializers.ModelSerializer):
+    # облегчённое представление для /api/courses/: без вложенных модулей
+    class Meta:
+        model = Course
+        fields = [
+            'id',
+            'subject',
+            'title',
+            'slug',
+            'created',
+            'owner',
+            'total_modules',
+            'total_students',
+        ]
+        read_only_fields = fields
+
+
+class CourseListWithModulesSerializer(CourseListSerializer):
+    modules = ModuleSerializer(many=True, read_only=True)
+
+    class Meta(CourseListSerializer.Meta):
+        fields = CourseListSerializer.Meta.fields + ['modules']
+        read_only_fields = fields
+
+
 class ItemRelatedField(serializers.RelatedField):
     def to_representation(self, value):
         if value is None:
             return None
-        render = getattr(value, 'render', None)
+        render = getattr(value, 'cached_render', None) or getattr(value, 'render', None)
         if callable(render):
             try:
                 return render()
@@ -89,3 +117,56 @@ class CourseWithContentsSerializer(CourseSerializer):
 
     class Meta(CourseSerializer.Meta):
         fields = CourseSerializer.Meta.fields
+
+
+class BulkEnrollmentSerializer(serializers.Serializer):
+    courses = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=1000,
+    )
+    # только для администраторов; по умолчанию записывается сам пользователь
+    users = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=10000,
+        required=False,
+    )
+    # по умолчанию в ответе только числа: списки id растут с размером потока
+    include_ids = serializers.BooleanField(default=False)
+
+    def validate_courses(self, value):
+        value = list(dict.fromkeys(value))
+        courses = list(Course.objects.filter(id__in=value).only('id', 'total_students'))
+        missing = sorted(set(value) - {course.id for course in courses})
+        if missing:
+            raise serializers.ValidationError(f'Unknown courses: {missing}')
+        return courses
+
+    def validate_users(self, value):
+        request = self.context['request']
+        if not request.user.is_staff:
+            raise serializers.ValidationError('Only staff can enroll other users.')
+        value = list(dict.fromkeys(value))
+        found = set(User.objects.filter(id__in=value).values_list('id', flat=True))
+        missing = sorted(set(value) - found)
+        if missing:
+            raise serializers.ValidationError(f'Unknown users: {missing}')
+        return value
+
+
+class SearchResultSerializer(serializers.ModelSerializer):
+    # элементы — пары (SearchDocument, rank) из courses.search.search
+    id = serializers.IntegerField(source='object_id')
+    rank = serializers.SerializerMethodField()
+
+    def to_representation(self, result):
+        document, self._rank = result
+        return super().to_representation(document)
+
+    def get_rank(self, obj):
+        return self._rank
+
+    class Meta:
+        model = SearchDocument
+        fields = ['kind', 'id', 'course', 'module', 'title', 'rank']
@@ -1,14 +1,23 @@
 from django.urls import include, path
 from rest_framework import routers
 
-from . import views
+from . import async_views, views
 
 app_name = 'api'
 
 router = routers.DefaultRouter()
 router.register('courses', views.CourseViewSet)
 router.register('subjects', views.SubjectViewSet)
+router.register('enrollments', views.EnrollmentViewSet, basename='enrollment')
 
 urlpatterns = [
+    # async-чтения для ASGI, ответы как у /api/subjects/ и /api/courses/
+    path('async/subjects/', async_views.subject_list, name='async-subject-list'),
+    path('async/courses/', async_views.course_list, name='async-course-list'),
+    path('async/courses/<int:pk>/', async_views.course_detail, name='async-course-detail'),
+    path('async/courses/<int:pk>/contents/', async_views.course_contents, name='async-course-contents'),
+    path('export/', views.ExportView.as_view(), name='export'),
+    path('metrics/', views.MetricsView.as_view(), name='metrics'),
+    path('search/', views.SearchView.as_view(), name='search'),
     path('', include(router.urls)),
 ]
@@ -1,53 +1,214 @@
-from rest_framework import decorators, viewsets
-from rest_framework.authentication import BasicAuthentication
-from rest_framework.permissions import IsAuthenticated
+from django.core.exceptions import PermissionDenied
+from django.db.models import Exists, OuterRef
+from django.http import StreamingHttpResponse
+from rest_framework import decorators, views, viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 
-from ..models import Course, Subject
+from ..catalog import catalog_generation, popular_courses
+from ..conditional import etag_matches
+from ..enrollment import bulk_enroll, enrollment_generation
+from ..export import KINDS, export_lines
+from ..instrumentation import registry
+from ..models import Content, Course, Subject
+from ..ordering import apply_order
+from ..search import search
+from ..snapshots import get_course_snapshot
+from .authentication import CachedBasicAuthentication
+from .compiled import CompiledReadMixin
+from .conditional import ConditionalReadMixin
+from .pagination import CourseKeysetPagination, SearchPagination, SubjectKeysetPagination
+from .permissions import IsEnrolled
+from .renderers import CSVRenderer, NDJSONRenderer
 from .serializers import (
+    BulkEnrollmentSerializer,
+    CourseListSerializer,
+    CourseListWithModulesSerializer,
     CourseSerializer,
     CourseWithContentsSerializer,
+    SearchResultSerializer,
     SubjectSerializer,
 )
-from .permissions import IsEnrolled
 
-from django.db.models import Count
-from .pagination import StandardPagination
 
+def attach_popular_courses(subjects):
+    top = popular_courses([subject.id for subject in subjects])
+    for subject in subjects:
+        subject.top_courses = top[subject.id]
+    return subjects
 
-class SubjectViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Subject.objects.annotate(
-        total_courses=Count('courses')
-    )
+
+class SubjectViewSet(ConditionalReadMixin, CompiledReadMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Subject.objects.all()
     serializer_class = SubjectSerializer
-    pagination_class = StandardPagination
+    pagination_class = SubjectKeysetPagination
 
-class CourseViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Course.objects.select_related('subject', 'owner').prefetch_related(
-        'modules', 'modules__contents'
-    )
+    def serialize(self, data, many=False):
+        attach_popular_courses(list(data) if many else [data])
+        return super().serialize(data, many)
+
+    def get_etag_parts(self):
+        # total_courses — через поколение каталога, популярные курсы — через записи
+        return catalog_generation(), enrollment_generation()
+
+
+class CourseViewSet(ConditionalReadMixin, CompiledReadMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Course.objects.select_related('subject', 'owner').prefetch_related('modules')
     serializer_class = CourseSerializer
+    pagination_class = CourseKeysetPagination
+
+    def get_expand(self):
+        return set(filter(None, self.request.query_params.get('expand', '').split(',')))
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            if 'modules' in self.get_expand():
+                return CourseListWithModulesSerializer
+            return CourseListSerializer
+        return super().get_serializer_class()
+
+    def get_etag_parts(self):
+        return catalog_generation(), enrollment_generation()
+
+    def get_queryset(self):
+        if self.action in ('enroll', 'order_modules', 'order_contents'):
+            return Course.objects.all()
+        if self.action == 'list':
+            if 'modules' in self.get_expand():
+                return Course.objects.only(*CourseListSerializer.Meta.fields).prefetch_related('modules')
+            return Course.objects.values(*CourseListSerializer.Meta.fields)
+        if self.action == 'contents':
+            # дерево модулей берётся из снимка, здесь нужна только проверка доступа
+            return Course.objects.annotate(
+                is_enrolled=Exists(
+                    Course.students.through.objects.filter(course=OuterRef('pk'), user_id=self.request.user.id)
+                )
+            )
+        return super().get_queryset()
 
     @decorators.action(
         detail=True,
         methods=['post'],
-        authentication_classes=[BasicAuthentication],
+        authentication_classes=[CachedBasicAuthentication],
         permission_classes=[IsAuthenticated],
     )
     def enroll(self, request, *args, **kwargs):
         course = self.get_object()
-        _, created = course.students.through.objects.get_or_create(
-            course=course,
-            user=request.user,
-        )
+        # через менеджер связи, чтобы сработал m2m_changed (счётчики, кеши)
+        created = not course.students.filter(id=request.user.id).exists()
+        if created:
+            course.students.add(request.user)
         return Response({'enrolled': True, 'new_enrollment': created})
 
     @decorators.action(
         detail=True,
         methods=['get'],
         serializer_class=CourseWithContentsSerializer,
-        authentication_classes=[BasicAuthentication],
+        authentication_classes=[CachedBasicAuthentication],
         permission_classes=[IsAuthenticated, IsEnrolled],
     )
     def contents(self, request, *args, **kwargs):
-        return self.retrieve(request, *args, **kwargs)
+        snapshot = get_course_snapshot(self.get_object())
+        if request.accepted_renderer.format != 'json':
+            # ETag посчитан по JSON-телу, к другим представлениям он не относится
+            return Response(snapshot['data'])
+        headers = {'ETag': snapshot['etag']}
+        if etag_matches(request, snapshot['etag']):
+            return Response(status=304, headers=headers)
+        return Response(snapshot['data'], headers=headers)
+
+    def _apply_order(self, request, queryset):
+        course = self.get_object()
+        if course.owner_id != request.user.id:
+            raise PermissionDenied
+        try:
+            apply_order(queryset(course), request.data)
+        except ValueError as exc:
+            raise ValidationError({'detail': str(exc)})
+        return Response({'saved': 'OK'})
+
+    @decorators.action(
+        detail=True,
+        methods=['post'],
+        url_path='modules/order',
+        permission_classes=[IsAuthenticated],
+    )
+    def order_modules(self, request, *args, **kwargs):
+        return self._apply_order(request, lambda course: course.modules.all())
+
+    @decorators.action(
+        detail=True,
+        methods=['post'],
+        url_path='contents/order',
+        permission_classes=[IsAuthenticated],
+    )
+    def order_contents(self, request, *args, **kwargs):
+        return self._apply_order(request, lambda course: Content.objects.filter(module__course=course))
+
+
+class EnrollmentViewSet(viewsets.GenericViewSet):
+    serializer_class = BulkEnrollmentSerializer
+    permission_classes = [IsAuthenticated]
+
+    @decorators.action(detail=False, methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        courses = serializer.validated_data['courses']
+        users = serializer.validated_data.get('users', [request.user.id])
+        result = bulk_enroll(courses, users)
+        include_ids = serializer.validated_data['include_ids']
+        results = []
+        for course_id, (created, existing) in result.items():
+            row = {'course': course_id, 'created': len(created), 'existing': len(existing)}
+            if include_ids:
+                row.update(created_ids=created, existing_ids=existing)
+            results.append(row)
+        return Response({'results': results})
+
+
+class ExportView(views.APIView):
+    # ?kind=course,module&output=ndjson|csv; без output формат берётся из Accept
+    # (или ?format=), по умолчанию ndjson
+    permission_classes = [IsAdminUser]
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+
+    def get(self, request, *args, **kwargs):
+        kinds = [kind for kind in request.query_params.get('kind', '').split(',') if kind] or list(KINDS)
+        output = request.query_params.get('output', request.accepted_renderer.format)
+        try:
+            lines = export_lines(kinds, output)
+        except ValueError as exc:
+            raise ValidationError({'detail': str(exc)})
+        content_type = {renderer.format: renderer.media_type for renderer in self.renderer_classes}[output]
+        response = StreamingHttpResponse(lines, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="catalog.{output}"'
+        return response
+
+
+class MetricsView(views.APIView):
+    # гистограммы InstrumentationMiddleware этого процесса; DELETE — сброс
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(registry.snapshot())
+
+    def delete(self, request, *args, **kwargs):
+        registry.reset()
+        return Response(status=204)
+
+
+class SearchView(views.APIView):
+    # ?q=...; страницы по позиции в закреплённом окне кандидатов (SearchPagination)
+    pagination_class = SearchPagination
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'This parameter is required.'})
+        paginator = self.pagination_class()
+        results = paginator.paginate_search(
+            lambda offset, limit, ceiling: search(query, offset=offset, limit=limit, ceiling=ceiling), request
+        )
+        return paginator.get_paginated_response(SearchResultSerializer(results, many=True).data)
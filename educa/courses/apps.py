@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoursesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'courses'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .instrumentation import install_template_hook
+
+        install_template_hook()
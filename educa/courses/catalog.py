@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Course, Subject
+from .routers import primary_reads
+from .versions import bump_versions, get_version
+
+GENERATION_KEY = 'catalog:generation'
+
+
+def _timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 60 * 60)
+
+
+def catalog_generation():
+    return get_version(GENERATION_KEY)
+
+
+def bump_catalog_generation():
+    bump_versions([GENERATION_KEY])
+
+
+def _cached(name, build):
+    key = f'catalog:{catalog_generation()}:{name}'
+    rows = cache.get(key)
+    if rows is None:
+        # под новое поколение кладём данные primary, а не отставшей реплики
+        with primary_reads():
+            rows = build()
+        cache.set(key, rows, _timeout())
+    return rows
+
+
+def _subject_rows():
+    return list(
+        Subject.objects.values('id', 'title', 'slug', 'total_courses')
+    )
+
+
+def _course_rows(subject_id=None):
+    qs = Course.objects.all()
+    if subject_id is not None:
+        qs = qs.filter(subject_id=subject_id)
+    rows = qs.values(
+        'id', 'title', 'slug', 'overview', 'created', 'total_modules',
+        'subject_id', 'subject__title', 'subject__slug', 'owner__username',
+    )
+    return [
+        {
+            'id': row['id'],
+            'title': row['title'],
+            'slug': row['slug'],
+            'overview': row['overview'],
+            'created': row['created'],
+            'total_modules': row['total_modules'],
+            'subject': {'id': row['subject_id'], 'title': row['subject__title'], 'slug': row['subject__slug']},
+            'owner': {'username': row['owner__username']},
+        }
+        for row in rows
+    ]
+
+
+def get_subjects():
+    return _cached('subjects', _subject_rows)
+
+
+def get_subject(slug):
+    for subject in get_subjects():
+        if subject['slug'] == slug:
+            return subject
+    return None
+
+
+def get_courses(subject_id=None):
+    if subject_id is None:
+        return _cached('courses', _course_rows)
+    return _cached(f'subject:{subject_id}:courses', lambda: _course_rows(subject_id))
+
+
+def _ranked_courses(subject_ids, limit):
+    # топ курсов по числу студентов сразу для всех предметов страницы — один запрос
+    # с ROW_NUMBER() OVER (PARTITION BY subject_id ...)
+    return Course.objects.filter(subject_id__in=subject_ids).annotate(
+        rank=Window(
+            RowNumber(),
+            partition_by=F('subject_id'),
+            order_by=[F('total_students').desc(), F('id').asc()],
+        ),
+    ).filter(rank__lte=limit).order_by('subject_id', 'rank').values_list('subject_id', 'title', 'total_students')
+
+
+def popular_courses(subject_ids, limit=3):
+    result = {subject_id: [] for subject_id in subject_ids}
+    for subject_id, title, total_students in _ranked_courses(subject_ids, limit):
+        result[subject_id].append((title, total_students))
+    return result
+
+
+async def apopular_courses(subject_ids, limit=3):
+    result = {subject_id: [] for subject_id in subject_ids}
+    async for subject_id, title, total_students in _ranked_courses(subject_ids, limit):
+        result[subject_id].append((title, total_students))
+    return result
@@ -0,0 +1,29 @@
+import hashlib
+
+from django.utils.http import parse_etags
+
+
+def make_etag(*parts):
+    # слабый валидатор: собран из версий данных, а не из байтов ответа
+    digest = hashlib.md5(':'.join(str(part) for part in parts).encode(), usedforsecurity=False).hexdigest()
+    return f'W/"{digest}"'
+
+
+def page_etag(request, *parts):
+    # шапка страницы зависит от пользователя, форма выхода — от CSRF-секрета
+    return make_etag(request.user.pk, request.META.get('CSRF_COOKIE'), *parts)
+
+
+def replica_etag(etag):
+    # тело могло быть с отставшей реплики: такой валидатор не совпадёт ни с
+    # одним make_etag, и следующая перепроверка прочитает primary
+    return etag.removesuffix('"') + '.replica"'
+
+
+def etag_matches(request, etag):
+    # If-None-Match сравнивается слабо (RFC 9110, 13.1.2)
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    if '*' in etags:
+        return True
+    etag = etag.removeprefix('W/')
+    return any(candidate.removeprefix('W/') == etag for candidate in etags)
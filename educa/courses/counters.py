@@ -0,0 +1,113 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Course, Module, Subject
+
+
+def _shift(model, pks, field, delta):
+    if pks:
+        model.objects.filter(pk__in=pks).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def _count(model, field):
+    # коррелированный подзапрос: UPDATE ... SET x = (SELECT COUNT(*) ...) одной командой
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(total=Count('*')).values('total')
+        ),
+        0,
+    )
+
+
+def rebuild_counters(course_ids=None, subject_ids=None):
+    courses = Course.objects.all() if course_ids is None else Course.objects.filter(pk__in=course_ids)
+    subjects = Subject.objects.all() if subject_ids is None else Subject.objects.filter(pk__in=subject_ids)
+    updated_courses = courses.update(
+        total_students=_count(Course.students.through, 'course'),
+        total_modules=_count(Module, 'course'),
+    )
+    updated_subjects = subjects.update(total_courses=_count(Course, 'subject'))
+    return updated_courses, updated_subjects
+
+
+def _enrolled_pks(instance, reverse, pk_set):
+    # pk_set у remove — все переданные pk, в том числе не записанные на курс
+    through = Course.students.through.objects
+    if reverse:
+        return set(through.filter(user=instance.pk, course__in=pk_set).values_list('course_id', flat=True))
+    return set(through.filter(course=instance.pk, user__in=pk_set).values_list('user_id', flat=True))
+
+
+def enrollment_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_course_ids = list(instance.courses_joined.values_list('pk', flat=True))
+        return
+    if action == 'pre_remove':
+        instance._removed_pks = _enrolled_pks(instance, reverse, pk_set) if pk_set else set()
+        return
+    if action in ('post_add', 'post_remove'):
+        # у add Django уже оставил в pk_set только новые связи
+        pks = pk_set if action == 'post_add' else instance.__dict__.pop('_removed_pks', set())
+        delta = len(pks) if action == 'post_add' else -len(pks)
+        if reverse:
+            _shift(Course, pks, 'total_students', 1 if delta > 0 else -1)
+        elif pks:
+            _shift(Course, [instance.pk], 'total_students', delta)
+            instance.total_students = max(instance.total_students + delta, 0)
+    elif action == 'post_clear':
+        if reverse:
+            _shift(Course, getattr(instance, '_cleared_course_ids', []), 'total_students', -1)
+        else:
+            Course.objects.filter(pk=instance.pk).update(total_students=0)
+            instance.total_students = 0
+
+
+def user_deleted(sender, instance, **kwargs):
+    # каскад на связи курса идёт мимо m2m_changed; pre_delete выполняется
+    # внутри транзакции удаления, так что откат вернёт и счётчики
+    course_ids = Course.students.through.objects.filter(user=instance.pk).values_list('course_id', flat=True)
+    _shift(Course, list(course_ids), 'total_students', -1)
+
+
+def module_pre_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if update_fields is not None and 'course' not in update_fields and 'course_id' not in update_fields:
+        return
+    if instance.pk and not raw and not instance._state.adding:
+        instance._previous_course_id = Module.objects.filter(pk=instance.pk).values_list('course_id', flat=True).first()
+
+
+def module_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        _shift(Course, [instance.course_id], 'total_modules', 1)
+        return
+    previous = instance.__dict__.pop('_previous_course_id', None)
+    if previous is not None and previous != instance.course_id:
+        _shift(Course, [previous], 'total_modules', -1)
+        _shift(Course, [instance.course_id], 'total_modules', 1)
+
+
+def module_deleted(sender, instance, **kwargs):
+    _shift(Course, [instance.course_id], 'total_modules', -1)
+
+
+def course_pre_save(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw and not instance._state.adding:
+        instance._previous_subject_id = Course.objects.filter(pk=instance.pk).values_list('subject_id', flat=True).first()
+
+
+def course_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        _shift(Subject, [instance.subject_id], 'total_courses', 1)
+        return
+    previous = getattr(instance, '_previous_subject_id', None)
+    if previous is not None and previous != instance.subject_id:
+        _shift(Subject, [previous], 'total_courses', -1)
+        _shift(Subject, [instance.subject_id], 'total_courses', 1)
+
+
+def course_deleted(sender, instance, **kwargs):
+    _shift(Subject, [instance.subject_id], 'total_courses', -1)
@@ -0,0 +1,135 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+# Выдача загруженных файлов после проверки прав. Если перед Django стоит
+# веб-сервер, файл отдаёт он (X-Accel-Redirect / X-Sendfile), иначе —
+# FileResponse: под gunicorn/uWSGI он уходит в wsgi.file_wrapper и
+# os.sendfile, байты файла не проходят через память воркера.
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    # часть файла [start, start + length) для FileResponse; fileno() оставлен,
+    # чтобы file_wrapper мог отправить её через sendfile с текущей позиции
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    '''
+    (start, end) включительно для одного диапазона, None — отдать файл целиком
+    (нет заголовка, несколько диапазонов, чужие единицы). ValueError —
+    диапазон вне файла (416).
+    '''
+    match = RANGE_RE.match(header.replace(' ', '')) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N: последние N байт
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise ValueError(header)
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        # If-Range сравнивается строго, слабый тег не подходит
+        return not value.startswith('W/') and etag in parse_etags(value)
+    return parse_http_date_safe(value) == last_modified
+
+
+def _sendfile_backend():
+    return getattr(settings, 'SENDFILE_BACKEND', None)
+
+
+def serve_file(request, field_file, as_attachment=False):
+    backend = _sendfile_backend()
+    filename = os.path.basename(field_file.name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if backend == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, 'SENDFILE_URL_PREFIX', '/protected/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(field_file.name)
+    elif backend == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = field_file.path
+    elif backend is None:
+        return _file_response(request, field_file, filename, as_attachment)
+    else:
+        raise ValueError(f'Unknown SENDFILE_BACKEND {backend!r}.')
+    # Range и кеш-валидаторы обработает веб-сервер
+    if as_attachment:
+        response['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+    return response
+
+
+def _file_response(request, field_file, filename, as_attachment):
+    path = field_file.path
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    last_modified = int(stat.st_mtime)
+    headers = {'Accept-Ranges': 'bytes', 'ETag': etag, 'Last-Modified': http_date(last_modified)}
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        if response.status_code == 304:
+            response['ETag'] = etag
+            response['Last-Modified'] = headers['Last-Modified']
+        return response
+
+    byte_range = None
+    if request.method in ('GET', 'HEAD') and _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            return HttpResponse(status=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+
+    file = open(path, 'rb')
+    if byte_range is None:
+        return FileResponse(file, as_attachment=as_attachment, filename=filename, headers=headers)
+    start, end = byte_range
+    response = FileResponse(
+        FileRange(file, start, end - start + 1),
+        status=206,
+        as_attachment=as_attachment,
+        filename=filename,
+        headers={**headers, 'Content-Range': f'bytes {start}-{end}/{size}'},
+    )
+    response['Content-Length'] = str(end - start + 1)
+    return response
@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+
+from .models import Course
+from .routers import primary_reads
+from .versions import bump_versions, get_version
+
+# сдвигается при любой записи/отписке: от неё зависят total_students в API
+GENERATION_KEY = 'enrollment:generation'
+
+
+def enrolled_version_key(user_id):
+    return f'enrolled_courses:version:{user_id}'
+
+
+def enrolled_cache_key(user_id, version):
+    return f'enrolled_courses:{user_id}:{version}'
+
+
+def enrolled_course_ids(user):
+    '''
+    Множество id курсов, на которые записан пользователь.
+
+    Запоминается на объекте пользователя (то есть на время запроса) и в кеше
+    под версией пользователя, которую сдвигает m2m_changed на Course.students:
+    читатель, начавший до записи на курс, положит старое множество под старую
+    версию, и его уже никто не прочитает.
+    '''
+    if not user.is_authenticated:
+        return frozenset()
+    ids = getattr(user, '_enrolled_course_ids', None)
+    if ids is None:
+        key = enrolled_cache_key(user.pk, get_version(enrolled_version_key(user.pk)))
+        ids = cache.get(key)
+        if ids is None:
+            with primary_reads():
+                ids = frozenset(Course.students.through.objects.filter(user_id=user.pk).values_list('course_id', flat=True))
+            cache.set(key, ids, getattr(settings, 'ENROLLMENT_CACHE_TIMEOUT', 60 * 60 * 24))
+        user._enrolled_course_ids = ids
+    return ids
+
+
+def enrollment_generation():
+    return get_version(GENERATION_KEY)
+
+
+def forget_enrollments(user_ids):
+    # записи сменились в обход m2m_changed (массовая загрузка): сбросить кеши.
+    # Второй сдвиг — после коммита: читатель, промахнувшийся по новой версии
+    # до коммита, успел бы положить под неё старое множество
+    keys = [enrolled_version_key(pk) for pk in user_ids] + [GENERATION_KEY]
+    bump_versions(keys)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: bump_versions(keys))
+
+
+def enrollment_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        instance.__dict__.pop('_enrolled_course_ids', None)
+        if action.startswith('post_'):
+            forget_enrollments([instance.pk])
+        return
+    if action == 'pre_clear':
+        instance._cleared_user_ids = list(instance.students.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        forget_enrollments(getattr(instance, '_cleared_user_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        forget_enrollments(pk_set)
+
+
+def bulk_enroll(courses, user_ids):
+    '''
+    Записывает пользователей user_ids на курсы courses одной вставкой.
+
+    Возвращает {course_id: (созданные user_id, уже записанные user_id)}.
+    Для каждого курса с новыми записями отправляется m2m_changed, как при
+    course.students.add(), чтобы обновились счётчики и кеши.
+    '''
+    through = Course.students.through
+    course_ids = [course.pk for course in courses]
+    user_ids = list(dict.fromkeys(user_ids))
+    with transaction.atomic():
+        existing = set(
+            through.objects.filter(course_id__in=course_ids, user_id__in=user_ids).values_list('course_id', 'user_id')
+        )
+        result = {
+            course_id: (
+                [user_id for user_id in user_ids if (course_id, user_id) not in existing],
+                [user_id for user_id in user_ids if (course_id, user_id) in existing],
+            )
+            for course_id in course_ids
+        }
+        through.objects.bulk_create(
+            [
+                through(course_id=course_id, user_id=user_id)
+                for course_id, (created, _) in result.items()
+                for user_id in created
+            ],
+            ignore_conflicts=True,
+            batch_size=1000,
+        )
+        for course in courses:
+            created = result[course.pk][0]
+            if created:
+                m2m_changed.send(
+                    sender=through, instance=course, action='post_add', reverse=False,
+                    model=User, pk_set=set(created), using=through.objects.db,
+                )
+    return result
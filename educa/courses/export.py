@@ -0,0 +1,123 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .loading import item_prefetch
+from .models import ITEM_MODELS, Content, Course, Module, Subject
+
+# Выгрузка каталога построчно: строки идут из QuerySet.iterator(chunk_size),
+# поэтому память не зависит от размера каталога. У каждой строки есть kind,
+# ссылки — это id исходной базы, пользователи — username.
+
+CHUNK_SIZE = 2000
+
+# колонка -> lookup для values_list
+SOURCES = {
+    'subject': (('id', 'id'), ('title', 'title'), ('slug', 'slug')),
+    'course': (
+        ('id', 'id'), ('subject', 'subject_id'), ('owner', 'owner__username'), ('title', 'title'),
+        ('slug', 'slug'), ('overview', 'overview'), ('created', 'created'),
+    ),
+    'module': (('id', 'id'), ('course', 'course_id'), ('title', 'title'), ('description', 'description'), ('order', 'order')),
+    'enrollment': (('course', 'course_id'), ('user', 'user__username')),
+}
+
+ITEM_BASE_FIELDS = ('id', 'owner', 'title', 'created', 'updated')
+# собственные поля материалов: content у Text, file у File/Image, url у Video
+ITEM_FIELDS = {
+    model._meta.model_name: [
+        field for field in model._meta.concrete_fields
+        if field.editable and field.name not in ITEM_BASE_FIELDS
+    ]
+    for model in ITEM_MODELS
+}
+
+COLUMNS = {
+    'subject': ('kind', *(column for column, _ in SOURCES['subject'])),
+    'course': ('kind', *(column for column, _ in SOURCES['course'])),
+    'module': ('kind', *(column for column, _ in SOURCES['module'])),
+    'content': (
+        'kind', 'id', 'module', 'order', 'item_type', 'title', 'owner',
+        *dict.fromkeys(field.name for fields in ITEM_FIELDS.values() for field in fields),
+    ),
+    'enrollment': ('kind', *(column for column, _ in SOURCES['enrollment'])),
+}
+KINDS = tuple(COLUMNS)
+FORMATS = ('ndjson', 'csv')
+
+
+def _queryset(kind):
+    return {
+        'subject': Subject.objects.all(),
+        'course': Course.objects.all(),
+        'module': Module.objects.all(),
+        'enrollment': Course.students.through.objects.all(),
+    }[kind]
+
+
+def _plain_rows(kind, chunk_size):
+    columns = COLUMNS[kind]
+    lookups = [lookup for _, lookup in SOURCES[kind]]
+    queryset = _queryset(kind).order_by('pk').values_list(*lookups)
+    for values in queryset.iterator(chunk_size=chunk_size):
+        yield dict(zip(columns, (kind, *values)))
+
+
+def _content_rows(chunk_size):
+    # prefetch выполняется на каждую порцию iterator(): один запрос на тип материала
+    contents = Content.objects.select_related('content_type').prefetch_related(item_prefetch()).order_by('pk')
+    for content in contents.iterator(chunk_size=chunk_size):
+        item = content.item
+        row = dict.fromkeys(COLUMNS['content'])
+        row.update(kind='content', id=content.pk, module=content.module_id, order=content.order)
+        row['item_type'] = content.content_type.model
+        if item is not None:
+            row.update(title=item.title, owner=item.owner.username)
+            for field in ITEM_FIELDS[row['item_type']]:
+                row[field.name] = field.value_to_string(item)
+        yield row
+
+
+def export_rows(kinds=KINDS, chunk_size=CHUNK_SIZE):
+    # порядок kinds в выгрузке — порядок зависимостей для import_catalog
+    for kind in KINDS:
+        if kind not in kinds:
+            continue
+        if kind == 'content':
+            yield from _content_rows(chunk_size)
+        else:
+            yield from _plain_rows(kind, chunk_size)
+
+
+class Echo:
+    # файловый объект для csv.writer: write() просто возвращает строку
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+def csv_lines(rows, kind):
+    # у CSV одна шапка, поэтому в одном потоке — строки одного kind
+    writer = csv.DictWriter(Echo(), fieldnames=COLUMNS[kind])
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def export_lines(kinds=KINDS, format='ndjson', chunk_size=CHUNK_SIZE):
+    if format not in FORMATS:
+        raise ValueError(f'Unknown format {format!r}, expected one of: {", ".join(FORMATS)}.')
+    unknown = set(kinds) - set(KINDS)
+    if unknown:
+        raise ValueError(f'Unknown kinds: {", ".join(sorted(unknown))}.')
+    rows = export_rows(kinds, chunk_size)
+    if format == 'csv':
+        if len(kinds) != 1:
+            raise ValueError('CSV export takes exactly one kind.')
+        return csv_lines(rows, kinds[0])
+    return ndjson_lines(rows)
@@ -1,5 +1,6 @@
-from django.core.exceptions import ObjectDoesNotExist
-from django.db import models
+from django.apps import apps
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import F, Max, signals
 
 
 class OrderField(models.PositiveIntegerField):
@@ -10,16 +11,103 @@ class OrderField(models.PositiveIntegerField):
     def pre_save(self, model_instance, add):
         # Если атрибут пустой — назначаем порядковый номер
         if getattr(model_instance, self.attname) is None:
-            try:
-                qs = self.model.objects.all()
-                if self.for_fields:
-                    query = {field: getattr(model_instance, field) for field in self.for_fields}
-                    qs = qs.filter(**query)
-                last_item = qs.latest(self.attname)
-                value = last_item.order + 1
-            except ObjectDoesNotExist:
-                value = 0
+            value = self.allocate(model_instance)
             setattr(model_instance, self.attname, value)
             return value
-        else:
-            return super().pre_save(model_instance, add)
+        return super().pre_save(model_instance, add)
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super().contribute_to_class(cls, name, **kwargs)
+        if not cls._meta.abstract:
+            signals.pre_save.connect(self._explicit_saved, sender=cls, weak=False)
+
+    def _explicit_saved(self, sender, instance, raw=False, **kwargs):
+        # Явный номер, вставленный через save(), подтягивает счётчик группы,
+        # иначе allocate потом выдаст тот же номер. bulk_create сюда не
+        # попадает: массовая загрузка сбрасывает счётчики сама (reset).
+        if not raw and instance._state.adding and getattr(instance, self.attname) is not None:
+            self.advance([instance])
+
+    def assign(self, instances):
+        '''Назначает order пачке объектов: один непрерывный блок на группу for_fields.'''
+        groups = {}
+        for instance in instances:
+            if getattr(instance, self.attname) is None:
+                groups.setdefault(self._scope(instance), []).append(instance)
+        for group in groups.values():
+            start = self.allocate(group[0], len(group))
+            for offset, instance in enumerate(group):
+                setattr(instance, self.attname, start + offset)
+        return instances
+
+    def advance(self, instances):
+        '''Подтягивает счётчики групп к явно заданным номерам (после переупорядочивания).'''
+        sequence = apps.get_model('courses', 'OrderSequence')
+        using = router.db_for_write(self.model)
+        highest = {}
+        for instance in instances:
+            scope = self._scope(instance)
+            highest[scope] = max(highest.get(scope, -1), getattr(instance, self.attname))
+        for scope, value in highest.items():
+            sequence._default_manager.using(using).filter(scope=scope, value__lt=value).update(value=value)
+
+    def reset(self, instances):
+        '''Удаляет счётчики групп: следующий allocate заново возьмёт их от Max (после массовой загрузки).'''
+        sequence = apps.get_model('courses', 'OrderSequence')
+        using = router.db_for_write(self.model)
+        scopes = {self._scope(instance) for instance in instances}
+        sequence._default_manager.using(using).filter(scope__in=scopes).delete()
+
+    def allocate(self, model_instance, count=1):
+        '''
+        Выдаёт первый из count подряд идущих номеров.
+
+        Номера берутся из счётчика OrderSequence своей группы атомарным
+        UPDATE, поэтому параллельные вставки не получают одинаковый order
+        и не сканируют таблицу. Счётчик группы создаётся при первом
+        обращении от текущего максимума.
+        '''
+        sequence = apps.get_model('courses', 'OrderSequence')
+        using = router.db_for_write(self.model, instance=model_instance)
+        scope = self._scope(model_instance)
+        with transaction.atomic(using=using, savepoint=False):
+            value = self._bump(sequence, using, scope, count)
+            if value is None:
+                last = self.model._default_manager.using(using).filter(
+                    **self._lookup(model_instance)
+                ).aggregate(last=Max(self.attname))['last']
+                value = (-1 if last is None else last) + count
+                try:
+                    with transaction.atomic(using=using):
+                        sequence._default_manager.using(using).create(scope=scope, value=value)
+                except IntegrityError:
+                    # счётчик успел создать параллельный запрос
+                    value = self._bump(sequence, using, scope, count)
+        return value - count + 1
+
+    def _bump(self, sequence, using, scope, count):
+        connection = connections[using]
+        if connection.vendor in ('postgresql', 'sqlite') and connection.features.can_return_columns_from_insert:
+            table = connection.ops.quote_name(sequence._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {table} SET value = value + %s WHERE scope = %s RETURNING value',
+                    [count, scope],
+                )
+                row = cursor.fetchone()
+            return row[0] if row else None
+        manager = sequence._default_manager.using(using)
+        if not manager.filter(scope=scope).update(value=F('value') + count):
+            return None
+        return manager.filter(scope=scope).values_list('value', flat=True).get()
+
+    def _lookup(self, model_instance):
+        lookup = {}
+        for name in self.for_fields or ():
+            attname = self.model._meta.get_field(name).attname
+            lookup[attname] = getattr(model_instance, attname)
+        return lookup
+
+    def _scope(self, model_instance):
+        values = [str(value) for value in self._lookup(model_instance).values()]
+        return ':'.join([self.model._meta.label_lower, self.attname, *values])
@@ -0,0 +1,180 @@
+import hashlib
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models.fields.files import FieldFile
+from django.urls import reverse
+from PIL import Image as PILImage
+from PIL import ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+# Уменьшенные копии картинок для srcset. Копии лежат в каталоге, названном по
+# sha256 исходного файла, поэтому повторная обработка того же файла (в том
+# числе загруженного в другой материал) ничего не перекодирует.
+
+DERIVATIVES_DIR = 'images/derivatives'
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _workers():
+    return getattr(settings, 'IMAGE_WORKERS', 2)
+
+
+def _widths():
+    return tuple(sorted(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', (320, 640, 1280))))
+
+
+def _formats():
+    return [name for name in FORMATS if name != 'webp' or features.check('webp')]
+
+
+def derivatives_dir(digest):
+    return posixpath.join(DERIVATIVES_DIR, digest[:2], digest)
+
+
+def derivative_name(digest, width, format):
+    return posixpath.join(derivatives_dir(digest), f'{width}.{format}')
+
+
+def _open(field_file):
+    # через storage, а не по .path: хранилище может быть и не локальным
+    return field_file.storage.open(field_file.name, 'rb')
+
+
+def derivative_file(image, width, format):
+    # копия как FieldFile картинки: её отдаёт serve_file после проверки доступа
+    return FieldFile(image, image.file.field, derivative_name(image.file_hash, width, format))
+
+
+def file_digest(field_file):
+    sha = hashlib.sha256()
+    with _open(field_file) as handle:
+        for chunk in handle.chunks():
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _encode(picture, width, format):
+    copy = picture.copy()
+    copy.thumbnail((width, width * 10))
+    if format == 'jpeg' and copy.mode not in ('RGB', 'L'):
+        copy = copy.convert('RGB')
+    buffer = BytesIO()
+    copy.save(buffer, FORMATS[format], quality=82)
+    return buffer.getvalue()
+
+
+def build_derivatives(field_file, digest):
+    '''Создаёт недостающие копии; возвращает число записанных файлов.'''
+    with _open(field_file) as handle:
+        picture = ImageOps.exif_transpose(PILImage.open(handle))
+        picture.load()
+    written = 0
+    # шире оригинала не растягиваем
+    for width in [width for width in _widths() if width < picture.width]:
+        for format in _formats():
+            name = derivative_name(digest, width, format)
+            if not field_file.storage.exists(name):
+                field_file.storage.save(name, ContentFile(_encode(picture, width, format)))
+                written += 1
+    return written
+
+
+def srcsets(image):
+    '''{'webp': 'url 320w, ...', 'jpeg': ...} по готовым копиям; пустой dict, если их нет.'''
+    if not image.file_hash:
+        return {}
+    try:
+        _, files = image.file.storage.listdir(derivatives_dir(image.file_hash))
+    except (FileNotFoundError, NotImplementedError):
+        return {}
+    result = {}
+    for format in _formats():
+        widths = sorted(int(name.split('.')[0]) for name in files if name.endswith(f'.{format}'))
+        if widths:
+            urls = [reverse('courses:image_derivative', args=[image.pk, width, format]) for width in widths]
+            result[format] = ', '.join(f'{url} {width}w' for url, width in zip(urls, widths))
+    return result
+
+
+def process_image(image_id):
+    '''
+    Считает хеш файла и строит копии. Если хеш не изменился и копии на месте,
+    ничего не делает; иначе записывает file_hash и обновляет кеши HTML.
+    '''
+    from .models import Image
+    from .render_cache import store_rendered
+    from .snapshots import invalidate_item
+
+    image = Image.objects.filter(pk=image_id).first()
+    if image is None or not image.file:
+        return False
+    try:
+        digest = file_digest(image.file)
+        written = build_derivatives(image.file, digest)
+    except (OSError, ValueError, PILImage.DecompressionBombError):
+        logger.exception('Failed to build derivatives for image %s', image_id)
+        return False
+    if digest == image.file_hash and not written:
+        return False
+    # update(), а не save(): не трогаем updated и не запускаем обработку заново
+    if not Image.objects.filter(pk=image.pk, file=image.file.name).update(file_hash=digest):
+        return False
+    image.file_hash = digest
+    store_rendered(image)
+    invalidate_item(image)
+    return True
+
+
+def _run(image_id):
+    try:
+        process_image(image_id)
+    except Exception:
+        logger.exception('Image processing failed for %s', image_id)
+    finally:
+        # соединения воркера живут в его потоке, вернём их сразу
+        connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix='images')
+        return _executor
+
+
+def schedule(image_id):
+    # IMAGE_WORKERS = 0 — обработка в текущем потоке (тесты, команды)
+    if not _workers():
+        process_image(image_id)
+    else:
+        _get_executor().submit(_run, image_id)
+
+
+def image_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or not instance.file:
+        return
+    # хеш считаем заново, только если файл новый, заменён или ещё не обработан
+    changed = instance._state.adding or not instance.file._committed
+    if not changed:
+        stored = type(instance).objects.filter(pk=instance.pk).values_list('file', 'file_hash').first()
+        changed = stored is None or stored[0] != instance.file.name or not stored[1]
+    instance._file_changed = changed
+
+
+def image_saved(sender, instance, raw=False, **kwargs):
+    if raw or not instance.file or not instance.__dict__.pop('_file_changed', False):
+        return
+    # после коммита: воркер читает строку и файл уже сохранёнными
+    transaction.on_commit(lambda: schedule(instance.pk))
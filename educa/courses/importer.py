@@ -0,0 +1,285 @@
+import csv
+import json
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from .catalog import bump_catalog_generation
+from .counters import rebuild_counters
+from .enrollment import forget_enrollments
+from .export import FORMATS, ITEM_FIELDS, KINDS
+from .models import ITEM_MODELS, Content, Course, Module, Subject
+from .search import rebuild_index
+
+BATCH_SIZE = 1000
+
+
+def read_rows(stream, format='ndjson'):
+    if format not in FORMATS:
+        raise ValueError(f'Unknown format {format!r}, expected one of: {", ".join(FORMATS)}.')
+    if format == 'csv':
+        # пустая ячейка CSV — отсутствующее значение
+        for row in csv.DictReader(stream):
+            yield {key: (value if value != '' else None) for key, value in row.items()}
+        return
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                raise ValueError(f'Line {number}: invalid JSON.')
+
+
+def chain_sources(sources):
+    '''
+    Склеивает несколько потоков строк в один в порядке зависимостей — по kind
+    первой строки. CSV-выгрузка — по файлу на kind, а ссылки между файлами
+    разрешаются только в пределах одного CatalogImporter.run.
+    '''
+    heads = []
+    for rows in sources:
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is not None:
+            heads.append((first, rows))
+    # неизвестный kind — в конец: import_batch сообщит о нём сам
+    heads.sort(key=lambda head: KINDS.index(head[0]['kind']) if head[0].get('kind') in KINDS else len(KINDS))
+    for first, rows in heads:
+        yield first
+        yield from rows
+
+
+def _int(value):
+    return None if value is None else int(value)
+
+
+class CatalogImporter:
+    '''
+    Загрузка выгрузки export_catalog (NDJSON/CSV) пачками bulk_create.
+
+    Строки читаются потоком и сохраняются порциями по batch_size, каждая
+    в своей транзакции; строки должны идти в порядке зависимостей, как их
+    пишет export_catalog. Ссылки (subject, course, module) — id исходной
+    базы, они переводятся в новые id по мере загрузки, поэтому файлы CSV
+    (по одному на kind) грузятся одним run через chain_sources. Предметы с уже
+    существующим slug переиспользуются; курс с существующим slug не
+    создаётся вместе с модулями и материалами, но записи на него
+    загружаются. Недостающие пользователи создаются без пароля.
+
+    bulk_create не шлёт сигналов, поэтому счётчики, OrderSequence, поисковый
+    индекс и кеши приводятся в порядок один раз в конце.
+    '''
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.subjects = {}
+        self.courses = {}
+        self.modules = {}
+        self.skipped_courses = set()
+        self.skipped_modules = set()
+        self.users = {}
+        self.next_order = {}
+        self.new_courses = set()
+        self.touched_courses = set()
+        self.touched_subjects = set()
+        self.enrolled_users = set()
+        self.module_courses = set()
+        self.stats = Counter()
+        self.item_models = {model._meta.model_name: model for model in ITEM_MODELS}
+        self.content_types = {
+            model._meta.model_name: content_type.pk
+            for model, content_type in ContentType.objects.get_for_models(*ITEM_MODELS).items()
+        }
+
+    def run(self, rows):
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                self.import_batch(batch)
+        self.finish()
+        return self.stats
+
+    def import_batch(self, rows):
+        by_kind = defaultdict(list)
+        for row in rows:
+            kind = row.get('kind')
+            if kind not in KINDS:
+                raise ValueError(f'Unknown kind {kind!r}.')
+            by_kind[kind].append(row)
+        self.resolve_users(
+            row['owner'] for kind in ('course', 'content') for row in by_kind[kind] if row.get('owner')
+        )
+        self.resolve_users(row['user'] for row in by_kind['enrollment'])
+        for kind in KINDS:
+            if by_kind[kind]:
+                getattr(self, f'import_{kind}s')(by_kind[kind])
+
+    def resolve_users(self, usernames):
+        missing = {username for username in usernames if username not in self.users}
+        if not missing:
+            return
+        self.users.update(User.objects.filter(username__in=missing).values_list('username', 'id'))
+        password = make_password(None)
+        new = [User(username=username, password=password) for username in missing if username not in self.users]
+        User.objects.bulk_create(new)
+        self.users.update((user.username, user.pk) for user in new)
+        self.stats['user'] += len(new)
+
+    def lookup(self, mapping, kind, source_id):
+        try:
+            return mapping[int(source_id)]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'Unknown {kind} {source_id!r}.')
+
+    def allocate_order(self, scope, value):
+        # номера раздаются в памяти: группы новые, других вставок в них нет
+        value = _int(value)
+        current = self.next_order.get(scope, 0)
+        if value is None:
+            value = current
+        self.next_order[scope] = max(current, value + 1)
+        return value
+
+    def import_subjects(self, rows):
+        slugs = {row['slug'] for row in rows}
+        existing = dict(Subject.objects.filter(slug__in=slugs).values_list('slug', 'id'))
+        new = {}
+        for row in rows:
+            if row['slug'] not in existing and row['slug'] not in new:
+                new[row['slug']] = Subject(title=row['title'], slug=row['slug'])
+        Subject.objects.bulk_create(new.values())
+        existing.update((slug, subject.pk) for slug, subject in new.items())
+        for row in rows:
+            self.subjects[int(row['id'])] = existing[row['slug']]
+        self.stats['subject'] += len(new)
+
+    def import_courses(self, rows):
+        slugs = {row['slug'] for row in rows}
+        existing = dict(Course.objects.filter(slug__in=slugs).values_list('slug', 'id'))
+        new = {}
+        for row in rows:
+            if row['slug'] in existing or row['slug'] in new:
+                continue
+            new[row['slug']] = Course(
+                subject_id=self.lookup(self.subjects, 'subject', row['subject']),
+                owner_id=self.users[row['owner']],
+                title=row['title'],
+                slug=row['slug'],
+                overview=row.get('overview') or '',
+            )
+        Course.objects.bulk_create(new.values())
+        # auto_now_add перезаписывает created при вставке: дата из выгрузки — отдельным UPDATE
+        created_field = Course._meta.get_field('created')
+        dated = {}
+        for row in rows:
+            if row['slug'] in new and row['slug'] not in dated and row.get('created'):
+                course = dated[row['slug']] = new[row['slug']]
+                course.created = created_field.to_python(row['created'])
+        Course.objects.bulk_update(dated.values(), ['created'])
+        for row in rows:
+            if row['slug'] in new:
+                course = new[row['slug']]
+                self.courses[int(row['id'])] = course.pk
+                self.new_courses.add(course.pk)
+                self.touched_courses.add(course.pk)
+                self.touched_subjects.add(course.subject_id)
+            else:
+                self.courses[int(row['id'])] = existing[row['slug']]
+                self.skipped_courses.add(existing[row['slug']])
+                self.stats['skipped'] += 1
+        self.stats['course'] += len(new)
+
+    def import_modules(self, rows):
+        new = []
+        sources = []
+        for row in rows:
+            course_id = self.lookup(self.courses, 'course', row['course'])
+            if course_id in self.skipped_courses:
+                self.skipped_modules.add(int(row['id']))
+                continue
+            new.append(Module(
+                course_id=course_id,
+                title=row['title'],
+                description=row.get('description') or '',
+                order=self.allocate_order(('module', course_id), row.get('order')),
+            ))
+            sources.append(int(row['id']))
+        Module.objects.bulk_create(new)
+        for source_id, module in zip(sources, new):
+            self.modules[source_id] = module.pk
+            self.module_courses.add(module.course_id)
+        self.stats['module'] += len(new)
+
+    def import_contents(self, rows):
+        items = defaultdict(list)
+        pending = []
+        for row in rows:
+            if _int(row['module']) in self.skipped_modules:
+                continue
+            module_id = self.lookup(self.modules, 'module', row['module'])
+            model = self.item_models.get(row.get('item_type'))
+            if model is None:
+                raise ValueError(f'Unknown item type {row.get("item_type")!r}.')
+            item = model(owner_id=self.users[row['owner']], title=row['title'])
+            for field in ITEM_FIELDS[model._meta.model_name]:
+                setattr(item, field.attname, field.to_python(row.get(field.name)))
+            items[model].append(item)
+            pending.append((module_id, item, row.get('order')))
+        for model, objects in items.items():
+            model.objects.bulk_create(objects)
+            self.stats[model._meta.model_name] += len(objects)
+        Content.objects.bulk_create([
+            Content(
+                module_id=module_id,
+                content_type_id=self.content_types[item._meta.model_name],
+                object_id=item.pk,
+                order=self.allocate_order(('content', module_id), order),
+            )
+            for module_id, item, order in pending
+        ])
+        self.stats['content'] += len(pending)
+
+    def import_enrollments(self, rows):
+        through = Course.students.through
+        links = {
+            (self.lookup(self.courses, 'course', row['course']), self.users[row['user']])
+            for row in rows
+        }
+        through.objects.bulk_create(
+            [through(course_id=course_id, user_id=user_id) for course_id, user_id in links],
+            ignore_conflicts=True,
+        )
+        self.touched_courses.update(course_id for course_id, _ in links)
+        self.enrolled_users.update(user_id for _, user_id in links)
+        self.stats['enrollment'] += len(links)
+
+    def chunks(self, values):
+        values = list(values)
+        for start in range(0, len(values), self.batch_size):
+            yield values[start:start + self.batch_size]
+
+    def finish(self):
+        module_field = Module._meta.get_field('order')
+        content_field = Content._meta.get_field('order')
+        content_modules = {module_id for scope, module_id in self.next_order if scope == 'content'}
+        for course_ids in self.chunks(self.module_courses):
+            module_field.reset([Module(course_id=course_id) for course_id in course_ids])
+        for module_ids in self.chunks(content_modules):
+            content_field.reset([Content(module_id=module_id) for module_id in module_ids])
+        for course_ids in self.chunks(self.touched_courses):
+            rebuild_counters(course_ids=course_ids, subject_ids=[])
+        for subject_ids in self.chunks(self.touched_subjects):
+            rebuild_counters(course_ids=[], subject_ids=subject_ids)
+        for course_ids in self.chunks(self.new_courses):
+            rebuild_index(course_ids)
+        if self.enrolled_users:
+            for user_ids in self.chunks(self.enrolled_users):
+                forget_enrollments(user_ids)
+        bump_catalog_generation()
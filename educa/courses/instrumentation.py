@@ -0,0 +1,289 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.backends.django import Template
+
+# Метрики запроса без debug_toolbar: число и время SQL (через
+# execute_wrapper), повторяющиеся запросы, попадания в кеш и время
+# отрисовки шаблонов. Копятся гистограммами по представлениям в памяти
+# процесса (/api/metrics/); заголовок Server-Timing — только с SERVER_TIMING,
+# по умолчанию выключен: клиентам незачем видеть устройство запросов.
+
+_current = ContextVar('request_metrics', default=None)
+
+# верхние границы корзин, мс и штуки; последняя корзина — всё остальное
+DURATION_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+# сколько разных повторяющихся запросов помнить на представление
+TOP_DUPLICATES = 20
+
+IN_LIST_RE = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+NUMBER_RE = re.compile(r'\b\d+\b')
+
+
+def fingerprint(sql):
+    # IN (%s, %s, ...) разной длины и числа в тексте SQL — один и тот же запрос
+    return NUMBER_RE.sub('?', IN_LIST_RE.sub('(...)', sql))
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.fingerprints = Counter()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+    @property
+    def duplicate_queries(self):
+        return sum(count - 1 for count in self.fingerprints.values() if count > 1)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def server_timing(self):
+        return ', '.join([
+            f'total;dur={self.duration * 1000:.1f}',
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries, {self.duplicate_queries} duplicate"',
+            f'cache;desc="{self.cache_hits} hit, {self.cache_misses} miss"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+        ])
+
+
+def current_metrics():
+    return _current.get()
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - start
+        metrics.queries += 1
+        metrics.fingerprints[fingerprint(sql)] += 1
+
+
+def install_query_wrapper(connection):
+    # обёртка стоит на соединении постоянно и вне запроса ничего не считает:
+    # так её видят и потоки sync_to_async, где выполняются запросы async ORM.
+    # В начало списка — чтобы pop() чужих execute_wrapper() снимал их, а не её
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _query_wrapper)
+
+
+def connection_created(sender, connection, **kwargs):
+    install_query_wrapper(connection)
+
+
+_MISSING = object()
+
+
+def _instrument_cache(backend):
+    # методы подменяются на экземпляре: экземпляры бэкендов у каждого потока
+    # свои, а вне запроса обёртки ничего не считают
+    if getattr(backend, '_instrumented', False):
+        return
+    get, get_many = backend.get, backend.get_many
+
+    def instrumented_get(key, default=None, version=None):
+        value = get(key, _MISSING, version=version)
+        metrics = _current.get()
+        if metrics is not None:
+            if value is _MISSING:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return default if value is _MISSING else value
+
+    def instrumented_get_many(keys, version=None):
+        keys = list(keys)
+        values = get_many(keys, version=version)
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.cache_hits += len(values)
+            metrics.cache_misses += len(keys) - len(values)
+        return values
+
+    backend.get = instrumented_get
+    backend.get_many = instrumented_get_many
+    backend._instrumented = True
+
+
+_template_render = Template.render
+
+
+def _instrumented_render(self, context=None, request=None):
+    metrics = _current.get()
+    if metrics is None:
+        return _template_render(self, context, request)
+    # render_to_string внутри отрисовки (кеш материалов) не считается дважды
+    metrics.template_depth += 1
+    start = time.perf_counter()
+    try:
+        return _template_render(self, context, request)
+    finally:
+        metrics.template_depth -= 1
+        if not metrics.template_depth:
+            metrics.template_time += time.perf_counter() - start
+
+
+def install_template_hook():
+    # вызывается один раз из CoursesConfig.ready()
+    Template.render = _instrumented_render
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def as_dict(self):
+        labels = [str(bound) for bound in self.bounds] + ['+Inf']
+        return {
+            'buckets': dict(zip(labels, self.counts)),
+            'count': self.total,
+            'sum': round(self.sum, 3),
+        }
+
+
+class ViewStats:
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.db_time = Histogram(DURATION_BUCKETS)
+        self.template_time = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.duplicates = Counter()
+
+    def add(self, metrics):
+        self.duration.add(metrics.duration * 1000)
+        self.db_time.add(metrics.db_time * 1000)
+        self.template_time.add(metrics.template_time * 1000)
+        self.queries.add(metrics.queries)
+        self.cache_hits += metrics.cache_hits
+        self.cache_misses += metrics.cache_misses
+        for sql, count in metrics.duplicates.items():
+            if sql in self.duplicates or len(self.duplicates) < TOP_DUPLICATES:
+                self.duplicates[sql] += count - 1
+
+    def as_dict(self):
+        return {
+            'duration_ms': self.duration.as_dict(),
+            'db_ms': self.db_time.as_dict(),
+            'template_ms': self.template_time.as_dict(),
+            'queries': self.queries.as_dict(),
+            'cache': {'hits': self.cache_hits, 'misses': self.cache_misses},
+            'duplicate_queries': dict(self.duplicates.most_common()),
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def record(self, view_name, metrics):
+        with self.lock:
+            stats = self.views.get(view_name)
+            if stats is None:
+                stats = self.views[view_name] = ViewStats()
+            stats.add(metrics)
+
+    def snapshot(self):
+        with self.lock:
+            return {name: stats.as_dict() for name, stats in sorted(self.views.items())}
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+
+registry = MetricsRegistry()
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name or match._func_path
+
+
+class InstrumentationMiddleware:
+    '''
+    Собирает RequestMetrics на время запроса (request.metrics), пишет
+    Server-Timing (если SERVER_TIMING) и добавляет запрос в registry.
+    У потоковых ответов учитывается только время до первого байта.
+    Работает и в async-цепочке: метрики лежат в contextvar, который
+    sync_to_async переносит в свой поток.
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics, token = self.start(request)
+        # соединения, открытые до подключения сигнала connection_created
+        for alias in connections:
+            install_query_wrapper(connections[alias])
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def start(self, request):
+        metrics = request.metrics = RequestMetrics()
+        token = _current.set(metrics)
+        for alias in settings.CACHES:
+            _instrument_cache(caches[alias])
+        return metrics, token
+
+    def finish(self, request, response, metrics):
+        metrics.finish()
+        if getattr(settings, 'SERVER_TIMING', False):
+            response['Server-Timing'] = metrics.server_timing()
+        registry.record(view_name(request), metrics)
+        return response
@@ -0,0 +1,28 @@
+from django.contrib.contenttypes.prefetch import GenericPrefetch
+from django.db.models import Prefetch, prefetch_related_objects
+
+from .models import ITEM_MODELS, Content
+from .render_cache import prime_rendered
+
+
+def item_prefetch(lookup='item'):
+    # Content.item грузится одним запросом на тип материала, а не на каждую строку
+    return GenericPrefetch(
+        lookup,
+        [model.objects.select_related('owner') for model in ITEM_MODELS],
+    )
+
+
+def contents_prefetch(lookup='contents'):
+    return Prefetch(
+        lookup,
+        queryset=Content.objects.select_related('content_type').prefetch_related(item_prefetch()),
+    )
+
+
+def load_contents(modules):
+    modules = [module for module in modules if module is not None]
+    if modules:
+        prefetch_related_objects(modules, contents_prefetch())
+        prime_rendered(content.item for module in modules for content in module.contents.all())
+    return modules
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.export import CHUNK_SIZE, FORMATS, KINDS, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Выгружает предметы, курсы, модули, материалы и записи в NDJSON или CSV потоком'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', dest='kinds', choices=KINDS, help='что выгружать (можно несколько раз, по умолчанию всё)')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--output', '-o', help='файл (по умолчанию stdout)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            lines = export_lines(options['kinds'] or KINDS, options['format'], options['chunk_size'])
+        except ValueError as exc:
+            raise CommandError(exc)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as out:
+                out.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
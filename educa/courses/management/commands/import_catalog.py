@@ -0,0 +1,31 @@
+import sys
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.export import FORMATS
+from courses.importer import BATCH_SIZE, CatalogImporter, chain_sources, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Загружает выгрузку export_catalog (NDJSON или CSV) пачками bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', metavar='path', help='файлы выгрузки (CSV — по файлу на kind) или - для stdin')
+        parser.add_argument('--format', choices=FORMATS, help='по умолчанию — по расширению каждого файла')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        importer = CatalogImporter(batch_size=options['batch_size'])
+        try:
+            with ExitStack() as stack:
+                sources = []
+                for path in options['paths']:
+                    format = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+                    stream = sys.stdin if path == '-' else stack.enter_context(open(path, encoding='utf-8', newline=''))
+                    sources.append(read_rows(stream, format))
+                stats = importer.run(chain_sources(sources))
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f'Import failed: {exc}')
+        summary = ', '.join(f'{count} {kind}' for kind, count in sorted(stats.items()))
+        self.stdout.write(self.style.SUCCESS(f'Imported: {summary or "nothing"}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from courses.catalog import bump_catalog_generation
+from courses.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает total_students, total_modules и total_courses одним UPDATE на таблицу'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='courses', help='id курса (можно несколько раз)')
+        parser.add_argument('--subject', type=int, action='append', dest='subjects', help='id предмета (можно несколько раз)')
+
+    def handle(self, *args, **options):
+        courses, subjects = rebuild_counters(options['courses'], options['subjects'])
+        bump_catalog_generation()
+        self.stdout.write(self.style.SUCCESS(f'Counters rebuilt: {courses} courses, {subjects} subjects'))
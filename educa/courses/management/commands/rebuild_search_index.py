@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from courses.models import Course
+from courses.search import rebuild_index
+
+CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает документы полнотекстового поиска по курсам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='courses', help='id курса (можно несколько раз)')
+
+    def handle(self, *args, **options):
+        course_ids = options['courses'] or list(Course.objects.order_by('pk').values_list('pk', flat=True))
+        total = 0
+        for start in range(0, len(course_ids), CHUNK_SIZE):
+            total += rebuild_index(course_ids[start:start + CHUNK_SIZE])
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt: {total} documents'))
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:39
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Module = apps.get_model('courses', 'Module')
+    Subject = apps.get_model('courses', 'Subject')
+
+    def count(model, field):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(total=Count('*')).values('total')
+            ),
+            0,
+        )
+
+    Course.objects.update(
+        total_students=count(Course.students.through, 'course'),
+        total_modules=count(Module, 'course'),
+    )
+    Subject.objects.update(total_courses=count(Course, 'subject'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_course_students'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='total_modules',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='total_students',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subject',
+            name='total_courses',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
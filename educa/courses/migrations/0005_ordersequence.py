@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=255, unique=True)),
+                ('value', models.IntegerField()),
+            ],
+        ),
+    ]
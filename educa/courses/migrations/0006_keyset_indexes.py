@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_ordersequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-created', 'id'], name='course_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subject',
+            index=models.Index(fields=['title', 'id'], name='subject_title_id_idx'),
+        ),
+    ]
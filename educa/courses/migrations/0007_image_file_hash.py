@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='file_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
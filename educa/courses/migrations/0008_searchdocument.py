@@ -0,0 +1,119 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+SQLITE_INDEX = [
+    '''CREATE VIRTUAL TABLE courses_searchdocument_fts USING fts5(
+        title, body, content='courses_searchdocument', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )''',
+    '''CREATE TRIGGER courses_searchdocument_ai AFTER INSERT ON courses_searchdocument BEGIN
+        INSERT INTO courses_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END''',
+    '''CREATE TRIGGER courses_searchdocument_ad AFTER DELETE ON courses_searchdocument BEGIN
+        INSERT INTO courses_searchdocument_fts(courses_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END''',
+    '''CREATE TRIGGER courses_searchdocument_au AFTER UPDATE ON courses_searchdocument BEGIN
+        INSERT INTO courses_searchdocument_fts(courses_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO courses_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END''',
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS courses_searchdocument_au',
+    'DROP TRIGGER IF EXISTS courses_searchdocument_ad',
+    'DROP TRIGGER IF EXISTS courses_searchdocument_ai',
+    'DROP TABLE IF EXISTS courses_searchdocument_fts',
+]
+# 'simple' без стемминга: в каталоге смешаны языки; заголовок весит больше текста
+POSTGRES_INDEX = [
+    '''ALTER TABLE courses_searchdocument ADD COLUMN vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple'::regconfig, coalesce(title, '')), 'A')
+        || setweight(to_tsvector('simple'::regconfig, coalesce(body, '')), 'B')
+    ) STORED''',
+    'CREATE INDEX courses_searchdocument_vector_gin ON courses_searchdocument USING gin (vector)',
+]
+POSTGRES_DROP = [
+    'DROP INDEX IF EXISTS courses_searchdocument_vector_gin',
+    'ALTER TABLE courses_searchdocument DROP COLUMN IF EXISTS vector',
+]
+
+
+def _execute(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _execute(schema_editor, SQLITE_INDEX)
+    elif vendor == 'postgresql':
+        _execute(schema_editor, POSTGRES_INDEX)
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _execute(schema_editor, SQLITE_DROP)
+    elif vendor == 'postgresql':
+        _execute(schema_editor, POSTGRES_DROP)
+
+
+def fill_documents(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Module = apps.get_model('courses', 'Module')
+    Content = apps.get_model('courses', 'Content')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Text = apps.get_model('courses', 'Text')
+    SearchDocument = apps.get_model('courses', 'SearchDocument')
+
+    documents = [
+        SearchDocument(kind='course', object_id=pk, course_id=pk, title=title, body=overview)
+        for pk, title, overview in Course.objects.values_list('pk', 'title', 'overview').iterator()
+    ]
+    documents += [
+        SearchDocument(kind='module', object_id=pk, course_id=course_id, module_id=pk, title=title, body=description)
+        for pk, course_id, title, description in Module.objects.values_list('pk', 'course_id', 'title', 'description').iterator()
+    ]
+    text_type = ContentType.objects.filter(app_label='courses', model='text').first()
+    if text_type is not None:
+        contents = Content.objects.filter(content_type=text_type)
+        places = {}
+        for object_id, module_id, course_id in contents.order_by('-pk').values_list('object_id', 'module_id', 'module__course_id'):
+            places[object_id] = (module_id, course_id)
+        texts = Text.objects.filter(pk__in=contents.values('object_id'))
+        for pk, title, content in texts.values_list('pk', 'title', 'content').iterator():
+            module_id, course_id = places[pk]
+            documents.append(SearchDocument(
+                kind='text', object_id=pk, course_id=course_id, module_id=module_id, title=title, body=content,
+            ))
+    SearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_image_file_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('course', 'Course'), ('module', 'Module'), ('text', 'Text')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('title', models.CharField(max_length=200)),
+                ('body', models.TextField(blank=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.course')),
+                ('module', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.module')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='searchdocument_kind_object_uniq')],
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+        migrations.RunPython(fill_documents, migrations.RunPython.noop),
+    ]
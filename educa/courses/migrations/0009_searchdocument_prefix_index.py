@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# последнее слово запроса ищется префиксом: без префиксного индекса FTS5
+# разворачивает префикс в списки всех подходящих слов на каждый запрос
+FTS_TABLE = '''CREATE VIRTUAL TABLE courses_searchdocument_fts USING fts5(
+    title, body, content='courses_searchdocument', content_rowid='id', tokenize='unicode61 remove_diacritics 2'{options}
+)'''
+PREFIX_OPTIONS = ", prefix='2 3 4'"
+
+
+def _recreate(schema_editor, options):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    # триггеры ссылаются на таблицу по имени и переживают пересоздание
+    schema_editor.execute('DROP TABLE IF EXISTS courses_searchdocument_fts')
+    schema_editor.execute(FTS_TABLE.format(options=options))
+    schema_editor.execute("INSERT INTO courses_searchdocument_fts(courses_searchdocument_fts) VALUES ('rebuild')")
+
+
+def add_prefix_index(apps, schema_editor):
+    _recreate(schema_editor, PREFIX_OPTIONS)
+
+
+def drop_prefix_index(apps, schema_editor):
+    _recreate(schema_editor, '')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_searchdocument'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_prefix_index, drop_prefix_index),
+    ]
@@ -4,22 +4,44 @@ from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.template.loader import render_to_string
+from django.urls import reverse
 
 from .fields import OrderField
 
 
-class Subject(models.Model):
+class CounterFieldsMixin:
+    # денормализованные счётчики меняются только через F() в courses.counters,
+    # поэтому обычное сохранение объекта их не перезаписывает
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if self.pk and not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class Subject(CounterFieldsMixin, models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True)
+    total_courses = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('total_courses',)
 
     class Meta:
         ordering = ['title']
+        indexes = [
+            # ключ KeysetPagination для /api/subjects/
+            models.Index(fields=['title', 'id'], name='subject_title_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
-class Course(models.Model):
+class Course(CounterFieldsMixin, models.Model):
     owner = models.ForeignKey(
         User,
         related_name='courses_created',
@@ -39,9 +61,17 @@ class Course(models.Model):
         blank=True
     )
     created = models.DateTimeField(auto_now_add=True)
+    total_students = models.PositiveIntegerField(default=0, editable=False)
+    total_modules = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('total_students', 'total_modules')
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            # ключ KeysetPagination для /api/courses/
+            models.Index(fields=['-created', 'id'], name='course_created_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -80,26 +110,47 @@ class ItemBase(models.Model):
             {'item': self}
         )
 
+    def cached_render(self):
+        from .render_cache import get_rendered
+
+        return get_rendered(self)
+
     def __str__(self):
         return self.title
 
 
+class FileItemMixin:
+    # файл отдаётся через courses:item_file с проверкой записи на курс
+    def file_url(self):
+        return reverse('courses:item_file', args=[self._meta.model_name, self.pk])
+
+
 class Text(ItemBase):
     content = models.TextField()
 
 
-class File(ItemBase):
+class File(FileItemMixin, ItemBase):
     file = models.FileField(upload_to='files')
 
 
-class Image(ItemBase):
+class Image(FileItemMixin, ItemBase):
     file = models.ImageField(upload_to='images')
+    # sha256 файла, по которому построены копии для srcset (courses.images)
+    file_hash = models.CharField(max_length=64, blank=True, editable=False)
+
+    def srcsets(self):
+        from .images import srcsets
+
+        return srcsets(self)
 
 
 class Video(ItemBase):
     url = models.URLField()
 
 
+ITEM_MODELS = (Text, File, Image, Video)
+
+
 class Content(models.Model):
     module = models.ForeignKey(Module, related_name='contents', on_delete=models.CASCADE)
     content_type = models.ForeignKey(
@@ -113,3 +164,35 @@ class Content(models.Model):
 
     class Meta:
         ordering = ['order']
+
+
+class OrderSequence(models.Model):
+    # последний выданный OrderField номер в группе, например 'courses.content:order:42'
+    scope = models.CharField(max_length=255, unique=True)
+    value = models.IntegerField()
+
+    def __str__(self):
+        return f'{self.scope}={self.value}'
+
+
+class SearchDocument(models.Model):
+    # строка полнотекстового индекса (courses.search): курс, модуль или текст
+    KIND_COURSE = 'course'
+    KIND_MODULE = 'module'
+    KIND_TEXT = 'text'
+    KIND_CHOICES = [(KIND_COURSE, 'Course'), (KIND_MODULE, 'Module'), (KIND_TEXT, 'Text')]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    course = models.ForeignKey(Course, related_name='+', on_delete=models.CASCADE)
+    module = models.ForeignKey(Module, related_name='+', null=True, blank=True, on_delete=models.CASCADE)
+    title = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='searchdocument_kind_object_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind}:{self.object_id}'
@@ -0,0 +1,42 @@
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.dispatch import Signal
+
+# bulk_update не шлёт post_save; кешам, зависящим от порядка, нужен свой сигнал
+orders_changed = Signal()
+
+
+def parse_order_map(data):
+    if not isinstance(data, dict) or not data:
+        raise ValueError('Expected a non-empty {id: order} object.')
+    try:
+        mapping = {int(pk): int(order) for pk, order in data.items()}
+    except (TypeError, ValueError):
+        raise ValueError('Ids and orders must be integers.')
+    if any(order < 0 for order in mapping.values()):
+        raise ValueError('Orders must be non-negative.')
+    return mapping
+
+
+def apply_order(queryset, data):
+    '''
+    Применяет {id: order} к объектам queryset одним bulk_update.
+
+    queryset должен быть уже ограничен объектами, которые пользователь вправе
+    менять: загрузка строк заодно проверяет права, и если хотя бы одного id в
+    нём нет, ничего не сохраняется.
+    '''
+    mapping = parse_order_map(data)
+    model = queryset.model
+    field = model._meta.get_field('order')
+    related = [model._meta.get_field(name).attname for name in field.for_fields or ()]
+    with transaction.atomic():
+        objects = list(queryset.filter(pk__in=mapping).only('pk', field.attname, *related))
+        if len(objects) != len(mapping):
+            raise PermissionDenied
+        for obj in objects:
+            setattr(obj, field.attname, mapping[obj.pk])
+        model._default_manager.bulk_update(objects, [field.attname])
+        field.advance(objects)
+    orders_changed.send(sender=model, instances=objects)
+    return objects
@@ -0,0 +1,54 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def render_cache_key(item):
+    return f'item_html:{item._meta.label_lower}:{item.pk}'
+
+
+def _timeout():
+    return getattr(settings, 'ITEM_RENDER_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def _version(item):
+    # запись годится только для той версии материала, из которой она отрисована
+    return item.updated.isoformat() if item.updated else None
+
+
+def store_rendered(item):
+    try:
+        html = item.render()
+    except (AttributeError, TypeError, ValueError):
+        logger.exception('Failed to render content item %s', item)
+        drop_rendered(item)
+        return None
+    cache.set(render_cache_key(item), (_version(item), html), _timeout())
+    return html
+
+
+def prime_rendered(items):
+    # HTML пачки материалов одним get_many; get_rendered возьмёт его с объекта
+    items = [item for item in items if item is not None]
+    cached = cache.get_many([render_cache_key(item) for item in items])
+    for item in items:
+        entry = cached.get(render_cache_key(item))
+        if entry is not None and entry[0] == _version(item):
+            item._rendered_html = entry[1]
+
+
+def get_rendered(item):
+    html = item.__dict__.pop('_rendered_html', None)
+    if html is not None:
+        return html
+    cached = cache.get(render_cache_key(item))
+    if cached is not None and cached[0] == _version(item):
+        return cached[1]
+    return store_rendered(item)
+
+
+def drop_rendered(item):
+    cache.delete(render_cache_key(item))
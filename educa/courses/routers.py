@@ -0,0 +1,133 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .conditional import replica_etag
+
+# Чтения моделей каталога и студентов в GET/HEAD-запросах идут на реплику
+# (DATABASE_REPLICAS), всё остальное — на primary: записи, чтения в
+# запросах, которые пишут, и всё вне запросов (команды, воркеры, сигналы).
+# После записи клиент получает cookie, и REPLICA_STICKY_SECONDS его чтения
+# тоже идут на primary: реплика успевает догнать, а пользователь сразу видит
+# свою запись на курс или правку материала.
+# ETag ответов собирается из версий в кеше, а их запись сдвигает сразу, до
+# реплики. Поэтому ответ, тело которого читалось с реплики, получает
+# replica_etag — валидатор, который никогда не совпадёт. Клиент с
+# If-None-Match (он перепроверяет кеш) читает с primary: совпадение даёт 304
+# без базы, несовпадение — свежее тело под настоящим ETag.
+
+_state = ContextVar('replica_state', default=None)
+
+STICKY_COOKIE = 'use_primary'
+
+
+class ReadState:
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+        self.replica_read = False
+
+
+def replica_aliases():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+@contextmanager
+def primary_reads():
+    '''
+    Чтения внутри блока — с primary. Для заполнения кешей, ключи которых
+    несут версию: отставшая реплика положила бы под новую версию старые данные.
+    '''
+    state = _state.get()
+    if state is None or state.replica is None:
+        yield
+        return
+    replica, state.replica = state.replica, None
+    try:
+        yield
+    finally:
+        state.replica = replica
+
+
+class ReplicaRouter:
+    route_app_labels = {'courses', 'students'}
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None:
+            return None
+        # после записи в этом же запросе читаем своё
+        if state.replica is None or state.wrote or model._meta.app_label not in self.route_app_labels:
+            return DEFAULT_DB_ALIAS
+        state.replica_read = True
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики — копии primary, связи между ними допустимы
+        pool = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+
+class ReplicaMiddleware:
+    '''
+    Выбирает реплику на запрос и ставит cookie «читать с primary» после
+    запросов, которые писали в базу.
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        state, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(response, state)
+
+    def start(self, request):
+        aliases = replica_aliases()
+        replica = None
+        if (
+            aliases and request.method in ('GET', 'HEAD')
+            and STICKY_COOKIE not in request.COOKIES and 'If-None-Match' not in request.headers
+        ):
+            replica = random.choice(aliases)
+        state = ReadState(replica)
+        return state, _state.set(state)
+
+    def finish(self, response, state):
+        if state.replica_read and response.has_header('ETag'):
+            response['ETag'] = replica_etag(response['ETag'])
+        if state.wrote:
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 5), httponly=True, samesite='Lax',
+            )
+        return response
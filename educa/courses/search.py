@@ -0,0 +1,224 @@
+import re
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import Q
+
+from .models import Content, Course, Module, SearchDocument, Text
+
+# Полнотекстовый поиск по курсам, модулям и текстам. Документы лежат в
+# SearchDocument и обновляются сигналами; индекс над ними — FTS5 на SQLite
+# (внешняя таблица courses_searchdocument_fts с триггерами) и tsvector + GIN
+# на PostgreSQL, см. миграцию 0008. Остальные базы ищут через icontains.
+# Ранжируются не все совпадения, а SEARCH_CANDIDATES последних по id: у частых
+# слов совпадает почти весь корпус, и bm25 по каждому документу стоил бы
+# больше, чем сам поиск по индексу. Редкие запросы ранжируются целиком, а
+# урезанный ответ помечен truncated. Окно закрепляется наибольшим id
+# (ceiling) первой страницы, и страницы идут по позиции в нём: новые документы
+# не попадают в окно, а bm25, который зависит от статистики всего корпуса,
+# меняет у вставки числа, но не порядок внутри окна.
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# кандидатов берётся на один больше: лишний (самый старый) лишь отмечает,
+# что окно урезано, и в выдачу не попадает
+SQLITE_SEARCH = '''
+    SELECT id, rank, ceiling, total FROM (
+        SELECT id, rank, MAX(id) OVER () AS ceiling, COUNT(*) OVER () AS total,
+            ROW_NUMBER() OVER (ORDER BY id DESC) AS position
+        FROM (
+            SELECT rowid AS id, bm25(courses_searchdocument_fts, 10.0, 1.0) AS rank
+            FROM courses_searchdocument_fts
+            WHERE courses_searchdocument_fts MATCH %s AND (%s IS NULL OR rowid <= %s)
+            ORDER BY rowid DESC
+            LIMIT %s
+        )
+    )
+    WHERE position <= %s
+    ORDER BY rank, id
+    LIMIT %s OFFSET %s
+'''
+
+# ts_rank_cd растёт с релевантностью, а выдача идёт по возрастанию rank
+POSTGRES_SEARCH = '''
+    SELECT id, rank, ceiling, total FROM (
+        SELECT candidates.id, -ts_rank_cd(candidates.vector, q) AS rank,
+            MAX(candidates.id) OVER () AS ceiling, COUNT(*) OVER () AS total,
+            ROW_NUMBER() OVER (ORDER BY candidates.id DESC) AS position
+        FROM (
+            SELECT d.id, d.vector FROM courses_searchdocument d
+            WHERE d.vector @@ websearch_to_tsquery('simple', %s) AND (%s::bigint IS NULL OR d.id <= %s)
+            ORDER BY d.id DESC
+            LIMIT %s
+        ) candidates, websearch_to_tsquery('simple', %s) q
+    ) found
+    WHERE position <= %s
+    ORDER BY rank, id
+    LIMIT %s OFFSET %s
+'''
+
+
+class SearchResults(list):
+    '''Страница search(): [(SearchDocument, rank)] и сведения об окне кандидатов.'''
+
+    def __init__(self, rows=(), truncated=False, ceiling=None):
+        super().__init__(rows)
+        self.truncated = truncated
+        self.ceiling = ceiling
+
+
+def index_course(course):
+    SearchDocument.objects.update_or_create(
+        kind=SearchDocument.KIND_COURSE,
+        object_id=course.pk,
+        defaults={'course_id': course.pk, 'title': course.title, 'body': course.overview},
+    )
+
+
+def index_module(module):
+    SearchDocument.objects.update_or_create(
+        kind=SearchDocument.KIND_MODULE,
+        object_id=module.pk,
+        defaults={'course_id': module.course_id, 'module_id': module.pk, 'title': module.title, 'body': module.description},
+    )
+    # тексты модуля могли переехать вместе с ним в другой курс
+    SearchDocument.objects.filter(module_id=module.pk).exclude(course_id=module.course_id).update(course_id=module.course_id)
+
+
+def index_text(text):
+    # текст ищется в первом модуле, где он используется; непривязанный — не ищется
+    place = Content.objects.filter(
+        content_type=ContentType.objects.get_for_model(Text), object_id=text.pk
+    ).order_by('pk').values_list('module_id', 'module__course_id').first()
+    if place is None:
+        unindex_text(text.pk)
+        return
+    SearchDocument.objects.update_or_create(
+        kind=SearchDocument.KIND_TEXT,
+        object_id=text.pk,
+        defaults={'course_id': place[1], 'module_id': place[0], 'title': text.title, 'body': text.content},
+    )
+
+
+def unindex_text(text_id):
+    SearchDocument.objects.filter(kind=SearchDocument.KIND_TEXT, object_id=text_id).delete()
+
+
+def course_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_course(instance)
+
+
+def module_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_module(instance)
+
+
+def text_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_text(instance)
+
+
+def text_deleted(sender, instance, **kwargs):
+    unindex_text(instance.pk)
+
+
+def content_changed(sender, instance, raw=False, **kwargs):
+    if raw or instance.content_type_id != ContentType.objects.get_for_model(Text).pk:
+        return
+    text = Text.objects.filter(pk=instance.object_id).first()
+    if text is None:
+        unindex_text(instance.object_id)
+    else:
+        index_text(text)
+
+
+def rebuild_index(course_ids):
+    '''Переиндексирует курсы целиком (после bulk_create, мимо сигналов).'''
+    SearchDocument.objects.filter(course_id__in=course_ids).delete()
+    text_type = ContentType.objects.get_for_model(Text)
+    documents = [
+        SearchDocument(kind=SearchDocument.KIND_COURSE, object_id=pk, course_id=pk, title=title, body=overview)
+        for pk, title, overview in Course.objects.filter(pk__in=course_ids).values_list('pk', 'title', 'overview')
+    ]
+    documents += [
+        SearchDocument(
+            kind=SearchDocument.KIND_MODULE, object_id=pk, course_id=course_id, module_id=pk, title=title, body=description,
+        )
+        for pk, course_id, title, description in Module.objects.filter(course_id__in=course_ids).values_list(
+            'pk', 'course_id', 'title', 'description'
+        )
+    ]
+    contents = Content.objects.filter(content_type=text_type, module__course_id__in=course_ids)
+    places = {}
+    for object_id, module_id, course_id in contents.order_by('-pk').values_list('object_id', 'module_id', 'module__course_id'):
+        places[object_id] = (module_id, course_id)
+    # подзапросы, а не списки id: текстов в пачке курсов больше, чем параметров
+    # в одном запросе SQLite. Текст из другого (не переиндексируемого) курса
+    # уже проиндексирован там
+    texts = Text.objects.filter(pk__in=contents.values('object_id')).exclude(
+        pk__in=SearchDocument.objects.filter(kind=SearchDocument.KIND_TEXT).values('object_id')
+    )
+    for pk, title, content in texts.values_list('pk', 'title', 'content'):
+        module_id, course_id = places[pk]
+        documents.append(SearchDocument(
+            kind=SearchDocument.KIND_TEXT, object_id=pk, course_id=course_id, module_id=module_id, title=title, body=content,
+        ))
+    SearchDocument.objects.bulk_create(documents, batch_size=1000)
+    return len(documents)
+
+
+def query_words(query):
+    return WORD_RE.findall(query)
+
+
+def _fts5_query(words):
+    # каждое слово в кавычках (без синтаксиса FTS5), последнее — префиксом
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search(query, offset=0, limit=10, ceiling=None):
+    '''
+    Страница результатов по возрастанию (rank, id), меньший rank —
+    релевантнее. offset — позиция в окне кандидатов, ceiling — его граница
+    (SearchResults.ceiling первой страницы).
+    '''
+    words = query_words(query)
+    if not words:
+        return SearchResults()
+    candidates = getattr(settings, 'SEARCH_CANDIDATES', 1000)
+    if connection.vendor == 'sqlite':
+        rows = _raw(SQLITE_SEARCH, [_fts5_query(words), ceiling, ceiling, candidates + 1, candidates, limit, offset])
+    elif connection.vendor == 'postgresql':
+        query = ' '.join(words)
+        rows = _raw(POSTGRES_SEARCH, [query, ceiling, ceiling, candidates + 1, query, candidates, limit, offset])
+    else:
+        rows = _fallback(words, offset, limit, ceiling)
+    documents = SearchDocument.objects.in_bulk([row[0] for row in rows])
+    return SearchResults(
+        [(documents[pk], rank) for pk, rank, _, _ in rows if pk in documents],
+        truncated=bool(rows) and rows[0][3] > candidates,
+        ceiling=rows[0][2] if rows else ceiling,
+    )
+
+
+def _raw(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _fallback(words, offset, limit, ceiling):
+    # без ранжирования и без ограничения окна: по id, ceiling — как у индекса
+    condition = Q()
+    for word in words:
+        condition &= Q(title__icontains=word) | Q(body__icontains=word)
+    queryset = SearchDocument.objects.filter(condition).order_by('pk')
+    if ceiling is not None:
+        queryset = queryset.filter(pk__lte=ceiling)
+    elif offset == 0:
+        ceiling = queryset.order_by('-pk').values_list('pk', flat=True).first()
+    return [(pk, 0.0, ceiling, 0) for pk in queryset.values_list('pk', flat=True)[offset:offset + limit]]
@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+
+from . import counters, enrollment, images, instrumentation, search, snapshots
+from .api.authentication import credential_cache
+from .catalog import bump_catalog_generation
+from .models import ITEM_MODELS, Content, Course, Image, Module, Subject, Text
+from .ordering import orders_changed
+from .render_cache import drop_rendered, store_rendered
+
+
+def item_saved(sender, instance, **kwargs):
+    store_rendered(instance)
+
+
+def item_deleted(sender, instance, **kwargs):
+    drop_rendered(instance)
+
+
+for model in ITEM_MODELS:
+    post_save.connect(item_saved, sender=model, dispatch_uid=f'render_cache_save_{model._meta.model_name}')
+    post_delete.connect(item_deleted, sender=model, dispatch_uid=f'render_cache_delete_{model._meta.model_name}')
+
+
+# счётчики обновляются раньше, чем сбрасывается поколение каталога
+m2m_changed.connect(counters.enrollment_changed, sender=Course.students.through, dispatch_uid='counters_enrollment')
+pre_save.connect(counters.module_pre_save, sender=Module, dispatch_uid='counters_module_pre_save')
+post_save.connect(counters.module_saved, sender=Module, dispatch_uid='counters_module_save')
+post_delete.connect(counters.module_deleted, sender=Module, dispatch_uid='counters_module_delete')
+pre_save.connect(counters.course_pre_save, sender=Course, dispatch_uid='counters_course_pre_save')
+post_save.connect(counters.course_saved, sender=Course, dispatch_uid='counters_course_save')
+post_delete.connect(counters.course_deleted, sender=Course, dispatch_uid='counters_course_delete')
+pre_delete.connect(counters.user_deleted, sender=settings.AUTH_USER_MODEL, dispatch_uid='counters_user_delete')
+m2m_changed.connect(enrollment.enrollment_changed, sender=Course.students.through, dispatch_uid='enrolled_course_ids')
+
+
+def catalog_changed(sender, **kwargs):
+    bump_catalog_generation()
+
+
+for model in (Subject, Course, Module):
+    post_save.connect(catalog_changed, sender=model, dispatch_uid=f'catalog_save_{model._meta.model_name}')
+    post_delete.connect(catalog_changed, sender=model, dispatch_uid=f'catalog_delete_{model._meta.model_name}')
+# порядок модулей виден в /api/courses/
+orders_changed.connect(catalog_changed, sender=Module, dispatch_uid='catalog_module_order')
+
+
+def user_changed(sender, instance, **kwargs):
+    # смена пароля и так делает запись негодной; здесь лишь освобождаем память
+    credential_cache.discard_user(instance.pk)
+
+
+post_save.connect(user_changed, sender=settings.AUTH_USER_MODEL, dispatch_uid='credential_cache_user_save')
+post_delete.connect(user_changed, sender=settings.AUTH_USER_MODEL, dispatch_uid='credential_cache_user_delete')
+
+
+def item_snapshot_changed(sender, instance, created=False, **kwargs):
+    # новый материал ещё не привязан к модулю: это сделает post_save Content
+    if not created:
+        snapshots.invalidate_item(instance)
+
+
+def content_snapshot_changed(sender, instance, origin=None, **kwargs):
+    # каскад от модуля, курса или предмета: версии сдвинут обработчики модулей
+    # и курсов, а модуль не читается заново на каждую строку материала
+    if isinstance(origin, (Subject, Course, Module)) or getattr(origin, 'model', None) in (Subject, Course, Module):
+        return
+    if Content.module.is_cached(instance):
+        course_ids = [instance.module.course_id]
+    else:
+        course_ids = Module.objects.filter(pk=instance.module_id).values_list('course_id', flat=True)
+    snapshots.invalidate(course_ids=course_ids, module_ids=[instance.module_id])
+
+
+def module_snapshot_changed(sender, instance, **kwargs):
+    snapshots.invalidate(course_ids=[instance.course_id], module_ids=[instance.pk])
+
+
+def course_snapshot_changed(sender, instance, **kwargs):
+    snapshots.invalidate(course_ids=[instance.pk])
+
+
+def order_snapshot_changed(sender, instances, **kwargs):
+    if sender is Module:
+        snapshots.invalidate(course_ids=[module.course_id for module in instances])
+    elif sender is Content:
+        module_ids = {content.module_id for content in instances}
+        course_ids = Module.objects.filter(pk__in=module_ids).values_list('course_id', flat=True)
+        snapshots.invalidate(course_ids=course_ids, module_ids=module_ids)
+
+
+for model in ITEM_MODELS:
+    post_save.connect(item_snapshot_changed, sender=model, dispatch_uid=f'snapshot_save_{model._meta.model_name}')
+    pre_delete.connect(item_snapshot_changed, sender=model, dispatch_uid=f'snapshot_delete_{model._meta.model_name}')
+for model, handler in ((Content, content_snapshot_changed), (Module, module_snapshot_changed), (Course, course_snapshot_changed)):
+    post_save.connect(handler, sender=model, dispatch_uid=f'snapshot_save_{model._meta.model_name}')
+    post_delete.connect(handler, sender=model, dispatch_uid=f'snapshot_delete_{model._meta.model_name}')
+orders_changed.connect(order_snapshot_changed, dispatch_uid='snapshot_orders')
+
+pre_save.connect(images.image_pre_save, sender=Image, dispatch_uid='image_derivatives_pre_save')
+post_save.connect(images.image_saved, sender=Image, dispatch_uid='image_derivatives')
+
+# документы поиска; удаление курсов и модулей уносит их каскадом
+post_save.connect(search.course_saved, sender=Course, dispatch_uid='search_course_save')
+post_save.connect(search.module_saved, sender=Module, dispatch_uid='search_module_save')
+post_save.connect(search.text_saved, sender=Text, dispatch_uid='search_text_save')
+post_delete.connect(search.text_deleted, sender=Text, dispatch_uid='search_text_delete')
+post_save.connect(search.content_changed, sender=Content, dispatch_uid='search_content_save')
+post_delete.connect(search.content_changed, sender=Content, dispatch_uid='search_content_delete')
+
+# счётчик SQL для InstrumentationMiddleware на каждом новом соединении
+connection_created.connect(instrumentation.connection_created, dispatch_uid='instrumentation_queries')
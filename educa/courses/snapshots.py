@@ -0,0 +1,129 @@
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.template.loader import render_to_string
+from rest_framework.renderers import JSONRenderer
+
+from .loading import load_contents
+from .models import Content, Course, Module
+from .routers import primary_reads
+from .versions import aget_version, bump_versions, get_version, get_versions
+
+# Снимок /api/courses/{id}/contents/ собирается из снимков модулей. Версии курса
+# и модулей — счётчики в кеше: изменение материала сдвигает версию только своих
+# модулей и курса, поэтому при следующем чтении пересобираются лишь они.
+
+
+def _timeout():
+    return getattr(settings, 'COURSE_SNAPSHOT_TIMEOUT', 60 * 60 * 24)
+
+
+def course_version_key(course_id):
+    return f'course_version:{course_id}'
+
+
+def module_version_key(module_id):
+    return f'module_version:{module_id}'
+
+
+def course_version(course_id):
+    return get_version(course_version_key(course_id))
+
+
+def module_versions(module_ids):
+    keys = {module_id: module_version_key(module_id) for module_id in module_ids}
+    versions = get_versions(list(keys.values()))
+    return {module_id: versions[key] for module_id, key in keys.items()}
+
+
+def invalidate(course_ids=(), module_ids=()):
+    bump_versions([module_version_key(pk) for pk in set(module_ids)] + [course_version_key(pk) for pk in set(course_ids)])
+
+
+def invalidate_item(item):
+    content_type = ContentType.objects.get_for_model(item)
+    rows = Content.objects.filter(content_type=content_type, object_id=item.pk).values_list('module_id', 'module__course_id')
+    invalidate(course_ids=[row[1] for row in rows], module_ids=[row[0] for row in rows])
+
+
+def get_course_snapshot(course):
+    version = course_version(course.pk)
+    key = f'course_snapshot:{course.pk}:{version}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_course_snapshot(course, version)
+        cache.set(key, snapshot, _timeout())
+    return snapshot
+
+
+async def aget_course_snapshot(course):
+    # попадание в кеш не занимает потоков; сборка снимка — синхронная, в пуле
+    version = await aget_version(course_version_key(course.pk))
+    key = f'course_snapshot:{course.pk}:{version}'
+    snapshot = await cache.aget(key)
+    if snapshot is None:
+        snapshot = await sync_to_async(build_course_snapshot)(course, version)
+        await cache.aset(key, snapshot, _timeout())
+    return snapshot
+
+
+def build_course_snapshot(course, version):
+    # снимок ложится под новую версию, поэтому читается с primary
+    with primary_reads():
+        if course._state.db != DEFAULT_DB_ALIAS:
+            course = Course.objects.get(pk=course.pk)
+        return _build_course_snapshot(course, version)
+
+
+def _build_course_snapshot(course, version):
+    from .api.compiled import compiled
+    from .api.serializers import CourseWithContentsSerializer, ModuleWithContentsSerializer
+
+    modules = list(course.modules.all())
+    versions = module_versions([module.pk for module in modules])
+    keys = {module.pk: f'module_snapshot:{module.pk}:{versions[module.pk]}' for module in modules}
+    snapshots = cache.get_many(list(keys.values()))
+    missing = [module for module in modules if keys[module.pk] not in snapshots]
+    if missing:
+        load_contents(missing)
+        plan = compiled(ModuleWithContentsSerializer)
+        fresh = {keys[module.pk]: plan.to_representation(module) for module in missing}
+        cache.set_many(fresh, _timeout())
+        snapshots.update(fresh)
+
+    data = {}
+    for name, extract in compiled(CourseWithContentsSerializer).plan:
+        if name == 'modules':
+            data[name] = [snapshots[keys[module.pk]] for module in modules]
+        else:
+            data[name] = extract(course)
+    digest = hashlib.sha256(JSONRenderer().render(data)).hexdigest()
+    return {'version': version, 'etag': f'"{digest}"', 'data': data}
+
+
+def course_outline(course_id):
+    # список модулей для навигации студента: id, title, order в порядке курса
+    key = f'course_outline:{course_id}:{course_version(course_id)}'
+    outline = cache.get(key)
+    if outline is None:
+        with primary_reads():
+            outline = list(Module.objects.filter(course_id=course_id).values('id', 'title', 'order'))
+        cache.set(key, outline, _timeout())
+    return outline
+
+
+def module_html(module_id):
+    # общий для всех студентов HTML материалов модуля
+    key = f'module_html:{module_id}:{module_versions([module_id])[module_id]}'
+    html = cache.get(key)
+    if html is None:
+        module = Module(pk=module_id)
+        with primary_reads():
+            load_contents([module])
+        html = render_to_string('students/course/module.html', {'module': module})
+        cache.set(key, html, _timeout())
+    return html
@@ -1,30 +1,94 @@
+import base64
+import csv
+import json
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import TestCase, override_settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
-from .models import Course, Subject
+from . import catalog, images
+from .api.authentication import CredentialCache, credential_cache
+from .api.compiled import compiled
+from .api.serializers import (
+    CourseListSerializer,
+    CourseSerializer,
+    CourseWithContentsSerializer,
+    ModuleSerializer,
+    ModuleWithContentsSerializer,
+    SubjectSerializer,
+)
+from .delivery import parse_range
+from .enrollment import enrolled_cache_key, enrolled_course_ids, enrolled_version_key
+from .export import KINDS, export_lines
+from .importer import CatalogImporter, read_rows
+from .instrumentation import fingerprint, registry
+from .loading import contents_prefetch, load_contents
+from .models import ITEM_MODELS, Content, Course, File, Image, Module, OrderSequence, SearchDocument, Subject, Text, Video
+from .ordering import apply_order
+from .render_cache import render_cache_key
+from .routers import STICKY_COOKIE
+from .search import rebuild_index, search
+from .versions import get_version
 
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
 
-@override_settings(
-    CACHES={
-        'default': {
-            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        }
-    }
-)
-class CourseAPITestCase(TestCase):
+
+class CacheFixture:
+    # пустой locmem-кеш и владелец курсов: общее начало setUp тестов courses
     def setUp(self):
-        self.client = APIClient()
-        self.subject = Subject.objects.create(title='Math', slug='math')
+        super().setUp()
+        cache.clear()
         self.owner = User.objects.create_user(username='owner', password='pass')
+
+
+class CourseFixture(CacheFixture):
+    # плюс предмет и один курс; название и slug курса можно задать в классе
+    course_title = 'Course'
+    course_slug = 'course'
+
+    def setUp(self):
+        super().setUp()
+        self.subject = Subject.objects.create(title='Math', slug='math')
         self.course = Course.objects.create(
-            owner=self.owner,
-            subject=self.subject,
-            title='Course',
-            slug='course',
-            overview='Overview',
+            owner=self.owner, subject=self.subject, title=self.course_title, slug=self.course_slug, overview='Overview',
         )
 
+    def enrolled_student(self, username='student'):
+        student = User.objects.create_user(username=username, password='pass')
+        self.course.students.add(student)
+        return student
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CacheTestCase(CacheFixture, TestCase):
+    pass
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CourseTestCase(CourseFixture, TestCase):
+    pass
+
+
+class CourseAPITestCase(CourseTestCase):
+    client_class = APIClient
+
+
     def test_api_root_lists_registered_viewsets(self):
         response = self.client.get('/api/')
         self.assertEqual(response.status_code, 200)
@@ -57,3 +121,1652 @@ class CourseAPITestCase(TestCase):
         authorized_response = self.client.get(contents_url)
         self.assertEqual(authorized_response.status_code, 200)
         self.assertEqual(authorized_response.data.get('id'), self.course.id)
+
+
+class ContentLoadingTestCase(CourseTestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        super().setUp()
+        self.student = self.enrolled_student()
+        self.module = Module.objects.create(course=self.course, title='Module')
+
+
+    def add_items(self, count):
+        for i in range(count):
+            for item in (
+                Text.objects.create(owner=self.owner, title=f'Text {i}', content='Text'),
+                File.objects.create(owner=self.owner, title=f'File {i}', file='files/doc.pdf'),
+                Image.objects.create(owner=self.owner, title=f'Image {i}', file='images/pic.png'),
+                Video.objects.create(owner=self.owner, title=f'Video {i}', url='https://www.youtube.com/watch?v=bgC-ocnTTto'),
+            ):
+                Content.objects.create(module=self.module, item=item)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_contents_api_query_count_does_not_grow_with_items(self):
+        self.client.force_authenticate(user=self.student)
+        url = f'/api/courses/{self.course.id}/contents/'
+        self.add_items(1)
+        baseline = self.count_queries(url)
+        self.add_items(5)
+        self.assertEqual(self.count_queries(url), baseline)
+        response = self.client.get(url)
+        self.assertEqual(len(response.data['modules'][0]['contents']), 24)
+
+    def test_module_content_list_query_count_does_not_grow_with_items(self):
+        self.client.force_login(self.owner)
+        url = reverse('courses:module_content_list', args=[self.module.id])
+        self.add_items(1)
+        baseline = self.count_queries(url)
+        self.add_items(5)
+        self.assertEqual(self.count_queries(url), baseline)
+
+    def test_student_course_detail_query_count_does_not_grow_with_items(self):
+        self.client.force_login(self.student)
+        url = reverse('students:student_course_detail', args=[self.course.id])
+        self.count_queries(url)
+        # новые материалы сдвигают версию модуля: оба замера — с пересборкой HTML
+        self.add_items(1)
+        baseline = self.count_queries(url)
+        self.add_items(5)
+        self.assertEqual(self.count_queries(url), baseline)
+
+
+class RenderCacheTestCase(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.text = Text.objects.create(owner=self.owner, title='Text', content='First version')
+
+
+    def test_render_is_cached_on_save(self):
+        with mock.patch.object(Text, 'render', autospec=True) as render:
+            html = self.text.cached_render()
+        render.assert_not_called()
+        self.assertIn('First version', html)
+
+    def test_edit_is_visible_immediately(self):
+        self.text.cached_render()
+        self.text.content = 'Second version'
+        self.text.save()
+        self.assertIn('Second version', Text.objects.get(pk=self.text.pk).cached_render())
+
+    def test_stale_entry_is_ignored(self):
+        self.text.cached_render()
+        Text.objects.filter(pk=self.text.pk).update(content='Updated', updated=timezone.now())
+        self.assertIn('Updated', Text.objects.get(pk=self.text.pk).cached_render())
+
+    def test_module_items_are_read_with_one_get_many(self):
+        subject = Subject.objects.create(title='Math', slug='math')
+        course = Course.objects.create(owner=self.owner, subject=subject, title='C', slug='c', overview='')
+        module = Module.objects.create(course=course, title='M')
+        for i in range(3):
+            Content.objects.create(module=module, item=Text.objects.create(owner=self.owner, title=f'T{i}', content=f'Body {i}'))
+        load_contents([module])
+        with mock.patch.object(cache, 'get', wraps=cache.get) as get, mock.patch.object(Text, 'render', autospec=True) as render:
+            html = [content.item.cached_render() for content in module.contents.all()]
+        get.assert_not_called()
+        render.assert_not_called()
+        self.assertEqual([f'Body {i}' in part for i, part in enumerate(html)], [True] * 3)
+
+    def test_delete_drops_entry(self):
+        key = render_cache_key(self.text)
+        self.assertIsNotNone(cache.get(key))
+        self.text.delete()
+        self.assertIsNone(cache.get(key))
+
+
+class CatalogCacheTestCase(CourseTestCase):
+    course_title = 'Algebra'
+    course_slug = 'algebra'
+
+
+    def test_cached_listing_runs_no_queries(self):
+        for url in (reverse('courses:course_list'), reverse('courses:course_list_by_subject', args=['math'])):
+            self.client.get(url)
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+            self.assertContains(response, 'Algebra')
+
+    def test_listing_reflects_changes_immediately(self):
+        url = reverse('courses:course_list_by_subject', args=['math'])
+        self.client.get(url)
+        Course.objects.create(
+            owner=self.owner,
+            subject=self.subject,
+            title='Geometry',
+            slug='geometry',
+            overview='Overview',
+        )
+        self.assertContains(self.client.get(url), 'Geometry')
+        self.course.delete()
+        self.assertNotContains(self.client.get(url), 'Algebra')
+
+    def test_cached_rows_are_materialized(self):
+        subjects = catalog.get_subjects()
+        self.assertIsInstance(subjects, list)
+        self.assertEqual(subjects[0]['total_courses'], 1)
+        self.assertEqual(catalog.get_courses()[0]['subject']['slug'], 'math')
+
+    def test_unknown_subject_returns_404(self):
+        response = self.client.get(reverse('courses:course_list_by_subject', args=['unknown']))
+        self.assertEqual(response.status_code, 404)
+
+
+class PopularCoursesTestCase(CacheTestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        super().setUp()
+        self.students = [User.objects.create_user(username=f'student{i}', password='pass') for i in range(4)]
+
+
+    def create_subject(self, index):
+        subject = Subject.objects.create(title=f'Subject {index}', slug=f'subject-{index}')
+        for students in range(5):
+            course = Course.objects.create(
+                owner=self.owner,
+                subject=subject,
+                title=f'Course {index}.{students}',
+                slug=f'course-{index}-{students}',
+                overview='Overview',
+            )
+            course.students.add(*self.students[:students])
+        return subject
+
+    def test_popular_courses_are_ranked_by_students(self):
+        self.create_subject(0)
+        response = self.client.get('/api/subjects/')
+        self.assertEqual(
+            response.data['results'][0]['popular_courses'],
+            ['Course 0.4 (4)', 'Course 0.3 (3)', 'Course 0.2 (2)'],
+        )
+        detail = self.client.get(f"/api/subjects/{response.data['results'][0]['id']}/")
+        self.assertEqual(detail.data['popular_courses'], response.data['results'][0]['popular_courses'])
+
+    def test_subject_list_query_count_does_not_grow_with_page(self):
+        self.create_subject(0)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/subjects/')
+        baseline = len(ctx.captured_queries)
+        for index in range(1, 6):
+            self.create_subject(index)
+        with self.assertNumQueries(baseline):
+            response = self.client.get('/api/subjects/')
+        self.assertEqual(len(response.data['results']), 6)
+
+
+class CounterTestCase(CourseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.students = [User.objects.create_user(username=f'student{i}', password='pass') for i in range(3)]
+
+
+    def assertCounters(self, students, modules, courses):
+        self.course.refresh_from_db()
+        self.subject.refresh_from_db()
+        self.assertEqual(
+            (self.course.total_students, self.course.total_modules, self.subject.total_courses),
+            (students, modules, courses),
+        )
+
+    def test_enrollment_counters(self):
+        self.course.students.add(*self.students)
+        self.assertCounters(3, 0, 1)
+        self.course.students.add(self.students[0])
+        self.assertCounters(3, 0, 1)
+        self.students[1].courses_joined.remove(self.course)
+        self.assertCounters(2, 0, 1)
+        self.students[2].courses_joined.clear()
+        self.assertCounters(1, 0, 1)
+        self.course.students.clear()
+        self.assertCounters(0, 0, 1)
+
+    def test_remove_non_member(self):
+        self.course.students.add(self.students[0])
+        self.course.students.remove(self.students[1])
+        self.assertCounters(1, 0, 1)
+        self.course.students.remove(self.students[0], self.students[2])
+        self.assertCounters(0, 0, 1)
+        other = Course.objects.create(owner=self.owner, subject=self.subject, title='Other', slug='other', overview='')
+        self.course.students.add(self.students[1])
+        self.students[1].courses_joined.remove(self.course, other)
+        self.assertCounters(0, 0, 2)
+        self.course.students.add(self.students[1])
+        other.students.add(self.students[2])
+        self.students[1].courses_joined.remove(other)
+        self.assertCounters(1, 0, 2)
+        other.refresh_from_db()
+        self.assertEqual(other.total_students, 1)
+
+    def test_enroll_api_updates_counter(self):
+        client = APIClient()
+        client.force_authenticate(user=self.students[0])
+        client.post(f'/api/courses/{self.course.id}/enroll/')
+        client.post(f'/api/courses/{self.course.id}/enroll/')
+        self.assertCounters(1, 0, 1)
+
+    def test_module_and_course_counters(self):
+        module = Module.objects.create(course=self.course, title='Module')
+        Module.objects.create(course=self.course, title='Module 2')
+        self.assertCounters(0, 2, 1)
+        module.delete()
+        self.assertCounters(0, 1, 1)
+        other = Subject.objects.create(title='Physics', slug='physics')
+        self.course.subject = other
+        self.course.save()
+        self.subject.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.subject.total_courses, other.total_courses), (0, 1))
+        self.course.delete()
+        other.refresh_from_db()
+        self.assertEqual(other.total_courses, 0)
+
+    def test_module_moved_to_another_course(self):
+        other = Course.objects.create(owner=self.owner, subject=self.subject, title='Other', slug='other', overview='')
+        module = Module.objects.create(course=self.course, title='Module')
+        module.course = other
+        module.save()
+        self.assertCounters(0, 0, 2)
+        other.refresh_from_db()
+        self.assertEqual(other.total_modules, 1)
+        module.title = 'Renamed'
+        module.save()
+        other.refresh_from_db()
+        self.assertEqual(other.total_modules, 1)
+
+    def test_user_delete_decrements_students(self):
+        other = Course.objects.create(owner=self.owner, subject=self.subject, title='Other', slug='other', overview='')
+        self.course.students.add(*self.students)
+        other.students.add(self.students[0])
+        self.students[0].delete()
+        self.assertCounters(2, 0, 2)
+        other.refresh_from_db()
+        self.assertEqual(other.total_students, 0)
+        User.objects.filter(pk__in=[self.students[1].pk, self.students[2].pk]).delete()
+        self.assertCounters(0, 0, 2)
+
+    def test_save_does_not_overwrite_counters(self):
+        stale = Course.objects.get(pk=self.course.pk)
+        self.course.students.add(*self.students)
+        stale.title = 'Renamed'
+        stale.save()
+        self.assertCounters(3, 0, 1)
+
+    def test_rebuild_counters_command(self):
+        self.course.students.add(*self.students)
+        Module.objects.create(course=self.course, title='Module')
+        Course.objects.update(total_students=0, total_modules=0)
+        Subject.objects.update(total_courses=0)
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertCounters(3, 1, 1)
+
+
+class OrderFieldTestCase(CourseTestCase):
+
+    def test_orders_are_sequential_per_parent(self):
+        other = Course.objects.create(owner=self.owner, subject=self.subject, title='Other', slug='other', overview='')
+        first = [Module.objects.create(course=self.course, title=str(i)).order for i in range(3)]
+        second = [Module.objects.create(course=other, title=str(i)).order for i in range(2)]
+        self.assertEqual(first, [0, 1, 2])
+        self.assertEqual(second, [0, 1])
+
+    def test_explicit_orders_advance_the_sequence(self):
+        self.assertEqual(Module.objects.create(course=self.course, title='Auto').order, 0)
+        Module.objects.create(course=self.course, title='Explicit', order=5)
+        self.assertEqual(Module.objects.create(course=self.course, title='Next').order, 6)
+        Module.objects.create(course=self.course, title='Lower', order=2)
+        self.assertEqual(Module.objects.create(course=self.course, title='Last').order, 7)
+
+    def test_sequence_starts_after_existing_orders(self):
+        Module.objects.create(course=self.course, title='Explicit', order=7)
+        OrderSequence.objects.all().delete()
+        self.assertEqual(Module.objects.create(course=self.course, title='Next').order, 8)
+
+    def test_assign_allocates_block_in_one_query(self):
+        Module.objects.create(course=self.course, title='First')
+        modules = [Module(course=self.course, title=str(i)) for i in range(5)]
+        field = Module._meta.get_field('order')
+        with self.assertNumQueries(1):
+            field.assign(modules)
+        self.assertEqual([m.order for m in modules], [1, 2, 3, 4, 5])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderFieldConcurrencyTestCase(CourseFixture, TransactionTestCase):
+    threads = 8
+    inserts = 15
+
+    def test_concurrent_inserts_get_unique_orders(self):
+        course = self.course
+        barrier = threading.Barrier(self.threads)
+        errors = []
+
+        def worker(index):
+            try:
+                barrier.wait()
+                for i in range(self.inserts):
+                    module = Module(course_id=course.id, title=f'{index}.{i}')
+                    for _ in range(50):
+                        try:
+                            module.save()
+                            break
+                        except OperationalError:
+                            # SQLite отвечает 'database is locked' вместо ожидания
+                            time.sleep(0.01)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(index,)) for index in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        orders = list(Module.objects.filter(course=course).values_list('order', flat=True))
+        self.assertEqual(len(orders), self.threads * self.inserts)
+        self.assertEqual(sorted(orders), list(range(self.threads * self.inserts)))
+
+
+class ReorderTestCase(CourseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user(username='other', password='pass')
+        self.modules = [Module.objects.create(course=self.course, title=f'Module {i}') for i in range(20)]
+
+
+    def reversed_map(self):
+        return {str(m.id): len(self.modules) - 1 - i for i, m in enumerate(self.modules)}
+
+    def assertReversed(self):
+        titles = list(self.course.modules.values_list('title', flat=True))
+        self.assertEqual(titles, [f'Module {i}' for i in reversed(range(20))])
+
+    def test_manage_module_order(self):
+        self.client.force_login(self.owner)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                reverse('courses:module_order'), json.dumps(self.reversed_map()), content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(len(ctx.captured_queries), 10)
+        self.assertReversed()
+        new = Module.objects.create(course=self.course, title='New')
+        self.assertEqual(new.order, 20)
+
+    def test_manage_content_order(self):
+        module = self.modules[0]
+        texts = [Text.objects.create(owner=self.owner, title=f'Text {i}', content='') for i in range(3)]
+        contents = [Content.objects.create(module=module, item=text) for text in texts]
+        self.client.force_login(self.owner)
+        response = self.client.post(
+            reverse('courses:content_order'),
+            json.dumps({contents[0].id: 2, contents[2].id: 0}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(module.contents.values_list('object_id', flat=True)), [texts[2].id, texts[1].id, texts[0].id])
+
+    def test_reorder_rejects_foreign_and_invalid_ids(self):
+        self.client.force_login(self.other)
+        response = self.client.post(
+            reverse('courses:module_order'), json.dumps(self.reversed_map()), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post(reverse('courses:module_order'), json.dumps({'x': 'y'}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.course.modules.first().title, 'Module 0')
+
+    def test_api_module_order(self):
+        client = APIClient()
+        url = f'/api/courses/{self.course.id}/modules/order/'
+        client.force_authenticate(user=self.other)
+        self.assertEqual(client.post(url, self.reversed_map(), format='json').status_code, 403)
+        client.force_authenticate(user=self.owner)
+        self.assertEqual(client.post(url, self.reversed_map(), format='json').status_code, 200)
+        self.assertReversed()
+
+
+class KeysetPaginationTestCase(CacheTestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        super().setUp()
+        self.subject = Subject.objects.create(title='Math', slug='math')
+        for i in range(25):
+            Course.objects.create(owner=self.owner, subject=self.subject, title=f'C{i}', slug=f'c{i}', overview='')
+        # половина курсов с одинаковым created: порядок держится на id
+        Course.objects.filter(slug__in=[f'c{i}' for i in range(12)]).update(created=timezone.now())
+
+
+    def walk(self, url, on_page=None):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+            if on_page:
+                on_page()
+        return seen
+
+    def test_walks_whole_catalog_in_order(self):
+        expected = list(Course.objects.order_by('-created', 'id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/api/courses/?page_size=7'), expected)
+
+    def test_count_is_optional(self):
+        self.assertEqual(self.client.get('/api/courses/').data['count'], 25)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/courses/?count=false')
+        self.assertIsNone(response.data['count'])
+        self.assertFalse(any('COUNT(' in query['sql'] for query in ctx.captured_queries))
+
+    def test_cursor_is_stable_under_inserts(self):
+        expected = list(Course.objects.order_by('-created', 'id').values_list('id', flat=True))
+        counter = iter(range(100))
+
+        def insert():
+            i = next(counter)
+            Course.objects.create(owner=self.owner, subject=self.subject, title=f'N{i}', slug=f'n{i}', overview='')
+
+        # новые курсы свежее курсора и не попадают в уже начатый обход
+        self.assertEqual(self.walk('/api/courses/?page_size=5', insert), expected)
+
+    def test_subjects_are_ordered_by_title(self):
+        Subject.objects.create(title='Art', slug='art')
+        Subject.objects.create(title='Zoology', slug='zoology')
+        titles = []
+        url = '/api/subjects/?page_size=1'
+        while url:
+            response = self.client.get(url)
+            titles += [row['title'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(titles, ['Art', 'Math', 'Zoology'])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/courses/?cursor=garbage').status_code, 404)
+
+
+class CourseListSerializerTestCase(CacheTestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        super().setUp()
+        self.subject = Subject.objects.create(title='Math', slug='math')
+        for i in range(5):
+            course = Course.objects.create(owner=self.owner, subject=self.subject, title=f'C{i}', slug=f'c{i}', overview='Long overview')
+            for j in range(3):
+                Module.objects.create(course=course, title=f'M{j}')
+
+
+    def test_list_is_slim_by_default(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/courses/')
+        row = response.data['results'][0]
+        self.assertNotIn('modules', row)
+        self.assertNotIn('overview', row)
+        self.assertEqual(row['total_modules'], 3)
+
+    def test_modules_are_opt_in(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/courses/?expand=modules')
+        self.assertEqual([m['title'] for m in response.data['results'][0]['modules']], ['M0', 'M1', 'M2'])
+
+    def test_detail_keeps_modules(self):
+        course = Course.objects.first()
+        response = self.client.get(f'/api/courses/{course.id}/')
+        self.assertEqual(len(response.data['modules']), 3)
+        self.assertEqual(response.data['overview'], 'Long overview')
+
+
+class CompiledSerializerTestCase(CourseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.student = self.enrolled_student()
+        for i in range(2):
+            module = Module.objects.create(course=self.course, title=f'Module {i}', description='')
+            for item in (
+                Text.objects.create(owner=self.owner, title='Text', content='Text <b>content</b>'),
+                File.objects.create(owner=self.owner, title='File', file='files/doc.pdf'),
+                Image.objects.create(owner=self.owner, title='Image', file='images/pic.png'),
+                Video.objects.create(owner=self.owner, title='Video', url='https://www.youtube.com/watch?v=bgC-ocnTTto'),
+            ):
+                Content.objects.create(module=module, item=item)
+        Module.objects.create(course=self.course, title='Empty')
+
+
+    def assertSameOutput(self, serializer_class, instance):
+        expected = JSONRenderer().render(serializer_class(instance).data)
+        self.assertEqual(JSONRenderer().render(compiled(serializer_class).to_representation(instance)), expected)
+
+    def test_matches_drf_for_course_serializers(self):
+        course = Course.objects.prefetch_related(contents_prefetch('modules__contents')).get()
+        for serializer_class in (CourseSerializer, CourseWithContentsSerializer, CourseListSerializer, ModuleSerializer):
+            self.assertSameOutput(serializer_class, course if serializer_class is not ModuleSerializer else course.modules.first())
+
+    def test_matches_drf_for_subject_serializer(self):
+        self.assertSameOutput(SubjectSerializer, self.subject)
+
+    def test_rows_match_instances(self):
+        rows = Course.objects.values(*CourseListSerializer.Meta.fields)
+        self.assertEqual(
+            compiled(CourseListSerializer).serialize_rows(rows),
+            CourseListSerializer(Course.objects.all(), many=True).data,
+        )
+
+    def test_contents_endpoint_matches_drf(self):
+        client = APIClient()
+        client.force_authenticate(user=self.student)
+        response = client.get(f'/api/courses/{self.course.id}/contents/')
+        course = Course.objects.prefetch_related(contents_prefetch('modules__contents')).get()
+        self.assertEqual(response.content, JSONRenderer().render(CourseWithContentsSerializer(course).data))
+
+
+class BulkEnrollmentTestCase(CacheTestCase):
+    client_class = APIClient
+    url = '/api/enrollments/bulk/'
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(username='admin', password='pass', is_staff=True)
+        self.subject = Subject.objects.create(title='Math', slug='math')
+        self.courses = [
+            Course.objects.create(owner=self.owner, subject=self.subject, title=f'C{i}', slug=f'c{i}', overview='')
+            for i in range(3)
+        ]
+        self.course_ids = [course.id for course in self.courses]
+
+    def test_enrolls_current_user(self):
+        self.client.force_authenticate(user=self.owner)
+        self.courses[0].students.add(self.owner)
+        response = self.client.post(self.url, {'courses': self.course_ids, 'include_ids': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = {row['course']: row for row in response.data['results']}
+        self.assertEqual(results[self.course_ids[0]]['existing_ids'], [self.owner.id])
+        self.assertEqual(results[self.course_ids[1]]['created_ids'], [self.owner.id])
+        self.assertEqual(set(self.owner.courses_joined.values_list('id', flat=True)), set(self.course_ids))
+
+    def test_staff_enrolls_cohort_with_fixed_query_count(self):
+        users = User.objects.bulk_create(User(username=f'cohort{i}') for i in range(50))
+        self.client.force_authenticate(user=self.admin)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, {'courses': self.course_ids, 'users': [u.id for u in users]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(len(ctx.captured_queries), 15)
+        self.assertEqual(
+            sorted(response.data['results'], key=lambda row: row['course']),
+            [{'course': pk, 'created': 50, 'existing': 0} for pk in sorted(self.course_ids)],
+        )
+        for course in self.courses:
+            course.refresh_from_db()
+            self.assertEqual(course.total_students, 50)
+
+    def test_validation(self):
+        self.client.force_authenticate(user=self.owner)
+        response = self.client.post(self.url, {'courses': self.course_ids, 'users': [self.admin.id]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url, {'courses': [999999]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.post(self.url, {'courses': self.course_ids}, format='json').status_code, 403)
+
+
+class CachedBasicAuthenticationTestCase(CourseTestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        super().setUp()
+        credential_cache.clear()
+        self.student = User.objects.create_user(username='student', password='secret')
+        self.url = f'/api/courses/{self.course.id}/enroll/'
+
+
+    def post(self, password):
+        credentials = base64.b64encode(f'student:{password}'.encode()).decode()
+        return self.client.post(self.url, HTTP_AUTHORIZATION=f'Basic {credentials}')
+
+    def test_password_is_hashed_once(self):
+        with mock.patch.object(User, 'check_password', autospec=True, side_effect=User.check_password) as check:
+            for _ in range(3):
+                self.assertEqual(self.post('secret').status_code, 200)
+        self.assertEqual(check.call_count, 1)
+
+    def test_wrong_password_is_not_cached(self):
+        self.assertEqual(self.post('wrong').status_code, 401)
+        self.assertEqual(self.post('wrong').status_code, 401)
+        self.assertEqual(len(credential_cache), 0)
+
+    def test_password_change_invalidates(self):
+        self.assertEqual(self.post('secret').status_code, 200)
+        self.student.set_password('changed')
+        self.student.save()
+        self.assertEqual(self.post('secret').status_code, 401)
+        self.assertEqual(self.post('changed').status_code, 200)
+
+    def test_entries_are_bounded_and_expire(self):
+        bounded = CredentialCache(max_size=2, ttl=60)
+        for index in range(3):
+            bounded.set(str(index), index, 'hash')
+        self.assertIsNone(bounded.get('0'))
+        self.assertEqual(bounded.get('2'), (2, 'hash'))
+        with mock.patch('courses.api.authentication.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(bounded.get('2'))
+
+
+class EnrollmentCheckTestCase(CourseTestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        super().setUp()
+        self.student = User.objects.create_user(username='student', password='pass')
+
+
+    def test_enrolled_ids_follow_m2m_changes(self):
+        self.assertEqual(enrolled_course_ids(User.objects.get(pk=self.student.pk)), frozenset())
+        self.course.students.add(self.student)
+        self.assertEqual(enrolled_course_ids(User.objects.get(pk=self.student.pk)), {self.course.id})
+        fresh = User.objects.get(pk=self.student.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(enrolled_course_ids(fresh), {self.course.id})
+        self.student.courses_joined.remove(self.course)
+        self.assertEqual(enrolled_course_ids(User.objects.get(pk=self.student.pk)), frozenset())
+        self.course.students.add(self.student)
+        self.course.students.clear()
+        self.assertEqual(enrolled_course_ids(User.objects.get(pk=self.student.pk)), frozenset())
+
+    def test_version_moves_again_on_commit(self):
+        key = enrolled_version_key(self.student.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.course.students.add(self.student)
+                # читатель внутри окна до коммита: база ещё без записи
+                cache.set(enrolled_cache_key(self.student.pk, get_version(key)), frozenset())
+        self.assertEqual(enrolled_course_ids(User.objects.get(pk=self.student.pk)), {self.course.id})
+
+    def test_late_stale_fill_is_not_read(self):
+        # читатель взял версию до записи на курс и дописал кеш уже после неё
+        version = get_version(enrolled_version_key(self.student.pk))
+        self.course.students.add(self.student)
+        cache.set(enrolled_cache_key(self.student.pk, version), frozenset())
+        self.assertEqual(enrolled_course_ids(User.objects.get(pk=self.student.pk)), {self.course.id})
+
+    def test_contents_permission_uses_annotated_course(self):
+        self.course.students.add(self.student)
+        self.client.force_authenticate(user=self.student)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/courses/{self.course.id}/contents/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('courses_course_students' in q['sql'] and 'EXISTS' not in q['sql'] for q in ctx.captured_queries))
+
+    def test_student_course_list_uses_cached_ids(self):
+        self.course.students.add(self.student)
+        self.client.force_login(self.student)
+        self.client.get(reverse('students:student_course_list'))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('students:student_course_list'))
+        self.assertContains(response, 'C')
+        self.assertFalse(any('courses_course_students' in q['sql'] for q in ctx.captured_queries))
+
+
+class CourseSnapshotTestCase(CourseTestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        super().setUp()
+        self.student = self.enrolled_student()
+        self.modules = [Module.objects.create(course=self.course, title=f'M{i}') for i in range(2)]
+        self.texts = []
+        for module in self.modules:
+            text = Text.objects.create(owner=self.owner, title=f'T {module.title}', content='old')
+            Content.objects.create(module=module, item=text)
+            self.texts.append(text)
+        self.client.force_authenticate(user=self.student)
+        self.url = f'/api/courses/{self.course.id}/contents/'
+
+
+    def expected(self):
+        course = Course.objects.prefetch_related(contents_prefetch('modules__contents')).get(pk=self.course.pk)
+        return json.loads(JSONRenderer().render(CourseWithContentsSerializer(course).data))
+
+    def test_snapshot_matches_serializer(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), self.expected())
+        self.assertTrue(response['ETag'].startswith('"'))
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_permission_checked_before_304(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_authenticate(user=self.owner)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 403)
+
+    def test_item_change_rebuilds_only_its_module(self):
+        etag = self.client.get(self.url)['ETag']
+        self.texts[0].content = 'new'
+        self.texts[0].save()
+        plan = compiled(ModuleWithContentsSerializer)
+        with mock.patch.object(plan, 'to_representation', wraps=plan.to_representation) as build:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(build.call_count, 1)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('new', response.data['modules'][0]['contents'][0]['item'])
+        self.assertEqual(json.loads(response.content), self.expected())
+
+    def test_structure_changes_invalidate_snapshot(self):
+        self.client.get(self.url)
+        Content.objects.create(module=self.modules[1], item=Text.objects.create(owner=self.owner, title='X', content='x'))
+        self.assertEqual(json.loads(self.client.get(self.url).content), self.expected())
+        apply_order(self.course.modules.all(), {self.modules[0].pk: 5, self.modules[1].pk: 1})
+        self.assertEqual([m['title'] for m in self.client.get(self.url).data['modules']], ['M1', 'M0'])
+        self.modules[0].delete()
+        self.assertEqual(json.loads(self.client.get(self.url).content), self.expected())
+        self.course.title = 'Renamed'
+        self.course.save()
+        self.assertEqual(self.client.get(self.url).data['title'], 'Renamed')
+
+    def test_cascade_delete_does_not_load_module_per_content(self):
+        module = self.modules[1]
+        for i in range(3):
+            Content.objects.create(module_id=module.pk, item=Text.objects.create(owner=self.owner, title=f'X{i}', content='x'))
+        etag = self.client.get(self.url)['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            Module.objects.get(pk=module.pk).delete()
+        module_reads = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT') and 'FROM "courses_module"' in q['sql']]
+        self.assertLessEqual(len(module_reads), 1)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), self.expected())
+        Content.objects.get(object_id=self.texts[0].pk, module__course=self.course).delete()
+        self.assertEqual(self.client.get(self.url).data['modules'][0]['contents'], [])
+
+
+class ConditionalGetTestCase(CourseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.student = self.enrolled_student()
+        self.module = Module.objects.create(course=self.course, title='M')
+        self.text = Text.objects.create(owner=self.owner, title='T', content='old')
+        Content.objects.create(module=self.module, item=self.text)
+
+
+    def revalidate(self, client, url):
+        # первый ответ ставит CSRF-cookie, от которой зависит ETag страниц
+        client.get(url)
+        etag = client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return etag, response, ctx
+
+    def test_student_course_revisit_is_not_modified(self):
+        self.client.force_login(self.student)
+        url = reverse('students:student_course_detail_module', args=[self.course.id, self.module.id])
+        etag, response, ctx = self.revalidate(self.client, url)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any('courses_' in q['sql'] for q in ctx.captured_queries))
+        self.text.content = 'new'
+        self.text.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'new')
+
+    def test_not_enrolled_gets_404_not_304(self):
+        self.client.force_login(self.student)
+        url = reverse('students:student_course_detail', args=[self.course.id])
+        etag = self.client.get(url)['ETag']
+        self.course.students.remove(self.student)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+    def test_etag_depends_on_user(self):
+        other = User.objects.create_user(username='other', password='pass')
+        self.course.students.add(other)
+        url = reverse('students:student_course_detail', args=[self.course.id])
+        self.client.force_login(self.student)
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_course_pages_follow_catalog_and_snapshot(self):
+        list_url = reverse('courses:course_list')
+        detail_url = reverse('courses:course_detail', args=[self.course.slug])
+        detail_etag, response, _ = self.revalidate(self.client, detail_url)
+        self.assertEqual(response.status_code, 304)
+        list_etag, response, _ = self.revalidate(self.client, list_url)
+        self.assertEqual(response.status_code, 304)
+        self.text.title = 'Renamed'
+        self.text.save()
+        self.assertEqual(self.client.get(list_url, HTTP_IF_NONE_MATCH=list_etag).status_code, 304)
+        self.assertContains(self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag), 'Renamed')
+        self.course.title = 'New title'
+        self.course.save()
+        self.assertContains(self.client.get(list_url, HTTP_IF_NONE_MATCH=list_etag), 'New title')
+        self.assertEqual(self.client.get(reverse('courses:course_detail', args=['missing'])).status_code, 404)
+
+    def test_api_lists_are_not_modified_until_data_changes(self):
+        client = APIClient()
+        for url in ('/api/courses/', f'/api/courses/{self.course.id}/', '/api/subjects/'):
+            etag, response, ctx = self.revalidate(client, url)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(len(ctx.captured_queries), 0)
+        etag = client.get('/api/courses/')['ETag']
+        self.course.students.add(self.owner)
+        response = client.get('/api/courses/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['total_students'], 2)
+        self.assertNotEqual(client.get('/api/courses/?page_size=1')['ETag'], response['ETag'])
+
+
+class StudentCourseViewTestCase(CourseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.student = self.enrolled_student()
+        self.modules = [self.add_module(i) for i in range(2)]
+        self.client.force_login(self.student)
+
+
+    def add_module(self, index):
+        module = Module.objects.create(course=self.course, title=f'Module {index}')
+        for i in range(2):
+            text = Text.objects.create(owner=self.owner, title=f'Text {index}.{i}', content=f'Body {index}.{i}')
+            Content.objects.create(module=module, item=text)
+        return module
+
+    def url(self, module):
+        return reverse('students:student_course_detail_module', args=[self.course.id, module.id])
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_page_shows_selected_module(self):
+        response = self.client.get(self.url(self.modules[1]))
+        self.assertContains(response, 'Body 1.0')
+        self.assertNotContains(response, 'Body 0.0')
+        self.assertContains(response, f'data-id="{self.modules[1].id}" class="selected"')
+        self.assertContains(self.client.get(reverse('students:student_course_detail', args=[self.course.id])), 'Body 0.1')
+
+    def test_query_count_is_fixed(self):
+        cold = self.count_queries(self.url(self.modules[1]))
+        warm = self.count_queries(self.url(self.modules[1]))
+        for index in range(2, 5):
+            self.add_module(index)
+        cache.clear()
+        self.assertEqual(self.count_queries(self.url(self.modules[1])), cold)
+        self.assertEqual(self.count_queries(self.url(self.modules[1])), warm)
+        self.assertLessEqual(warm, 3)
+
+    def test_fragment_follows_module_version(self):
+        self.client.get(self.url(self.modules[0]))
+        text = self.modules[0].contents.first().item
+        text.content = 'Changed body'
+        text.save()
+        self.assertContains(self.client.get(self.url(self.modules[0])), 'Changed body')
+        apply_order(self.course.modules.all(), {self.modules[0].pk: 3, self.modules[1].pk: 2})
+        response = self.client.get(reverse('students:student_course_detail', args=[self.course.id]))
+        self.assertContains(response, 'Body 1.0')
+
+    def test_foreign_module_is_404(self):
+        other = Course.objects.create(owner=self.owner, subject=self.subject, title='D', slug='d', overview='')
+        module = Module.objects.create(course=other, title='Other')
+        response = self.client.get(reverse('students:student_course_detail_module', args=[self.course.id, module.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ExportTestCase(CourseTestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        super().setUp()
+        self.student = self.enrolled_student()
+        self.staff = User.objects.create_user(username='staff', password='pass', is_staff=True)
+        self.module = Module.objects.create(course=self.course, title='M')
+        for item in (
+            Text.objects.create(owner=self.owner, title='T', content='Body'),
+            Video.objects.create(owner=self.owner, title='V', url='https://www.youtube.com/watch?v=bgC-ocnTTto'),
+            File.objects.create(owner=self.owner, title='F', file='files/doc.pdf'),
+        ):
+            Content.objects.create(module=self.module, item=item)
+
+
+    def read_ndjson(self, response):
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_ndjson_export_streams_every_kind(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get('/api/export/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = self.read_ndjson(response)
+        self.assertEqual([row['kind'] for row in rows], ['subject', 'course', 'module', 'content', 'content', 'content', 'enrollment'])
+        course = rows[1]
+        self.assertEqual((course['subject'], course['owner'], course['title']), (self.subject.id, 'owner', 'Course'))
+        text, video, file = rows[3:6]
+        self.assertEqual((text['item_type'], text['content'], text['module']), ('text', 'Body', self.module.id))
+        self.assertEqual(video['url'], 'https://www.youtube.com/watch?v=bgC-ocnTTto')
+        self.assertEqual(file['file'], 'files/doc.pdf')
+        self.assertEqual(rows[-1], {'kind': 'enrollment', 'course': self.course.id, 'user': 'student'})
+
+    def test_csv_export_of_one_kind(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get('/api/export/?kind=content&output=csv')
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([row['title'] for row in rows], ['T', 'V', 'F'])
+        self.assertEqual(self.client.get('/api/export/?kind=course,module&output=csv').status_code, 400)
+        self.assertEqual(self.client.get('/api/export/?kind=lesson').status_code, 400)
+
+    def test_format_is_negotiated_from_accept(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get('/api/export/', HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'application/x-ndjson'))
+        self.assertEqual(len(self.read_ndjson(response)), 7)
+        response = self.client.get('/api/export/?kind=subject', HTTP_ACCEPT='text/csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([row['title'] for row in rows], ['Math'])
+        self.assertEqual(self.client.get('/api/export/', HTTP_ACCEPT='image/png').status_code, 406)
+
+    def test_export_is_staff_only(self):
+        self.client.force_authenticate(user=self.student)
+        self.assertEqual(self.client.get('/api/export/').status_code, 403)
+
+    def test_content_export_queries_do_not_grow_with_items(self):
+        def count():
+            with CaptureQueriesContext(connection) as ctx:
+                list(export_lines(['content'], chunk_size=100))
+            return len(ctx.captured_queries)
+        count()  # прогрев кеша ContentType
+        for i in range(10):
+            Content.objects.create(module=self.module, item=Text.objects.create(owner=self.owner, title=f'T{i}', content=''))
+        # запрос Content плюс по запросу на каждый тип материала в порции
+        self.assertEqual(count(), 4)
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command('export_catalog', '--kind', 'enrollment', '--kind', 'subject', stdout=out)
+        self.assertEqual([json.loads(line)['kind'] for line in out.getvalue().splitlines()], ['subject', 'enrollment'])
+
+
+class ImportTestCase(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.student = User.objects.create_user(username='student', password='pass')
+        subject = Subject.objects.create(title='Math', slug='math')
+        for c in range(2):
+            course = Course.objects.create(owner=self.owner, subject=subject, title=f'C{c}', slug=f'c{c}', overview='O')
+            course.students.add(self.student)
+            for m in range(2):
+                module = Module.objects.create(course=course, title=f'M{c}.{m}')
+                Content.objects.create(module=module, item=Text.objects.create(owner=self.owner, title=f'T{c}.{m}', content='Body'))
+                Content.objects.create(module=module, item=Video.objects.create(owner=self.owner, title=f'V{c}.{m}', url='https://www.youtube.com/watch?v=bgC-ocnTTto'))
+        self.dump = ''.join(export_lines())
+
+
+    def snapshot(self):
+        # выгрузка без id: после загрузки id другие
+        rows = []
+        for row in read_rows(StringIO(''.join(export_lines()))):
+            rows.append({key: value for key, value in row.items() if key not in ('id', 'subject', 'course', 'module')})
+        return rows
+
+    def reload(self, batch_size=3):
+        Subject.objects.all().delete()
+        return CatalogImporter(batch_size=batch_size).run(read_rows(StringIO(self.dump)))
+
+    def test_round_trip(self):
+        expected = self.snapshot()
+        stats = self.reload()
+        self.assertEqual((stats['course'], stats['module'], stats['content'], stats['enrollment']), (2, 4, 8, 2))
+        self.assertEqual(self.snapshot(), expected)
+        course = Course.objects.get(slug='c1')
+        self.assertEqual((course.total_modules, course.total_students, course.subject.total_courses), (2, 1, 2))
+        self.assertEqual(enrolled_course_ids(User.objects.get(pk=self.student.pk)), set(Course.objects.values_list('pk', flat=True)))
+
+    def test_order_sequences_continue_after_import(self):
+        self.reload()
+        course = Course.objects.get(slug='c0')
+        self.assertEqual(Module.objects.create(course=course, title='New').order, 2)
+        module = course.modules.get(title='M0.0')
+        content = Content.objects.create(module=module, item=Text.objects.create(owner=self.owner, title='X', content=''))
+        self.assertEqual(content.order, 2)
+
+    def test_existing_courses_are_skipped(self):
+        stats = CatalogImporter().run(read_rows(StringIO(self.dump)))
+        self.assertEqual((stats['course'], stats['module'], stats['skipped']), (0, 0, 2))
+        self.assertEqual(Content.objects.count(), 8)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def count(dump):
+            Subject.objects.all().delete()
+            with CaptureQueriesContext(connection) as ctx:
+                CatalogImporter(batch_size=10000).run(read_rows(StringIO(dump)))
+            return len(ctx.captured_queries)
+        small = count(self.dump)
+        course = Course.objects.get(slug='c0')
+        for m in range(5):
+            module = Module.objects.create(course=course, title=f'Extra {m}')
+            for i in range(5):
+                Content.objects.create(module=module, item=Text.objects.create(owner=self.owner, title='T', content=''))
+        self.assertEqual(count(''.join(export_lines())), small)
+
+    def test_csv_round_trip_of_every_kind(self):
+        expected = self.snapshot()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        paths = []
+        for kind in reversed(KINDS):
+            path = f'{directory}/{kind}.csv'
+            with open(path, 'w', encoding='utf-8', newline='') as file:
+                file.writelines(export_lines([kind], 'csv'))
+            paths.append(path)
+        Subject.objects.all().delete()
+        out = StringIO()
+        call_command('import_catalog', *paths, '--batch-size', '3', stdout=out)
+        self.assertIn('2 course, 2 enrollment', out.getvalue())
+        self.assertEqual(self.snapshot(), expected)
+
+    def test_command_reads_csv_from_stdin(self):
+        dump = ''.join(export_lines(['subject'], 'csv'))
+        Subject.objects.all().delete()
+        out = StringIO()
+        with mock.patch('sys.stdin', StringIO(dump)):
+            call_command('import_catalog', '-', '--format', 'csv', stdout=out)
+        self.assertIn('1 subject', out.getvalue())
+        self.assertTrue(Subject.objects.filter(slug='math').exists())
+
+    def test_unknown_reference_fails(self):
+        dump = json.dumps({'kind': 'module', 'id': 1, 'course': 99, 'title': 'M', 'description': '', 'order': 0})
+        self.assertRaises(ValueError, CatalogImporter().run, read_rows(StringIO(dump)))
+
+
+class ImageDerivativesTestCase(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media, IMAGE_WORKERS=0, IMAGE_DERIVATIVE_WIDTHS=(320, 640, 1280)))
+
+
+    def upload(self, width=800, color='red'):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image as PILImage
+
+        buffer = BytesIO()
+        PILImage.new('RGBA', (width, width // 2), color).save(buffer, 'PNG')
+        return SimpleUploadedFile('pic.png', buffer.getvalue(), content_type='image/png')
+
+    def create(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Image.objects.create(owner=self.owner, title='Pic', file=self.upload(**kwargs))
+
+    def test_derivatives_are_built_after_save(self):
+        image = self.create()
+        image.refresh_from_db()
+        self.assertEqual(len(image.file_hash), 64)
+        html = image.cached_render()
+        self.assertIn('320w', html)
+        self.assertIn('640w', html)
+        self.assertNotIn('1280w', html)
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('.jpeg 320w', html)
+
+    def test_unchanged_file_is_not_reencoded(self):
+        image = self.create()
+        with mock.patch.object(images, '_encode', wraps=images._encode) as encode:
+            with self.captureOnCommitCallbacks(execute=True):
+                image.title = 'Renamed'
+                image.save()
+            # тот же файл в другом материале: копии по хешу уже есть
+            self.create()
+        encode.assert_not_called()
+        with mock.patch.object(images, '_encode', wraps=images._encode) as encode:
+            self.create(color='blue')
+        self.assertEqual(encode.call_count, 4)
+
+    def test_hash_is_recomputed_only_for_a_new_file(self):
+        image = self.create()
+        with mock.patch.object(images, 'file_digest', wraps=images.file_digest) as digest:
+            with self.captureOnCommitCallbacks(execute=True):
+                image.title = 'Renamed'
+                image.save()
+            digest.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                image.file = self.upload(color='blue')
+                image.save()
+            digest.assert_called_once()
+
+    def test_derivatives_are_served_with_access_check(self):
+        image = self.create()
+        image.refresh_from_db()
+        url = reverse('courses:image_derivative', args=[image.pk, 320, 'jpeg'])
+        self.assertIn(f'{url} 320w', image.srcsets()['jpeg'])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user(username='other', password='pass'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(self.owner)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        response.close()
+        self.assertEqual(self.client.get(reverse('courses:image_derivative', args=[image.pk, 1280, 'jpeg'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('courses:image_derivative', args=[image.pk, 320, 'gif'])).status_code, 404)
+
+    def test_refresh_reaches_course_snapshot(self):
+        subject = Subject.objects.create(title='Math', slug='math')
+        course = Course.objects.create(owner=self.owner, subject=subject, title='C', slug='c', overview='')
+        module = Module.objects.create(course=course, title='M')
+        image = Image.objects.create(owner=self.owner, title='Pic', file=self.upload())
+        Content.objects.create(module=module, item=image)
+        client = APIClient()
+        client.force_authenticate(user=self.owner)
+        course.students.add(self.owner)
+        url = f'/api/courses/{course.id}/contents/'
+        self.assertNotIn('srcset', client.get(url).data['modules'][0]['contents'][0]['item'])
+        images.process_image(image.pk)
+        self.assertIn('srcset', client.get(url).data['modules'][0]['contents'][0]['item'])
+
+
+class ItemFileTestCase(CourseTestCase):
+    payload = b'0123456789' * 10
+
+    def setUp(self):
+        from django.core.files.base import ContentFile
+
+        super().setUp()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media, SENDFILE_BACKEND=None))
+        self.student = self.enrolled_student()
+        module = Module.objects.create(course=self.course, title='M')
+        self.item = File(owner=self.owner, title='Doc')
+        self.item.file.save('doc.pdf', ContentFile(self.payload), save=False)
+        self.item.save()
+        Content.objects.create(module=module, item=self.item)
+        self.url = self.item.file_url()
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_access_is_checked(self):
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+        self.client.force_login(User.objects.create_user(username='other', password='pass'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        for user in (self.owner, self.student):
+            self.client.force_login(user)
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.body(response), self.payload)
+            self.assertEqual(response['Accept-Ranges'], 'bytes')
+            self.assertIn('attachment', response['Content-Disposition'])
+
+    def test_range_requests(self):
+        self.client.force_login(self.student)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-14')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), b'01234')
+        self.assertEqual(response['Content-Range'], 'bytes 10-14/100')
+        self.assertEqual(response['Content-Length'], '5')
+        self.assertEqual(self.body(self.client.get(self.url, HTTP_RANGE='bytes=-3')), b'789')
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=100-').status_code, 416)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.body(response)), 100)
+
+    def test_conditional_headers(self):
+        self.client.force_login(self.student)
+        response = self.client.get(self.url)
+        self.body(response)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertTrue(response['ETag'])
+
+    def test_web_server_handoff(self):
+        self.client.force_login(self.student)
+        with self.settings(SENDFILE_BACKEND='x-accel-redirect', SENDFILE_URL_PREFIX='/protected/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected/{self.item.file.name}')
+        self.assertEqual(response.content, b'')
+        with self.settings(SENDFILE_BACKEND='x-sendfile'):
+            self.assertEqual(self.client.get(self.url)['X-Sendfile'], self.item.file.path)
+
+    def test_parse_range(self):
+        self.assertIsNone(parse_range(None, 10))
+        self.assertIsNone(parse_range('bytes=0-1,4-5', 10))
+        self.assertEqual(parse_range('bytes=2-', 10), (2, 9))
+        self.assertEqual(parse_range('bytes=2-50', 10), (2, 9))
+        self.assertEqual(parse_range('bytes=-50', 10), (0, 9))
+        self.assertRaises(ValueError, parse_range, 'bytes=5-2', 10)
+
+
+class SearchTestCase(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        subject = Subject.objects.create(title='Programming', slug='programming')
+        self.course = Course.objects.create(
+            owner=self.owner, subject=subject, title='Python basics', slug='python', overview='Variables and loops',
+        )
+        self.other = Course.objects.create(
+            owner=self.owner, subject=subject, title='Databases', slug='databases', overview='SQL with python examples',
+        )
+        self.module = Module.objects.create(course=self.course, title='Generators', description='yield and iterators')
+        self.text = Text.objects.create(owner=self.owner, title='Comprehensions', content='List comprehensions are concise')
+        Content.objects.create(module=self.module, item=self.text)
+
+
+    def found(self, query, **kwargs):
+        return [(document.kind, document.object_id) for document, _ in search(query, **kwargs)]
+
+    def test_title_ranks_above_body(self):
+        self.assertEqual(
+            self.found('python'),
+            [(SearchDocument.KIND_COURSE, self.course.pk), (SearchDocument.KIND_COURSE, self.other.pk)],
+        )
+
+    def test_ranking_is_bounded_to_newest_candidates(self):
+        with self.settings(SEARCH_CANDIDATES=1):
+            self.assertEqual(self.found('python'), [(SearchDocument.KIND_COURSE, self.other.pk)])
+            self.assertTrue(search('python').truncated)
+        self.assertFalse(search('python').truncated)
+
+    def test_truncated_window_is_ranked_and_pinned_across_pages(self):
+        # новые курсы со словом только в описании ранжируются ниже старого
+        # self.course (слово в названии), но он в окно не попадает
+        newer = [
+            Course.objects.create(
+                owner=self.owner, subject=self.course.subject, title=f'Course {number}', slug=f'c{number}',
+                overview='python ' * number,
+            )
+            for number in range(1, 5)
+        ]
+        client = APIClient()
+        with self.settings(SEARCH_CANDIDATES=3):
+            response = client.get(reverse('api:search'), {'q': 'python', 'page_size': 2})
+            self.assertTrue(response.data['truncated'])
+            ids = [result['id'] for result in response.data['results']]
+            Course.objects.create(owner=self.owner, subject=self.course.subject, title='Python new', slug='new', overview='')
+            response = client.get(response.data['next'])
+            ids += [result['id'] for result in response.data['results']]
+            self.assertIsNone(response.data['next'])
+        self.assertEqual(ids, [newer[3].pk, newer[2].pk, newer[1].pk])
+
+    def test_prefix_and_text_documents(self):
+        self.assertEqual(self.found('compreh'), [(SearchDocument.KIND_TEXT, self.text.pk)])
+        document, _ = search('iterators')[0]
+        self.assertEqual((document.kind, document.course_id, document.module_id), ('module', self.course.pk, self.module.pk))
+
+    def test_signals_keep_index_in_sync(self):
+        self.text.content = 'Dictionary views'
+        self.text.save()
+        self.assertEqual(self.found('concise'), [])
+        self.assertEqual(self.found('dictionary'), [(SearchDocument.KIND_TEXT, self.text.pk)])
+        self.module.course = self.other
+        self.module.save()
+        self.assertEqual(search('dictionary')[0][0].course_id, self.other.pk)
+        Content.objects.get(object_id=self.text.pk).delete()
+        self.assertEqual(self.found('dictionary'), [])
+        self.course.delete()
+        self.assertEqual(self.found('variables'), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.found('python" OR "*'), [])
+        self.assertEqual(self.found('-- ()'), [])
+        # OR — обычное слово: оператором запрос нашёл бы оба курса
+        self.assertEqual(self.found('variables OR sql'), [])
+
+    def test_pages(self):
+        for number in range(7):
+            Course.objects.create(
+                owner=self.owner, subject=self.course.subject, title=f'Python {number}', slug=f'python-{number}', overview='',
+            )
+        expected = self.found('python', limit=100)
+        pages, ceiling = [], None
+        while True:
+            page = search('python', offset=len(pages), limit=3, ceiling=ceiling)
+            if not page:
+                break
+            pages += [(document.kind, document.object_id) for document, _ in page]
+            ceiling = page.ceiling
+        self.assertEqual(pages, expected)
+        self.assertEqual(len(expected), 9)
+
+    def test_api(self):
+        client = APIClient()
+        self.assertEqual(client.get(reverse('api:search')).status_code, 400)
+        response = client.get(reverse('api:search'), {'q': 'python', 'page_size': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['id'], self.course.pk)
+        self.assertEqual(response.data['results'][0]['kind'], 'course')
+        response = client.get(response.data['next'])
+        self.assertEqual([result['id'] for result in response.data['results']], [self.other.pk])
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(client.get(reverse('api:search'), {'q': 'python', 'cursor': 'junk'}).status_code, 404)
+
+    def test_rebuild_index(self):
+        SearchDocument.objects.all().delete()
+        self.assertEqual(rebuild_index([self.course.pk, self.other.pk]), 4)
+        self.assertEqual(self.found('compreh'), [(SearchDocument.KIND_TEXT, self.text.pk)])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('4 documents', out.getvalue())
+
+    def test_import_indexes_new_courses(self):
+        dump = ''.join(export_lines())
+        Subject.objects.all().delete()
+        CatalogImporter().run(read_rows(StringIO(dump)))
+        self.assertEqual(self.found('compreh'), [(SearchDocument.KIND_TEXT, Text.objects.filter(title='Comprehensions').latest('pk').pk)])
+        self.assertEqual(len(self.found('python')), 2)
+
+
+class InstrumentationTestCase(CourseTestCase):
+    course_title = 'Algebra'
+    course_slug = 'algebra'
+
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        self.admin = User.objects.create_user(username='admin', password='pass', is_staff=True)
+
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as ctx, self.settings(SERVER_TIMING=True):
+            response = self.client.get(reverse('courses:course_list'))
+        metrics = response.wsgi_request.metrics
+        self.assertEqual(metrics.queries, len(ctx.captured_queries))
+        self.assertGreater(metrics.cache_misses, 0)
+        self.assertGreater(metrics.template_time, 0)
+        self.assertIn(f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries, 0 duplicate"', response['Server-Timing'])
+        metrics = self.client.get(reverse('courses:course_list')).wsgi_request.metrics
+        self.assertEqual(metrics.cache_misses, 0)
+        with self.settings(SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('courses:course_list')))
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s) LIMIT 21'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s) LIMIT 2'),
+        )
+        self.assertNotEqual(fingerprint('SELECT a FROM t'), fingerprint('SELECT b FROM t'))
+
+    def test_histograms(self):
+        for _ in range(3):
+            self.client.get(reverse('courses:course_list'))
+        self.assertEqual(self.client.get(reverse('api:metrics')).status_code, 403)
+        self.client.force_login(self.admin)
+        stats = self.client.get(reverse('api:metrics')).json()['courses:course_list']
+        self.assertEqual(stats['duration_ms']['count'], 3)
+        self.assertEqual(sum(stats['queries']['buckets'].values()), 3)
+        self.assertEqual(stats['duplicate_queries'], {})
+        self.client.delete(reverse('api:metrics'))
+        self.assertNotIn('courses:course_list', registry.snapshot())
+
+
+class QueryBudgetTestCase(CacheTestCase):
+    # представление -> (запросов с холодным кешем, с тёплым); число не зависит
+    # от размера курса, повторяющихся запросов (N+1) быть не должно
+    BUDGETS = {
+        'courses:subject_list': (3, 3),
+        'courses:course_list': (4, 2),
+        'courses:course_list_by_subject': (4, 2),
+        'courses:course_detail': (8, 8),
+        'courses:manage_course_list': (3, 3),
+        'courses:course_module_update': (4, 4),
+        'courses:module_content_list': (6, 6),
+        'students:student_course_list': (4, 3),
+        'students:student_course_detail': (10, 3),
+        'students:student_course_detail_module': (8, 3),
+        'api:subject-list': (5, 5),
+        'api:course-list': (4, 4),
+        'api:course-detail': (4, 4),
+        'api:course-contents': (8, 4),
+        'api:search': (4, 4),
+        'api:async-subject-list': (5, 5),
+        'api:async-course-list': (4, 4),
+        'api:async-course-detail': (4, 4),
+        'api:async-course-contents': (8, 4),
+    }
+
+    def setUp(self):
+        super().setUp()
+        # кеш ContentType живёт в процессе и между тестами не сбрасывается
+        ContentType.objects.get_for_models(*ITEM_MODELS)
+        self.student = User.objects.create_user(username='student', password='pass')
+        subject = Subject.objects.create(title='Math', slug='math')
+        for c in range(3):
+            course = Course.objects.create(owner=self.owner, subject=subject, title=f'Course {c}', slug=f'c{c}', overview='Algebra')
+            course.students.add(self.student)
+            for m in range(3):
+                module = Module.objects.create(course=course, title=f'Module {m}')
+                for i in range(2):
+                    Content.objects.create(module=module, item=Text.objects.create(owner=self.owner, title=f'Text {i}', content='Body'))
+                    Content.objects.create(module=module, item=Video.objects.create(
+                        owner=self.owner, title=f'Video {i}', url='https://www.youtube.com/watch?v=bgC-ocnTTto',
+                    ))
+        self.course = course
+        self.module = module
+        credentials = base64.b64encode(b'student:pass').decode()
+        self.basic = {'HTTP_AUTHORIZATION': f'Basic {credentials}'}
+
+    def urls(self):
+        course, module = self.course, self.module
+        return {
+            'courses:subject_list': (None, reverse('courses:subject_list')),
+            'courses:course_list': (None, reverse('courses:course_list')),
+            'courses:course_list_by_subject': (None, reverse('courses:course_list_by_subject', args=['math'])),
+            'courses:course_detail': (None, reverse('courses:course_detail', args=[course.slug])),
+            'courses:manage_course_list': (self.owner, reverse('courses:manage_course_list')),
+            'courses:course_module_update': (self.owner, reverse('courses:course_module_update', args=[course.pk])),
+            'courses:module_content_list': (self.owner, reverse('courses:module_content_list', args=[module.pk])),
+            'students:student_course_list': (self.student, reverse('students:student_course_list')),
+            'students:student_course_detail': (self.student, reverse('students:student_course_detail', args=[course.pk])),
+            'students:student_course_detail_module': (
+                self.student, reverse('students:student_course_detail_module', args=[course.pk, module.pk]),
+            ),
+            'api:subject-list': (None, reverse('api:subject-list')),
+            'api:course-list': (None, reverse('api:course-list')),
+            'api:course-detail': (None, reverse('api:course-detail', args=[course.pk])),
+            'api:course-contents': ('basic', reverse('api:course-contents', args=[course.pk])),
+            'api:search': (None, reverse('api:search') + '?q=algebra'),
+            'api:async-subject-list': (None, reverse('api:async-subject-list')),
+            'api:async-course-list': (None, reverse('api:async-course-list')),
+            'api:async-course-detail': (None, reverse('api:async-course-detail', args=[course.pk])),
+            'api:async-course-contents': ('basic', reverse('api:async-course-contents', args=[course.pk])),
+        }
+
+    def test_budgets(self):
+        urls = self.urls()
+        self.assertEqual(set(urls), set(self.BUDGETS))
+        for name, (user, url) in urls.items():
+            self.client.logout()
+            headers = self.basic if user == 'basic' else {}
+            if user not in (None, 'basic'):
+                self.client.force_login(user)
+            for run, budget in zip(('cold', 'warm'), self.BUDGETS[name]):
+                with self.subTest(view=name, cache=run):
+                    if run == 'cold':
+                        cache.clear()
+                    response = self.client.get(url, **headers)
+                    self.assertEqual(response.status_code, 200)
+                    metrics = response.wsgi_request.metrics
+                    self.assertLessEqual(metrics.queries, budget)
+                    self.assertEqual(metrics.duplicates, {})
+
+
+class AsyncAPITestCase(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.student = User.objects.create_user(username='student', password='pass')
+        self.outsider = User.objects.create_user(username='outsider', password='pass')
+        for s in range(2):
+            subject = Subject.objects.create(title=f'Subject {s}', slug=f'subject-{s}')
+            for c in range(2):
+                course = Course.objects.create(owner=self.owner, subject=subject, title=f'C{s}.{c}', slug=f'c{s}-{c}')
+                module = Module.objects.create(course=course, title='Module')
+                Content.objects.create(module=module, item=Text.objects.create(owner=self.owner, title='T', content='Body'))
+        course.students.add(self.student)
+        self.course = course
+
+    def basic(self, username):
+        credentials = base64.b64encode(f'{username}:pass'.encode()).decode()
+        return {'Authorization': f'Basic {credentials}'}
+
+    async def test_same_payload_as_sync_api(self):
+        pairs = [
+            ('api:subject-list', 'api:async-subject-list', [], {}),
+            ('api:course-list', 'api:async-course-list', [], {}),
+            ('api:course-detail', 'api:async-course-detail', [self.course.pk], {}),
+            ('api:course-contents', 'api:async-course-contents', [self.course.pk], self.basic('student')),
+        ]
+        for sync_name, async_name, args, headers in pairs:
+            with self.subTest(view=async_name):
+                expected = await self.async_client.get(reverse(sync_name, args=args), headers=headers)
+                response = await self.async_client.get(reverse(async_name, args=args), headers=headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), expected.json())
+
+    async def test_pages_and_not_modified(self):
+        url = reverse('api:async-course-list')
+        response = await self.async_client.get(url, {'page_size': 3})
+        self.assertEqual(response.json()['count'], 4)
+        page = await self.async_client.get(response.json()['next'])
+        self.assertEqual(len(page.json()['results']), 1)
+        self.assertIsNone(page.json()['next'])
+        response = await self.async_client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 200)
+        response = await self.async_client.get(url)
+        self.assertEqual((await self.async_client.get(url, headers={'If-None-Match': response['ETag']})).status_code, 304)
+        await Course.objects.filter(pk=self.course.pk).adelete()
+        self.assertEqual((await self.async_client.get(url, headers={'If-None-Match': response['ETag']})).status_code, 200)
+        self.assertEqual((await self.async_client.get(url, {'cursor': 'junk'})).status_code, 404)
+
+    async def test_contents_access(self):
+        url = reverse('api:async-course-contents', args=[self.course.pk])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Basic', response['WWW-Authenticate'])
+        wrong = {'Authorization': 'Basic ' + base64.b64encode(b'student:wrong').decode()}
+        for headers in (wrong, {'Authorization': 'Basic !!!'}):
+            response = await self.async_client.get(url, headers=headers)
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response['WWW-Authenticate'], 'Basic realm="api"')
+        self.assertEqual((await self.async_client.get(url, headers=self.basic('outsider'))).status_code, 403)
+        missing = reverse('api:async-course-contents', args=[0])
+        self.assertEqual((await self.async_client.get(missing, headers=self.basic('student'))).status_code, 404)
+        response = await self.async_client.get(url, headers=self.basic('student'))
+        headers = {**self.basic('student'), 'If-None-Match': response['ETag']}
+        self.assertEqual((await self.async_client.get(url, headers=headers)).status_code, 304)
+        self.assertEqual((await self.async_client.post(url, headers=self.basic('student'))).status_code, 405)
+
+
+@skipUnless('replica' in settings.DATABASES, 'needs a replica alias, run with --settings educa.settings_replica')
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReplicaRoutingTestCase(CourseFixture, TransactionTestCase):
+    # runner готовит базы из databases даже у пропущенных классов
+    databases = {'default', 'replica'} if 'replica' in settings.DATABASES else {'default'}
+
+    course_title = 'Algebra'
+    course_slug = 'algebra'
+
+    def setUp(self):
+        super().setUp()
+        self.student = User.objects.create_user(username='student', password='pass')
+        Module.objects.create(course=self.course, title='Module')
+        self.replicate()
+
+    def replicate(self):
+        # «репликация»: копия файла primary поверх файла replica
+        primary, replica = connections['default'], connections['replica']
+        primary.ensure_connection()
+        replica.ensure_connection()
+        primary.connection.backup(replica.connection)
+
+    def lag(self, title):
+        # запись, до которой реплика ещё не дошла (update() без сигналов и версий)
+        Course.objects.filter(pk=self.course.pk).update(title=title)
+
+    def course_titles(self):
+        # список курсов студента — без ETag, читается с реплики
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('students:student_course_list'))
+        return [title for title in ('Algebra', 'Geometry') if title in response.content.decode()]
+
+    def test_reads_go_to_replica(self):
+        self.course.students.add(self.student)
+        self.replicate()
+        self.lag('Geometry')
+        self.assertEqual(self.course_titles(), ['Algebra'])
+        self.replicate()
+        self.assertEqual(self.course_titles(), ['Geometry'])
+        # вне запросов — всегда primary
+        self.assertEqual(Course.objects.get(pk=self.course.pk).title, 'Geometry')
+
+    def test_sticky_primary_after_write(self):
+        credentials = base64.b64encode(b'student:pass').decode()
+        response = self.client.post(
+            reverse('api:course-enroll', args=[self.course.pk]), HTTP_AUTHORIZATION=f'Basic {credentials}',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.lag('Geometry')
+        self.assertEqual(self.course_titles(), ['Geometry'])
+        self.client.cookies.pop(STICKY_COOKIE)
+        # запись на курс реплика тоже ещё не видела, но множество курсов берётся с primary
+        self.assertEqual(self.course_titles(), ['Algebra'])
+
+    def test_student_sees_own_enrollment(self):
+        self.client.force_login(self.student)
+        self.replicate()
+        response = self.client.post(reverse('students:student_enroll_course'), {'course': self.course.pk}, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Module')
+        self.assertIn(STICKY_COOKIE, self.client.cookies)
+        self.assertEqual(response.redirect_chain[0][0], reverse('students:student_course_detail', args=[self.course.pk]))
+
+    def test_catalog_and_student_pages_read_replica(self):
+        self.course.students.add(self.student)
+        self.replicate()
+        self.client.force_login(self.student)
+        urls = [
+            reverse('courses:course_detail', args=['algebra']),
+            reverse('students:student_course_detail', args=[self.course.pk]),
+            reverse('api:course-detail', args=[self.course.pk]),
+        ]
+        for url in urls:
+            with CaptureQueriesContext(connections['replica']) as replica:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertTrue(replica.captured_queries, url)
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = async_to_sync(self.async_client.get)(reverse('api:async-course-detail', args=[self.course.pk]))
+        self.assertEqual(response.json()['title'], 'Algebra')
+        self.assertTrue(replica.captured_queries)
+
+    def test_replica_bodies_never_revalidate(self):
+        # версии сдвинуты сохранением, реплика ещё со старым названием
+        self.course.title = 'Geometry'
+        self.course.save()
+        for url, title in (
+            (reverse('api:course-detail', args=[self.course.pk]), lambda response: response.json()['title']),
+            (reverse('courses:course_detail', args=['algebra']), lambda response: response.content.decode()),
+        ):
+            stale = self.client.get(url)
+            self.assertIn('Algebra', title(stale))
+            self.assertTrue(stale['ETag'].endswith('.replica"'))
+            fresh = self.client.get(url, HTTP_IF_NONE_MATCH=stale['ETag'])
+            self.assertEqual(fresh.status_code, 200)
+            self.assertIn('Geometry', title(fresh))
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=fresh['ETag']).status_code, 304)
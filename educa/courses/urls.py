@@ -9,6 +9,8 @@ urlpatterns = [
     path('courses/', views.CourseListView.as_view(), name='course_list'),
     path('subjects/<slug:subject>/', views.CourseListView.as_view(), name='course_list_by_subject'),
     path('courses/<slug:slug>/', views.CourseDetailView.as_view(), name='course_detail'),
+    path('content/<model_name>/<int:id>/file/', views.ItemFileView.as_view(), name='item_file'),
+    path('content/image/<int:id>/<int:width>.<format>', views.ImageDerivativeView.as_view(), name='image_derivative'),
 
     path('manage/courses/', views.ManageCourseListView.as_view(), name='manage_course_list'),
     path('manage/courses/create/', views.CourseCreateView.as_view(), name='course_create'),
@@ -21,4 +23,7 @@ urlpatterns = [
     path('manage/modules/<int:module_id>/content/<model_name>/create/', views.ContentCreateUpdateView.as_view(), name='content_create'),
     path('manage/modules/<int:module_id>/content/<model_name>/<int:id>/', views.ContentCreateUpdateView.as_view(), name='content_update'),
     path('manage/content/<int:id>/delete/', views.ContentDeleteView.as_view(), name='content_delete'),
+
+    path('manage/module/order/', views.ModuleOrderView.as_view(), name='module_order'),
+    path('manage/content/order/', views.ContentOrderView.as_view(), name='content_order'),
 ]
@@ -0,0 +1,40 @@
+import time
+
+from django.core.cache import cache
+
+# Счётчики версий в кеше. Начальное значение берётся от времени: после
+# вытеснения ключа версия не повторится, и старые записи не оживут.
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+def get_version(key):
+    return get_versions([key])[key]
+
+
+async def aget_versions(keys):
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, time.time_ns(), None)
+            versions[key] = await cache.aget(key)
+    return versions
+
+
+async def aget_version(key):
+    return (await aget_versions([key]))[key]
+
+
+def bump_versions(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
@@ -1,14 +1,25 @@
+import json
+
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.cache import cache
-from django.db.models import Count
+from django.contrib.contenttypes.models import ContentType
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django.views.generic import DetailView, ListView
 from django.views.generic.base import TemplateResponseMixin, View
 from django.views.generic.edit import CreateView, DeleteView, UpdateView
 
+from . import catalog, images
+from .conditional import page_etag
+from .delivery import serve_file
+from .enrollment import enrolled_course_ids
 from .forms import CONTENT_MODEL_MAP, ModuleFormSet
-from .models import Content, Course, Module, Subject
+from .loading import contents_prefetch, load_contents
+from .models import Content, Course, File, Image, Module, Subject
+from .ordering import apply_order
+from .snapshots import course_version
 
 
 class SubjectListView(ListView):
@@ -17,44 +28,40 @@ class SubjectListView(ListView):
     context_object_name = 'subjects'
 
 
-class CourseListView(TemplateResponseMixin, View):
-    model = Course
-    template_name = 'courses/course/list.html'
+def course_list_etag(request, subject=None):
+    return page_etag(request, 'course_list', subject, catalog.catalog_generation())
 
-    def get(self, request, subject=None):
 
-        subjects = cache.get('all_subjects')
-        if not subjects:
-            subjects = Subject.objects.annotate(
-                total_courses=Count('courses')
-            )
-            cache.set('all_subjects', subjects)
+def course_detail_etag(request, slug):
+    pk = Course.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    if pk is None:
+        return None
+    return page_etag(request, 'course_detail', pk, course_version(pk), catalog.catalog_generation())
 
 
-        all_courses = Course.objects.annotate(
-            total_modules=Count('modules')
-        ).select_related('subject', 'owner')
+class CourseListView(TemplateResponseMixin, View):
+    model = Course
+    template_name = 'courses/course/list.html'
 
+    @method_decorator(condition(etag_func=course_list_etag))
+    def get(self, request, subject=None):
+        subject_obj = None
         if subject:
-            subject_obj = get_object_or_404(Subject, slug=subject)
-            key = f'subject_{subject_obj.id}_courses'
-            courses = cache.get(key)
-            if not courses:
-                courses = all_courses.filter(subject=subject_obj)
-                cache.set(key, courses, 600)
+            subject_obj = catalog.get_subject(subject)
+            if subject_obj is None:
+                raise Http404('No Subject matches the given query.')
+            courses = catalog.get_courses(subject_obj['id'])
         else:
-            courses = cache.get('all_courses')
-            if not courses:
-                courses = all_courses
-                cache.set('all_courses', courses, 600)
+            courses = catalog.get_courses()
 
         return self.render_to_response({
-            'subjects': subjects,
-            'subject': subject_obj if subject else None,
+            'subjects': catalog.get_subjects(),
+            'subject': subject_obj,
             'courses': courses,
         })
 
 
+@method_decorator(condition(etag_func=course_detail_etag), name='get')
 class CourseDetailView(DetailView):
     model = Course
     template_name = 'courses/course/detail.html'
@@ -62,6 +69,11 @@ class CourseDetailView(DetailView):
     slug_field = 'slug'
     slug_url_kwarg = 'slug'
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('subject', 'owner').prefetch_related(
+            'modules', contents_prefetch('modules__contents')
+        )
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         try:
@@ -128,7 +140,8 @@ class ModuleContentListView(OwnerCourseMixin, View):
     template_name = 'courses/manage/content/list.html'
 
     def get(self, request, module_id):
-        module = get_object_or_404(Module, id=module_id, course__owner=request.user)
+        module = get_object_or_404(Module.objects.select_related('course'), id=module_id, course__owner=request.user)
+        load_contents([module])
         return render(request, self.template_name, {'module': module})
 
 
@@ -177,3 +190,69 @@ class ContentDeleteView(OwnerCourseMixin, View):
         if item:
             item.delete()
         return redirect('courses:module_content_list', module_id=module.id)
+
+
+class OrderView(OwnerCourseMixin, View):
+    # тело запроса — JSON {id: order}; сохраняется одним bulk_update.
+    # Подклассы задают model и owner_lookup — путь до владельца курса
+    model = None
+    owner_lookup = None
+
+    def post(self, request):
+        queryset = self.model.objects.filter(**{self.owner_lookup: request.user})
+        try:
+            apply_order(queryset, json.loads(request.body))
+        except ValueError as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+        return JsonResponse({'saved': 'OK'})
+
+
+class ModuleOrderView(OrderView):
+    model = Module
+    owner_lookup = 'course__owner'
+
+
+class ContentOrderView(OrderView):
+    model = Content
+    owner_lookup = 'module__course__owner'
+
+
+class ItemFileView(LoginRequiredMixin, View):
+    # файл материала: автору и студентам курсов, где материал используется
+    models = {'file': File, 'image': Image}
+
+    def get_item(self, request, model_name, id, fields=('id', 'owner_id', 'file')):
+        model = self.models.get(model_name)
+        if model is None:
+            raise Http404
+        item = get_object_or_404(model.objects.only(*fields), id=id)
+        if item.owner_id != request.user.id and not Content.objects.filter(
+            content_type=ContentType.objects.get_for_model(model),
+            object_id=item.pk,
+            module__course_id__in=enrolled_course_ids(request.user),
+        ).exists():
+            raise Http404
+        if not item.file:
+            raise Http404
+        return item
+
+    def serve(self, request, field_file, as_attachment=False):
+        try:
+            return serve_file(request, field_file, as_attachment=as_attachment)
+        except FileNotFoundError:
+            raise Http404
+
+    def get(self, request, model_name, id):
+        item = self.get_item(request, model_name, id)
+        return self.serve(request, item.file, as_attachment=isinstance(item, File))
+
+
+class ImageDerivativeView(ItemFileView):
+    # копии для srcset — с той же проверкой доступа, что и исходная картинка
+    def get(self, request, id, width, format):
+        if format not in images.FORMATS:
+            raise Http404
+        item = self.get_item(request, 'image', id, fields=('id', 'owner_id', 'file', 'file_hash'))
+        if not item.file_hash:
+            raise Http404
+        return self.serve(request, images.derivative_file(item, width, format))
@@ -17,6 +17,14 @@ ALLOWED_HOSTS = []
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# ширины копий картинок для srcset и число потоков, которые их строят (0 — синхронно)
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 1280)
+IMAGE_WORKERS = 2
+# выдача файлов материалов: None — сам Django (FileResponse, Range),
+# 'x-accel-redirect' — nginx (internal location SENDFILE_URL_PREFIX -> MEDIA_ROOT),
+# 'x-sendfile' — Apache mod_xsendfile / lighttpd
+SENDFILE_BACKEND = None
+SENDFILE_URL_PREFIX = '/protected/'
 
 # Application definition
 
@@ -43,6 +51,15 @@ CACHES = {
  }
 }
 
+# отрисованный HTML материалов; запись сверяется с Item.updated при чтении
+ITEM_RENDER_CACHE_TIMEOUT = 60 * 60 * 24
+# материализованные списки каталога; актуальность держит счётчик поколений
+CATALOG_CACHE_TIMEOUT = 60 * 60
+# множества id курсов студента; сбрасываются по m2m_changed
+ENROLLMENT_CACHE_TIMEOUT = 60 * 60 * 24
+# снимки /api/courses/{id}/contents/; актуальность держат версии курса и модулей
+COURSE_SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
 # для radis
 # CACHES = {
 #  'default': {
@@ -60,6 +77,7 @@ LOGIN_URL = 'login'
 
 MIDDLEWARE = [
 	'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'courses.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
 	# 'django.middleware.cache.UpdateCacheMiddleware',
@@ -159,9 +177,17 @@ CACHE_MIDDLEWARE_KEY_PREFIX='educa'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        'courses.api.authentication.CachedBasicAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
 }
+
+# заголовок Server-Timing с метриками запроса (гистограммы копятся и без него);
+# раскрывает число и время SQL, поэтому только при отладке
+SERVER_TIMING = DEBUG
+
+# кеш проверенных учётных данных HTTP Basic (на процесс)
+CREDENTIAL_CACHE_SIZE = 1024
+CREDENTIAL_CACHE_TTL = 300
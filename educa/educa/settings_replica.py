@@ -0,0 +1,36 @@
+'''
+Профиль с репликой для чтения: primary и replica — два файла SQLite.
+
+    python manage.py runserver --settings educa.settings_replica
+    python manage.py test courses.tests.ReplicaRoutingTestCase --settings educa.settings_replica
+
+Копирование primary -> replica (репликация) настраивается вне Django; тесты
+роутинга копируют файл сами. Остальные тесты объявляют только default и
+запускаются с обычными настройками. Чтения каталога и студентов в GET/HEAD идут на
+replica, остальное — на primary, см. courses.routers.
+'''
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, MIDDLEWARE
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': {'NAME': BASE_DIR / 'test_primary.sqlite3'},
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+        'TEST': {'NAME': BASE_DIR / 'test_replica.sqlite3'},
+    },
+}
+DATABASE_ROUTERS = ['courses.routers.ReplicaRouter']
+DATABASE_REPLICAS = ['replica']
+# сколько секунд после записи чтения клиента идут на primary (отставание реплики)
+REPLICA_STICKY_SECONDS = 5
+
+MIDDLEWARE = [
+    *MIDDLEWARE[:2],
+    'courses.routers.ReplicaMiddleware',
+    *MIDDLEWARE[2:],
+]
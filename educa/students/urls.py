@@ -1,5 +1,4 @@
 from django.urls import path
-from django.views.decorators.cache import cache_page
 
 from . import views
 
@@ -11,7 +10,4 @@ urlpatterns = [
     path('courses/', views.StudentCourseListView.as_view(), name='student_course_list'),
     path('course/<int:pk>/', views.StudentCourseDetailView.as_view(), name='student_course_detail'),
     path('course/<int:pk>/<int:module_id>/', views.StudentCourseDetailView.as_view(), name='student_course_detail_module'),
-	path('course/<pk>/', cache_page(60*15)(views.StudentCourseDetailView.as_view()),name='student_course_detail',),
-    path('course/<pk>/<module_id>/', cache_page(60*15)(views.StudentCourseDetailView.as_view()), name='student_course_detail_module',),
-
 ]
@@ -1,8 +1,14 @@
+from courses.conditional import page_etag
+from courses.enrollment import enrolled_course_ids
 from courses.models import Course
+from courses.snapshots import course_outline, course_version, module_html
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import Http404
 from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, FormView
 from django.views.generic.list import ListView
@@ -48,9 +54,17 @@ class StudentCourseListView(LoginRequiredMixin, ListView):
 
     def get_queryset(self):
         qs = super().get_queryset()
-        return qs.filter(students__in=[self.request.user])
+        return qs.filter(id__in=enrolled_course_ids(self.request.user))
 
 
+def student_course_etag(request, pk, module_id=None):
+    # чужой курс — без валидатора, представление само ответит 404
+    if int(pk) not in enrolled_course_ids(request.user):
+        return None
+    return page_etag(request, 'student_course', pk, module_id, course_version(pk))
+
+
+@method_decorator(condition(etag_func=student_course_etag), name='get')
 class StudentCourseDetailView(LoginRequiredMixin, DetailView):
     model = Course
     # было 'courses/course/detail.html' — не тот шаблон
@@ -59,17 +73,21 @@ class StudentCourseDetailView(LoginRequiredMixin, DetailView):
 
     def get_queryset(self):
         qs = super().get_queryset()
-        return qs.filter(students__in=[self.request.user])
+        return qs.filter(id__in=enrolled_course_ids(self.request.user))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        course = self.get_object()
-        # выбор модуля: module_id в kwargs или первый модуль
+        # общие части (список модулей, HTML модуля) берутся из кеша по версиям,
+        # поверх них — только выбор модуля текущим запросом
+        modules = course_outline(self.object.pk)
         module = None
         if 'module_id' in self.kwargs:
-            module = course.modules.get(id=self.kwargs['module_id'])
-        else:
-            modules = course.modules.all()
-            module = modules[0] if modules else None
+            module = next((m for m in modules if m['id'] == int(self.kwargs['module_id'])), None)
+            if module is None:
+                raise Http404('No Module matches the given query.')
+        elif modules:
+            module = modules[0]
+        context['modules'] = modules
         context['module'] = module
+        context['module_html'] = module_html(module['id']) if module else ''
         return context